@@ -0,0 +1,260 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# archive.py : Docker Image Archives
+"""ElJef Docker Image Archive operations.
+
+This module holds functionality for saving images to, and loading images from, a compressed on-disk archive.
+"""
+import gzip
+import logging
+import os
+import re
+import threading
+
+from typing import List
+
+import docker
+
+from docker.errors import ImageNotFound
+
+from eljef.core import fops
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.exceptions import DockerError
+from eljef.docker.parallel import DEFAULT_WORKERS
+from eljef.docker.parallel import run_parallel
+from eljef.docker.registry import tagged_reference
+from eljef.docker.stream import CHUNK_SIZE
+from eljef.docker.stream import ChunkPipe
+from eljef.docker.stream import pipe_from
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+INDEX_FILE = 'index.yaml'
+
+_FILE_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class ArchiveReport(DictObj):
+    """Image archive save or load report class"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.bytes = 0
+        self.failed = dict()
+        self.skipped = []
+        self.transferred = []
+
+
+class DockerImageArchive(object):
+    """Docker image archive class
+
+    Images are stored as one gzip compressed ``docker save`` stream per image, with an index mapping image
+    references to their files and image IDs. References are indexed with their tag, so ``nginx`` and
+    ``nginx:latest`` refer to the same entry.
+
+    Args:
+        client: Initialized DockerClient class (Required)
+        archive_path: Path to directory holding the archive.
+
+    Keyword Args:
+        compress_level (int): gzip compression level to use when saving.
+        workers (int): Maximum number of images to save or load at the same time.
+    """
+    def __init__(self, client: docker.DockerClient, archive_path: str, **kwargs) -> None:
+        self.__client = client
+        self.__compress_level = kwargs.get('compress_level', 6)
+        self.__index_lock = threading.Lock()
+        self.__path = os.path.abspath(archive_path)
+        self.__workers = kwargs.get('workers', DEFAULT_WORKERS)
+        fops.mkdir(self.__path)
+        self.__index = fops.file_read_convert(os.path.join(self.__path, INDEX_FILE), 'YAML', True)
+
+    def __engine_stream(self, pipe: ChunkPipe, image_ref: str) -> None:
+        for chunk in self.__client.api.get_image(image_ref, chunk_size=CHUNK_SIZE):
+            pipe.write(chunk)
+
+    def __update_index(self, image_ref: str, info: dict) -> None:
+        with self.__index_lock:
+            self.__index[image_ref] = info
+            fops.file_write_convert(os.path.join(self.__path, INDEX_FILE), 'YAML', self.__index)
+
+    @staticmethod
+    def __file_stream(pipe: ChunkPipe, file_path: str) -> None:
+        with gzip.open(file_path, 'rb') as archive_file:
+            for chunk in iter(lambda: archive_file.read(CHUNK_SIZE), b''):
+                pipe.write(chunk)
+
+    def has(self, image_ref: str) -> bool:
+        """Determines if an image is held in the archive.
+
+        Args:
+            image_ref: Image reference.
+
+        Returns:
+            True if the image is held in the archive, False otherwise.
+        """
+        image_ref = tagged_reference(image_ref)
+        return image_ref in self.__index and os.path.isfile(os.path.join(self.__path, self.__index[image_ref]['file']))
+
+    def loaded(self, image_ref: str) -> bool:
+        """Determines if the engine already holds the archived copy of an image.
+
+        Args:
+            image_ref: Image reference.
+
+        Returns:
+            True if the image the engine has tagged with ``image_ref`` is the one held in the archive.
+        """
+        image_ref = tagged_reference(image_ref)
+        try:
+            return self.__client.images.get(image_ref).id == self.__index.get(image_ref, {}).get('id')
+        except ImageNotFound:
+            return False
+
+    def list(self) -> list:
+        """Returns a list of image references held in the archive."""
+        return [i for i in self.__index if self.has(i)]
+
+    def load(self, image_ref: str) -> int:
+        """Loads an image from the archive into the engine.
+
+        The archive file is decompressed in a separate thread while the engine reads the decompressed stream.
+
+        Args:
+            image_ref: Image reference to load.
+
+        Returns:
+            Number of uncompressed bytes sent to the engine.
+
+        Raises:
+            DockerError: If the image is not held in the archive.
+        """
+        image_ref = tagged_reference(image_ref)
+        if not self.has(image_ref):
+            raise DockerError("Image '{0!s}' not held in archive '{1!s}'".format(image_ref, self.__path))
+
+        LOGGER.debug("Loading image '%s' from archive", image_ref)
+        file_path = os.path.join(self.__path, self.__index[image_ref]['file'])
+        sent = [0]
+
+        def _counted(pipe: ChunkPipe):
+            for chunk in pipe:
+                sent[0] += len(chunk)
+                yield chunk
+
+        for line in self.__client.api.load_image(_counted(pipe_from(self.__file_stream, file_path))) or []:
+            if 'error' in line:
+                raise DockerError("Loading '{0!s}' failed: {1!s}".format(image_ref, line['error']))
+            LOGGER.debug(line.get('stream', '').strip())
+
+        return sent[0]
+
+    def load_all(self, image_refs: List[str] = None) -> ArchiveReport:
+        """Loads images from the archive into the engine, skipping images already present.
+
+        Args:
+            image_refs: Image references to load. Defaults to every image held in the archive.
+
+        Returns:
+            A filled ArchiveReport information holder.
+        """
+        report = ArchiveReport()
+        todo = []
+        for image_ref in [tagged_reference(i) for i in image_refs] if image_refs is not None else self.list():
+            if self.loaded(image_ref):
+                report.skipped.append(image_ref)
+            else:
+                todo.append(image_ref)
+
+        for result in run_parallel(self.load, todo, self.__workers):
+            if result.error:
+                report.failed[result.item] = str(result.error)
+            else:
+                report.transferred.append(result.item)
+                report.bytes += result.result
+
+        return report
+
+    def save(self, image_ref: str) -> int:
+        """Saves an image from the engine into the archive.
+
+        The engine stream is read in a separate thread while chunks are compressed and written, so only a few
+        chunks are held in memory at once. The file is written under a temporary name and moved into place, and the
+        temporary file is removed if the save fails.
+
+        Args:
+            image_ref: Image reference to save.
+
+        Returns:
+            Number of compressed bytes written.
+        """
+        image_ref = tagged_reference(image_ref)
+        image_id = self.__client.images.get(image_ref).id
+        file_name = "{0!s}.tar.gz".format(_FILE_RE.sub('_', image_ref))
+        file_path = os.path.join(self.__path, file_name)
+        temp_path = "{0!s}.{1!s}.part".format(file_path, threading.get_ident())
+
+        LOGGER.debug("Saving image '%s' to archive file '%s'", image_ref, file_path)
+        try:
+            with open(temp_path, 'wb') as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=self.__compress_level) as archive_file:
+                    for chunk in pipe_from(self.__engine_stream, image_ref):
+                        archive_file.write(chunk)
+                written = raw_file.tell()
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.__update_index(image_ref, {'file': file_name, 'id': image_id, 'size': written})
+
+        return written
+
+    def save_all(self, image_refs: List[str]) -> ArchiveReport:
+        """Saves images into the archive, skipping images whose archived copy is current.
+
+        Args:
+            image_refs: Image references to save.
+
+        Returns:
+            A filled ArchiveReport information holder.
+        """
+        report = ArchiveReport()
+        todo = []
+        for image_ref in sorted({tagged_reference(i) for i in image_refs}):
+            try:
+                image_id = self.__client.images.get(image_ref).id
+            except ImageNotFound:
+                report.failed[image_ref] = 'image not present'
+                continue
+            if self.has(image_ref) and self.__index[image_ref].get('id') == image_id:
+                report.skipped.append(image_ref)
+            else:
+                todo.append(image_ref)
+
+        for result in run_parallel(self.save, todo, self.__workers):
+            if result.error:
+                report.failed[result.item] = str(result.error)
+            else:
+                report.transferred.append(result.item)
+                report.bytes += result.result
+
+        return report
@@ -0,0 +1,164 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# buildplan.py : Docker Image Build Planning
+"""ElJef Docker Image Build Planning.
+
+This module holds functionality for building locally built images concurrently, in FROM dependency order.
+"""
+import logging
+
+from concurrent.futures import FIRST_COMPLETED
+from typing import Dict
+from typing import List
+from typing import Set
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker import deadline
+from eljef.docker.context import DOCKERFILE
+from eljef.docker.context import dockerfile_parents
+from eljef.docker.context import read_context_file
+from eljef.docker.exceptions import DockerError
+from eljef.docker.image import DockerImage
+from eljef.docker.parallel import DaemonExecutor
+from eljef.docker.parallel import wait_futures
+from eljef.docker.registry import parse_reference
+from eljef.docker.stats import API_STATS
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+
+def _build(image: DockerImage, context: tuple, deadlines: tuple) -> None:
+    with API_STATS.inherit(context), deadline.inherit(deadlines):
+        deadline.check()
+        image.pull()
+
+
+def image_key(image_ref: str) -> str:
+    """Returns a normalized form of an image reference, so equal references compare equal."""
+    return "{0!s}/{1!s}:{2!s}".format(*parse_reference(image_ref))
+
+
+class BuildReport(DictObj):
+    """Planned build report class"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.built = []
+        self.failed = dict()
+        self.skipped = dict()
+        self.waves = []
+
+
+class DockerBuildPlanner(object):
+    """Docker dependency ordered image build class
+
+    Keyword Args:
+        workers (int): Maximum number of builds to run at the same time.
+    """
+    def __init__(self, **kwargs) -> None:
+        self.__workers = kwargs.get('workers', 2)
+
+    @staticmethod
+    def plan(images: List[DockerImage]) -> Dict[str, Set[str]]:
+        """Builds the dependency graph of images that are built locally.
+
+        Images shared by several containers appear once.
+
+        Args:
+            images: Images to consider. Images that are not built locally are ignored.
+
+        Returns:
+            A dictionary of image key to the keys of locally built images it builds FROM.
+
+        Raises:
+            DockerError: If the images depend on each other in a cycle.
+        """
+        by_key = {image_key(i.name): i for i in images if i.build_path}
+        graph = dict()
+        for key, image in by_key.items():
+            dockerfile = read_context_file(image.build_path, DOCKERFILE)
+            parents = dockerfile_parents(dockerfile, image.build_args) if dockerfile is not None else set()
+            graph[key] = {image_key(i) for i in parents} & set(by_key) - {key}
+
+        visited, done = set(), set()
+
+        def _visit(key: str) -> None:
+            if key in done:
+                return
+            if key in visited:
+                raise DockerError("Locally built images depend on each other in a cycle at '{0!s}'".format(key))
+            visited.add(key)
+            for parent in graph[key]:
+                _visit(parent)
+            done.add(key)
+
+        for key in graph:
+            _visit(key)
+
+        return graph
+
+    def build(self, images: List[DockerImage]) -> BuildReport:
+        """Builds locally built images, running independent builds concurrently.
+
+        An image is built once every locally built image it builds FROM has been built, and those parents are not
+        pulled from a registry when it is built. Images whose parents fail to build are skipped. If a deadline passes,
+        builds that have not finished are reported as skipped.
+
+        Args:
+            images: Images to build. Images that are not built locally are ignored.
+
+        Returns:
+            A filled BuildReport information holder.
+        """
+        report = BuildReport()
+        by_key = {image_key(i.name): i for i in images if i.build_path}
+        graph = self.plan(images)
+        pending = dict(graph)
+        built, unbuilt = set(), set()
+
+        pool = DaemonExecutor(self.__workers)
+        running = dict()
+        while pending or running:
+            for key in [k for k, v in pending.items() if not v - built - unbuilt]:
+                if graph[key] & unbuilt:
+                    report.skipped[by_key[key].name] = 'a parent image failed to build'
+                    unbuilt.add(key)
+                else:
+                    LOGGER.debug("Building '%s'", by_key[key].name)
+                    by_key[key].local_parents = [by_key[i].name for i in graph[key]]
+                    running[pool.submit(_build, by_key[key], API_STATS.context(), deadline.context())] = key
+                del pending[key]
+            if not running:
+                break
+            finished = wait_futures(running, FIRST_COMPLETED)
+            if not finished:
+                report.skipped.update({by_key[i].name: 'cancelled' for i in list(running.values()) + list(pending)})
+                break
+            report.waves.append(sorted(by_key[running[i]].name for i in finished))
+            for future in finished:
+                key = running.pop(future)
+                if future.exception():
+                    report.failed[by_key[key].name] = str(future.exception())
+                    unbuilt.add(key)
+                else:
+                    report.built.append(by_key[key].name)
+                    built.add(key)
+        pool.shutdown()
+
+        return report
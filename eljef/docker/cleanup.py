@@ -0,0 +1,226 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# cleanup.py : Docker Image Garbage Collection
+"""ElJef Docker Image Garbage Collection.
+
+This module holds functionality for removing images that are no longer used by defined containers.
+"""
+import logging
+
+from typing import List
+from typing import Set
+
+import docker
+
+from docker.errors import ImageNotFound
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.parallel import DEFAULT_WORKERS
+from eljef.docker.parallel import run_parallel
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+_NONE_REPO = '<none>'
+_NONE_TAG = '<none>:<none>'
+
+
+def _image_repos(image: dict) -> Set[str]:
+    repos = set()
+    for repo_tag in image.get('RepoTags') or []:
+        if repo_tag != _NONE_TAG:
+            repos.add(repo_tag.rsplit(':', 1)[0])
+    for repo_digest in image.get('RepoDigests') or []:
+        if not repo_digest.startswith(_NONE_REPO):
+            repos.add(repo_digest.split('@', 1)[0])
+
+    return repos
+
+
+def shared_layers(layers: List[str], other: List[str]) -> int:
+    """Returns how many layers two images share, counted from their base layer.
+
+    Args:
+        layers: Layer IDs of the first image, base layer first.
+        other: Layer IDs of the second image, base layer first.
+
+    Returns:
+        Number of leading layers both images have in common.
+    """
+    count = 0
+    for layer, other_layer in zip(layers, other):
+        if layer != other_layer:
+            break
+        count += 1
+
+    return count
+
+
+def _image_tags(image: dict) -> List[str]:
+    return [i for i in image.get('RepoTags') or [] if i != _NONE_TAG]
+
+
+def _ref_repo(image_ref: str) -> str:
+    if ':' in image_ref.rsplit('/', 1)[-1]:
+        return image_ref.rsplit(':', 1)[0]
+    return image_ref
+
+
+class GCReport(DictObj):
+    """Image garbage collection report class"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.failed = dict()
+        self.reclaimed_bytes = 0
+        self.reclaimed_estimate = 0
+        self.removed = []
+        self.shared_bytes = 0
+
+
+class DockerImageGC(object):
+    """Docker image garbage collection class
+
+    Args:
+        client: Initialized DockerClient class (Required)
+
+    Keyword Args:
+        workers (int): Maximum number of images to remove at the same time.
+    """
+    def __init__(self, client: docker.DockerClient, **kwargs) -> None:
+        self.__client = client
+        self.__workers = kwargs.get('workers', DEFAULT_WORKERS)
+
+    def __in_use(self, referenced: List[str]) -> Set[str]:
+        in_use = set()
+        for image_ref in referenced:
+            try:
+                in_use.add(self.__client.images.get(image_ref).id)
+            except ImageNotFound:
+                LOGGER.debug("Referenced image '%s' not present.", image_ref)
+
+        return in_use
+
+    def __layers(self, image_id: str) -> List[str]:
+        try:
+            return self.__client.api.inspect_image(image_id).get('RootFS', {}).get('Layers') or []
+        except ImageNotFound:
+            return []
+
+    def __history_repo(self, image: dict, tagged: dict, managed: Set[str]) -> str:
+        layers = self.__layers(image['Id'])
+        best, repos = 0, set()
+        for other_repos, other_layers in tagged.values():
+            shared = shared_layers(layers, other_layers)
+            if shared > best:
+                best, repos = shared, set(other_repos)
+            elif shared == best:
+                repos |= other_repos
+
+        if not best or not repos <= managed:
+            return ''
+
+        return sorted(repos)[0]
+
+    def __remove(self, image: dict) -> None:
+        tags = _image_tags(image)
+        if not tags:
+            self.__client.api.remove_image(image['Id'])
+        for tag in tags:
+            self.__client.api.remove_image(tag)
+
+    def __unused(self, images: List[dict], referenced: List[str], keep: int) -> List[dict]:
+        in_use = self.__in_use(referenced)
+        managed = {_ref_repo(i) for i in referenced}
+
+        by_repo, dangling, tagged = dict(), [], dict()
+        for image in images:
+            repos = _image_repos(image)
+            if repos and _image_tags(image):
+                tagged[image['Id']] = repos
+            if image['Id'] in in_use or image.get('Containers', 0) > 0 or not repos <= managed:
+                continue
+            if not repos:
+                dangling.append(image)
+                continue
+            by_repo.setdefault(sorted(repos)[0], []).append(image)
+
+        tagged = {k: (v, self.__layers(k)) for k, v in tagged.items()} if dangling else tagged
+        for image in dangling:
+            repo = self.__history_repo(image, tagged, managed)
+            if repo:
+                by_repo.setdefault(repo, []).append(image)
+
+        ret = []
+        for repo, repo_images in by_repo.items():
+            repo_images.sort(key=lambda i: i.get('Created', 0), reverse=True)
+            kept = repo_images[:keep]
+            LOGGER.debug("Repository '%s': %d unused images, keeping %d", repo, len(repo_images), len(kept))
+            ret += repo_images[len(kept):]
+
+        return ret
+
+    def candidates(self, referenced: List[str], keep: int = 1) -> List[dict]:
+        """Determines which images are no longer used by defined containers.
+
+        Only images belonging to the repositories of ``referenced`` images are considered. Untagged images count
+        as belonging to the repository they were pulled from, or else to the tagged image they share the most
+        layers with, such as the previous build of a locally built image. Untagged images sharing as many layers
+        with an image outside those repositories are left alone. The ``keep`` newest unused images of each
+        repository are kept for rollback.
+
+        Args:
+            referenced: Image references used by defined containers.
+            keep: Number of unused images per repository to keep.
+
+        Returns:
+            A list of image information dictionaries as returned by the engine.
+        """
+        return self.__unused(self.__client.api.df().get('Images') or [], referenced, keep)
+
+    def collect(self, referenced: List[str], keep: int = 1) -> GCReport:
+        """Removes images that are no longer used by defined containers.
+
+        Args:
+            referenced: Image references used by defined containers.
+            keep: Number of unused images per repository to keep for rollback.
+
+        Returns:
+            A filled GCReport information holder.
+        """
+        report = GCReport()
+        disk_usage = self.__client.api.df()
+        images = {i['Id']: i for i in self.__unused(disk_usage.get('Images') or [], referenced, keep)}
+
+        LOGGER.debug("Removing %d unused images.", len(images))
+        for result in run_parallel(self.__remove, images.values(), self.__workers):
+            image = result.item
+            if result.error:
+                report.failed[image['Id']] = str(result.error)
+                continue
+            report.removed.append(image['Id'])
+            shared = max(image.get('SharedSize', 0), 0)
+            report.shared_bytes += shared
+            report.reclaimed_estimate += image.get('Size', 0) - shared
+
+        if report.removed:
+            after = self.__client.api.df().get('LayersSize') or 0
+            report.reclaimed_bytes = max((disk_usage.get('LayersSize') or 0) - after, 0)
+        LOGGER.debug("Removed %d images, reclaimed %d bytes", len(report.removed), report.reclaimed_bytes)
+
+        return report
@@ -21,10 +21,14 @@
 import logging
 import argparse
 
+from typing import List
+
 from eljef.core.check import version_check
+from eljef.docker.cli.__errors__ import cli_errors
+from eljef.docker.cli.__image__ import (image_gc, log_build_stats)
 from eljef.docker.cli.__vars__ import (CONFIG_PATH, PROJECT_NAME)
 from eljef.docker.docker import Docker
-from eljef.docker.exceptions import (ConfigError, DockerError)
+from eljef.docker.exceptions import DockerError
 
 LOGGER = logging.getLogger(__name__)
 
@@ -38,46 +42,42 @@ def container_action(container_name: str, start: bool, stop: bool, restart: bool
         container_name: Name of container to start, stop, or restart.
         start: If true, start the container.
         stop: If true, stop the container.
-        restart: If true, restart the container
+        restart: If true, restart the container using its reload strategy.
     """
-    try:
+    with cli_errors():
         client = Docker(CONFIG_PATH)
         container = client.containers.get(container_name)
-    except DockerError as err:
-        LOGGER.error("Docker Error: %s", err.message)
-        raise SystemExit(-1)
 
     if start:
         run = ("Starting Container: %s", "Started Container: %s", container.start)
     elif stop:
         run = ("Stopping Container: %s", "Stopped Container: %s", container.stop)
     elif restart:
-        run = ("Restarting Container: %s", "Restarted Container: %s", container.restart)
+        run = ("Reloading Container: %s", "Reloaded Container: %s", container.reload)
     else:
         raise DockerError("must specify start, stop, or restart")
 
     LOGGER.info(run[0], container_name)
-    run[2]()
+    with cli_errors():
+        run[2]()
     LOGGER.info(run[1], container_name)
 
 
-def container_define(definition_file: str) -> None:
-    """Define a new container
+def container_define(definition_files: List[str]) -> None:
+    """Define new containers
+
+    Group changes are written to file once, after all containers are defined.
 
     Args:
-        definition_file: Path to container definition file.
+        definition_files: Paths to container definition files.
     """
-    LOGGER.info("Defining New Container")
-    try:
+    LOGGER.info("Defining New Containers")
+    with cli_errors(docker_exit=1):
         client = Docker(CONFIG_PATH)
-        container_name = client.containers.define(definition_file)
-        LOGGER.info("Defined New Container: %s", container_name)
-    except ConfigError as err:
-        LOGGER.error("Configuration Error: %s", err.message)
-        raise SystemExit(1)
-    except DockerError as err:
-        LOGGER.error("Docker Error: %s", err.message)
-        raise SystemExit(1)
+        with client.groups.batch():
+            for definition_file in definition_files:
+                container_name = client.containers.define(definition_file)
+                LOGGER.info("Defined New Container: %s", container_name)
 
 
 def container_dump(container_name: str) -> None:
@@ -88,33 +88,85 @@ def container_dump(container_name: str) -> None:
     """
     LOGGER.info("Dumping container definition for '%s'", container_name)
 
-    try:
+    with cli_errors(docker_exit=1):
         client = Docker(CONFIG_PATH)
         container = client.containers.get(container_name)
         definition_file = container.dump()
         LOGGER.info("Wrote container definition: %s", definition_file)
-    except DockerError as err:
-        LOGGER.error("Docker Error: %s", err.message)
-        raise SystemExit(1)
 
 
-def container_update(container_name: str) -> None:
+def container_limits(container_name: str) -> None:
+    """Applies a containers resource limits, rebuilding the container only when required.
+
+    Args:
+        container_name: Name of container to apply resource limits to.
+    """
+    LOGGER.info("Applying resource limits for Container: %s", container_name)
+
+    with cli_errors():
+        client = Docker(CONFIG_PATH)
+        container = client.containers.get(container_name)
+        if not container.update_limits():
+            LOGGER.info("Limits cannot be changed live, rebuilding Container: %s", container_name)
+            container.rebuild()
+        LOGGER.info("Applied resource limits for Container: %s", container_name)
+
+
+def container_prepare(container_name: str) -> None:
+    """Creates a defined container, stopped, so it can be started quickly later.
+
+    Args:
+        container_name: Name of container to prepare.
+    """
+    LOGGER.info("Preparing Container: %s", container_name)
+
+    with cli_errors():
+        client = Docker(CONFIG_PATH)
+        container = client.containers.get(container_name)
+        if container.prepare():
+            LOGGER.info("Prepared Container: %s", container_name)
+        else:
+            LOGGER.info("Container '%s' already exists", container_name)
+
+
+def container_update(container_name: str, gc: bool = False) -> None:
     """Updates a containers image and rebuilds the container.
 
     Args:
         container_name: Name of container to update and rebuild.
+        gc: Remove images no longer used by defined containers after updating.
     """
     LOGGER.info("Updating Container: %s", container_name)
 
-    try:
+    with cli_errors():
         client = Docker(CONFIG_PATH)
         container = client.containers.get(container_name)
         container.update()
+        log_build_stats(container.image)
         container.rebuild()
         LOGGER.info("Updated Container: %s", container_name)
-    except DockerError as err:
-        LOGGER.error("Docker Error: %s", err.message)
-        raise SystemExit(-1)
+        if gc or client.settings.image_gc_after_update:
+            image_gc(client)
+
+
+def container_scale(scale: str) -> None:
+    """Scales a defined container to a number of replicas.
+
+    Args:
+        scale: Container name and number of replicas. (ie: web=4)
+    """
+    container_name, _, replicas = scale.rpartition('=')
+    if not container_name or not replicas.isdigit():
+        LOGGER.error("--scale must be given as CONTAINER_NAME=REPLICAS")
+        raise SystemExit(1)
+
+    LOGGER.info("Scaling Container '%s' to %s replicas", container_name, replicas)
+
+    with cli_errors():
+        client = Docker(CONFIG_PATH)
+        container = client.containers.get(container_name)
+        container.scale(int(replicas))
+        LOGGER.info("Scaled Container '%s' to %s replicas", container_name, replicas)
 
 
 def container_tag(container_name: str, image_tag: str) -> None:
@@ -126,14 +178,11 @@ def container_tag(container_name: str, image_tag: str) -> None:
     """
     LOGGER.info("Setting tag '%s' for Container: %s", image_tag, container_name)
 
-    try:
+    with cli_errors():
         client = Docker(CONFIG_PATH)
         container = client.containers.get(container_name)
         container.tag(image_tag)
         LOGGER.info("Tagged Container: %s", container_name)
-    except DockerError as err:
-        LOGGER.error("Docker Error: %s", err.message)
-        raise SystemExit(-1)
 
 
 def containers_list() -> None:
@@ -148,6 +197,32 @@ def containers_list() -> None:
         LOGGER.info('No Currently Defined Containers')
 
 
+# container operations that only take the container name given with --name
+_NAME_ACTIONS = (
+    ('container_dump', container_dump),
+    ('container_prepare', container_prepare),
+    ('container_limits', container_limits)
+)
+
+
+# noinspection PyUnresolvedReferences
+def _do_named(args: argparse.Namespace) -> None:
+    for dest, func in _NAME_ACTIONS:
+        if getattr(args, dest):
+            func(args.container_name)
+            return
+
+    if args.container_start or args.container_stop or args.container_restart:
+        container_action(args.container_name, args.container_start, args.container_stop, args.container_restart)
+    elif args.container_update:
+        container_update(args.container_name, args.container_gc)
+    elif args.container_tag:
+        container_tag(args.container_name, args.container_tag)
+    else:
+        LOGGER.error("You must specify an action for --name. Try %s container --help", PROJECT_NAME)
+        raise SystemExit(1)
+
+
 # noinspection PyUnresolvedReferences
 def do_container(args: argparse.Namespace) -> None:
     """Runs container operations"""
@@ -155,18 +230,10 @@ def do_container(args: argparse.Namespace) -> None:
         containers_list()
     elif args.container_define:
         container_define(args.container_define)
+    elif args.container_scale:
+        container_scale(args.container_scale)
     elif args.container_name:
-        if args.container_dump:
-            container_dump(args.container_name)
-        elif args.container_start or args.container_stop or args.container_restart:
-            container_action(args.container_name, args.container_start, args.container_stop, args.container_restart)
-        elif args.container_update:
-            container_update(args.container_name)
-        elif args.container_tag:
-            container_tag(args.container_name, args.container_tag)
-        else:
-            LOGGER.error("You must specify an action for --name. Try %s container --help", PROJECT_NAME)
-            raise SystemExit(1)
+        _do_named(args)
     else:
         LOGGER.error("You must specify an action. Try %s container --help", PROJECT_NAME)
         raise SystemExit(1)
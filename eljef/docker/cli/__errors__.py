@@ -0,0 +1,48 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# __errors__.py : Error handling for ElJef Docker CLI
+"""ElJef Docker CLI Error Handling
+
+Error handling shared by ElJef Docker CLI functions.
+"""
+import contextlib
+import logging
+
+from typing import Iterator
+
+from eljef.core.check import version_check
+from eljef.docker.exceptions import (ConfigError, DockerError)
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+
+@contextlib.contextmanager
+def cli_errors(docker_exit: int = -1) -> Iterator[None]:
+    """Logs configuration and docker errors raised in the block, then exits.
+
+    Args:
+        docker_exit: Exit code used for docker errors. Configuration errors always exit with 1.
+    """
+    try:
+        yield
+    except ConfigError as err:
+        LOGGER.error("Configuration Error: %s", err.message)
+        raise SystemExit(1)
+    except DockerError as err:
+        LOGGER.error("Docker Error: %s", err.message)
+        raise SystemExit(docker_exit)
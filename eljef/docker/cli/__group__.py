@@ -25,17 +25,37 @@
 import logging
 import argparse
 
+from docker.utils import parse_bytes
+
 from eljef.core.check import version_check
+from eljef.docker.cli.__errors__ import cli_errors
+from eljef.docker.cli.__image__ import (image_gc, log_build_stats)
 from eljef.docker.cli.__vars__ import (CONFIG_PATH, PROJECT_NAME)
 from eljef.docker.containers import DockerContainer
+from eljef.docker.deadline import deadline
 from eljef.docker.docker import Docker
 from eljef.docker.exceptions import DockerError
+from eljef.docker.governor import KIND_GROUP
 from eljef.docker.group import DockerGroup
+from eljef.docker.health import DEFAULT_READY_TIMEOUT
+from eljef.docker.journal import Journal
+from eljef.docker.journal import STEP_PULLED
+from eljef.docker.journal import STEP_REMOVED
+from eljef.docker.journal import STEP_STARTED
+from eljef.docker.journal import STEP_STOPPED
+from eljef.docker.parallel import DEFAULT_WORKERS
+from eljef.docker.parallel import run_parallel
+from eljef.docker.placement import PlacementPlanner
+from eljef.docker.placement import read_topology
+from eljef.docker.settings import read_settings
+from eljef.docker.stats import api_operation
 
 LOGGER = logging.getLogger(__name__)
 
 version_check(3, 6)
 
+_MIB = 1024 * 1024
+
 
 def _group_get(client: Docker, group_name: str) -> DockerGroup:
     try:
@@ -59,53 +79,106 @@ def _group_list(client: Docker, group: DockerGroup) -> Tuple[DockerContainer, Li
     return master, containers
 
 
-def _group_start(master: Union[DockerContainer, None], containers: List[DockerContainer]) -> None:
-    update_s = "Starting new copy of container '%s'"
-    if master:
-        LOGGER.info(update_s, master.info.name)
-        master.start()
-    for container in containers:
-        LOGGER.info(update_s, container.info.name)
-        container.start()
-
-
-def _group_stop(master: Union[DockerContainer, None], containers: List[DockerContainer], remove: bool = False) -> None:
-    update_s = "Shutting down container '{0!s}'"
+def _start_one(container: DockerContainer, journal: Union[Journal, None]) -> None:
+    if journal and journal.done(STEP_STARTED, container.info.name):
+        return
+    LOGGER.info("Starting new copy of container '%s'", container.info.name)
+    container.start()
+    if journal:
+        journal.record(STEP_STARTED, container.info.name)
+
+
+def _group_start(master: Union[DockerContainer, None], containers: List[DockerContainer], timeout: int = 0,
+                 journal: Journal = None, workers: int = DEFAULT_WORKERS) -> None:
+    timeout = timeout or DEFAULT_READY_TIMEOUT
+    with cli_errors():
+        if master:
+            _start_one(master, journal)
+            LOGGER.info("Waiting for container '%s' to become ready", master.info.name)
+            master.wait_ready(timeout)
+
+        pending = list(containers)
+        while pending:
+            names = {i.info.name for i in pending}
+            wave = [i for i in pending if i.info.net not in names] or pending
+            pending = [i for i in pending if i not in wave]
+            errors = ["{0!s}: {1!s}".format(i.item.info.name, i.error)
+                      for i in run_parallel(lambda i: _start_one(i, journal), wave, workers) if i.error]
+            if errors:
+                raise DockerError('; '.join(errors))
+            for container in (i for i in wave if i.info.name in {j.info.net for j in pending}):
+                LOGGER.info("Waiting for container '%s' to become ready", container.info.name)
+                container.wait_ready(timeout)
+
+
+def _group_stop(master: Union[DockerContainer, None], containers: List[DockerContainer], remove: bool = False,
+                journal: Journal = None) -> None:
+    update_s = "Shutting down container '%s'"
     if remove:
         update_s = "Shutting down and removing container '%s'"
-    for container in containers:
+    for container in containers + ([master] if master else []):
+        if journal and journal.done(STEP_REMOVED, container.info.name):
+            continue
         LOGGER.info(update_s, container.info.name)
         container.stop()
+        if journal:
+            journal.record(STEP_STOPPED, container.info.name)
         if remove:
             container.remove()
-    if master:
-        LOGGER.info(update_s, master.info.name)
-        master.stop()
-        if remove:
-            master.remove()
+            if journal:
+                journal.record(STEP_REMOVED, container.info.name)
 
 
-def group_define(group_name: str) -> None:
+def group_define(group_name: str, client: Docker = None) -> None:
     """Define a new container group
 
     Args:
         group_name: Name of group to define.
+        client: Initialized Docker class to use. A new one is created if not set.
     """
     LOGGER.info("Defining Group: %s", group_name)
 
-    client = Docker(CONFIG_PATH)
+    client = client or Docker(CONFIG_PATH)
     client.groups.add(group_name)
 
     LOGGER.info("Defined Group: %s", group_name)
 
 
-def group_info(group_name: str) -> None:
+def group_exec(group_name: str, command: str) -> None:
+    """Runs a command inside every member of a group concurrently.
+
+    Output is logged per container as it arrives. Replicas are run as separate members.
+
+    Args:
+        group_name: Group name to run the command in.
+        command: Command to run.
+    """
+    client = Docker(CONFIG_PATH)
+    group = _group_get(client, group_name)
+    master, containers = _group_list(client, group)
+    members = [r for i in ([master] if master else []) + containers for r in i.replicas()]
+
+    LOGGER.info("Running '%s' in members of group '%s'", command, group_name)
+    results = run_parallel(lambda i: i.exec(command), members, client.settings.max_workers)
+
+    LOGGER.info("Finished running '%s' in members of group '%s'", command, group_name)
+    for result in results:
+        if result.error:
+            LOGGER.error("    %s: failed after %.2fs: %s", result.item.info.name, result.duration, result.error)
+        else:
+            LOGGER.info("    %s: exit code %d in %.2fs", result.item.info.name, result.result, result.duration)
+    if any(i.error or i.result for i in results):
+        raise SystemExit(-1)
+
+
+def group_info(group_name: str, client: Docker = None) -> None:
     """Returns information for `group_name`
 
     Args:
         group_name: Group name to retrieve information for.
+        client: Initialized Docker class to use. A new one is created if not set.
     """
-    client = Docker(CONFIG_PATH)
+    client = client or Docker(CONFIG_PATH)
     try:
         group = client.groups.get(group_name)
     except DockerError as err:
@@ -123,6 +196,150 @@ def group_info(group_name: str) -> None:
             LOGGER.info("        %s", member_name)
 
 
+def _reserve(planner: PlacementPlanner, container: DockerContainer) -> None:
+    for replica in container.replicas():
+        if replica.info.cpuset_cpus:
+            planner.reserve(replica.info.cpuset_cpus, parse_bytes(replica.info.mem_limit) if replica.info.mem_limit
+                            else 0, replica.info.cpuset_mems)
+
+
+def _apply_placement(container: DockerContainer, placement: dict) -> bool:
+    if not container.info.replicas:
+        if container.info.name not in placement:
+            return False
+        container.info.cpuset_cpus, container.info.cpuset_mems = placement[container.info.name]
+        LOGGER.info("    %s: cpus %s, memory node %s", container.info.name, *placement[container.info.name])
+        return True
+
+    replicas = [i.info.name for i in container.replicas()]
+    if not all(i in placement for i in replicas):
+        return False
+    container.info.replica_cpuset_cpus = [placement[i][0] for i in replicas]
+    container.info.replica_cpuset_mems = [placement[i][1] for i in replicas]
+    for name in replicas:
+        LOGGER.info("    %s: cpus %s, memory node %s", name, *placement[name])
+
+    return True
+
+
+def group_place(group_name: str, client: Docker = None) -> None:
+    """Assigns cpusets and NUMA memory nodes to members of a group and saves them into their definitions.
+
+    Each replica of a replicated member gets its own cpuset. CPUs pinned by defined containers outside of the
+    group, and by members that set ``cpuset_cpus`` without requesting CPUs with ``nano_cpus``, are left alone.
+
+    Args:
+        group_name: Group name to place.
+        client: Initialized Docker class to use. A new one is created if not set.
+    """
+    client = client or Docker(CONFIG_PATH)
+    group = _group_get(client, group_name)
+    master, containers = _group_list(client, group)
+    members = [master] + containers if master else containers
+
+    planner = PlacementPlanner(read_topology())
+    for container_name in client.containers.list():
+        if container_name not in group.members and container_name != group.master:
+            _reserve(planner, client.containers.get(container_name))
+    for container in members:
+        if not container.info.nano_cpus:
+            _reserve(planner, container)
+
+    LOGGER.info("Placing members of group '%s'", group_name)
+    try:
+        placement = planner.plan([r for i in members for r in i.replicas()])
+    except DockerError as err:
+        LOGGER.error(err.message)
+        raise SystemExit(-1)
+
+    for container in members:
+        if _apply_placement(container, placement):
+            container.save()
+    LOGGER.info("Placed members of group '%s'. Placement is applied when they are next started.", group_name)
+
+
+def group_prepare(group_name: str, client: Docker = None) -> None:
+    """Creates all containers in a group, stopped, so a later start only has to start them.
+
+    Images are pulled or built first. The master is created before the other members, which are then created
+    concurrently.
+
+    Args:
+        group_name: Group name to prepare.
+        client: Initialized Docker class to use. A new one is created if not set.
+    """
+    client = client or Docker(CONFIG_PATH)
+    group = _group_get(client, group_name)
+    master, containers = _group_list(client, group)
+    members = [master] + containers if master else containers
+
+    LOGGER.info("Preparing members of group '%s'", group_name)
+    report = client.pull_images([i.image for i in members if not i.image.exists()])
+    for image_name, err in report.failed.items():
+        LOGGER.error("Could not pull image '%s': %s", image_name, err)
+    if report.failed:
+        raise SystemExit(-1)
+
+    results = run_parallel(lambda i: i.prepare(), [master], 1) if master else []
+    results += run_parallel(lambda i: i.prepare(), containers, client.settings.max_workers)
+    for result in results:
+        if result.error:
+            LOGGER.error("Could not prepare container '%s': %s", result.item.info.name, result.error)
+        elif result.result:
+            LOGGER.info("    %s: prepared in %.2fs", result.item.info.name, result.duration)
+        else:
+            LOGGER.info("    %s: already exists", result.item.info.name)
+    if any(i.error for i in results):
+        raise SystemExit(-1)
+
+    LOGGER.info("Prepared members of group '%s'", group_name)
+
+
+def group_reload(group_name: str, client: Docker = None) -> None:
+    """Reloads all containers in a group using their reload strategies.
+
+    The master is reloaded first, then the other members concurrently.
+
+    Args:
+        group_name: Group name to reload.
+        client: Initialized Docker class to use. A new one is created if not set.
+    """
+    client = client or Docker(CONFIG_PATH)
+    group = _group_get(client, group_name)
+    master, containers = _group_list(client, group)
+
+    LOGGER.info("Reloading Containers Group: '%s'", group_name)
+    results = run_parallel(lambda i: i.reload(), [master], 1) if master else []
+    results += run_parallel(lambda i: i.reload(), containers, client.settings.max_workers)
+    for result in results:
+        if result.error:
+            LOGGER.error("Could not reload container '%s': %s", result.item.info.name, result.error)
+        else:
+            LOGGER.info("    %s: %s in %.2fs", result.item.info.name, result.item.info.reload or 'restart',
+                        result.duration)
+    if any(i.error for i in results):
+        raise SystemExit(-1)
+
+    LOGGER.info("Reloaded Containers Group: '%s'", group_name)
+
+
+def group_restart(group_name: str, client: Docker = None) -> None:
+    """Stops and then starts all containers in the specified group.
+
+    Args:
+        group_name: Group name to restart.
+        client: Initialized Docker class to use. A new one is created if not set.
+    """
+    client = client or Docker(CONFIG_PATH)
+    group = _group_get(client, group_name)
+    master, containers = _group_list(client, group)
+
+    LOGGER.info("Restarting Containers Group: '%s'", group_name)
+    _group_stop(master, containers)
+    _group_start(master, containers, group.ready_timeout, workers=client.settings.max_workers)
+    LOGGER.info("Restarted Containers Group: '%s'", group_name)
+
+
 def group_set_master(group_name: str, master_name: str) -> None:
     """Sets `group_names` master to `master_name`
 
@@ -140,33 +357,37 @@ def group_set_master(group_name: str, master_name: str) -> None:
         raise SystemExit(-1)
 
     group.master = master_name
-    client.groups.save()
+    client.groups.save([group_name])
 
     LOGGER.info("Set master of '%s' to '%s'", group_name, master_name)
 
 
-def group_start(group_name: str) -> None:
+@api_operation
+def group_start(group_name: str, client: Docker = None) -> None:
     """Starts the specified group of containers.
 
     Args:
         group_name: Group name to start.
+        client: Initialized Docker class to use. A new one is created if not set.
     """
-    client = Docker(CONFIG_PATH)
+    client = client or Docker(CONFIG_PATH)
     group = _group_get(client, group_name)
     master, containers = _group_list(client, group)
 
     LOGGER.info("Starting Containers Group: '%s'", group_name)
-    _group_start(master, containers)
+    _group_start(master, containers, group.ready_timeout, workers=client.settings.max_workers)
     LOGGER.info("Finished updating and rebuilding members of group '%s'", group_name)
 
 
-def group_stop(group_name: str) -> None:
+@api_operation
+def group_stop(group_name: str, client: Docker = None) -> None:
     """Stops all containers in the specified group.
 
     Args:
         group_name: Group name to stop.
+        client: Initialized Docker class to use. A new one is created if not set.
     """
-    client = Docker(CONFIG_PATH)
+    client = client or Docker(CONFIG_PATH)
     group = _group_get(client, group_name)
     master, containers = _group_list(client, group)
 
@@ -175,31 +396,94 @@ def group_stop(group_name: str) -> None:
     LOGGER.info("Stopped Containers Group: '%s'", group_name)
 
 
-def group_update(group_name: str) -> None:
+def _group_update_pull(client: Docker, members: List[DockerContainer], journal: Journal) -> None:
+    images = {i.image.name: i.image for i in members if not journal.done(STEP_PULLED, i.image.name)}
+    if not images:
+        LOGGER.info("Container images already updated")
+        return
+
+    LOGGER.info("Updating container images for '%s'", ', '.join(sorted(images)))
+    old_ids = {k: v.local_id() for k, v in images.items()}
+    report = client.pull_images(list(images.values()))
+    for image_name in images:
+        if image_name not in report.failed:
+            journal.record(STEP_PULLED, image_name, old_id=old_ids[image_name])
+    for image_name, err in report.failed.items():
+        LOGGER.error("Could not update image '%s': %s", image_name, err)
+    if report.failed:
+        raise SystemExit(-1)
+    for image in images.values():
+        log_build_stats(image)
+    for count, wave in enumerate(report.build_waves, 1):
+        LOGGER.debug("Build batch %d: %s", count, ', '.join(wave))
+    LOGGER.info("Downloaded %.1f MiB of image layers (%.1f MiB expected, %.1f MiB without layer sharing)",
+                report.downloaded_bytes / _MIB, report.expected_bytes / _MIB, report.total_bytes / _MIB)
+
+
+def _group_rollback(group: DockerGroup, master: Union[DockerContainer, None], containers: List[DockerContainer],
+                    journal: Journal, workers: int = DEFAULT_WORKERS) -> None:
+    members = ([master] if master else []) + containers
+    images = {i.image.name: i.image for i in members}
+    for entry in journal.steps(STEP_PULLED):
+        if entry.get('old_id') and entry['name'] in images:
+            LOGGER.info("Restoring previous image for '%s'", entry['name'])
+            images[entry['name']].retag(entry['old_id'])
+
+    for container in members:
+        if journal.done(STEP_STARTED, container.info.name):
+            LOGGER.info("Removing updated container '%s'", container.info.name)
+            container.stop()
+            container.remove()
+
+    _group_start(master, containers, group.ready_timeout, workers=workers)
+    journal.finish()
+
+
+@api_operation
+def group_update(group_name: str, gc: bool = False, resume: bool = False, rollback: bool = False,
+                 client: Docker = None) -> None:
     """Updates all containers in a group and rebuilds them.
 
+    Completed steps are recorded in a journal under the configuration directory until the update finishes.
+
     Args:
         group_name: Group name to update and rebuild.
+        gc: Remove images no longer used by defined containers after updating.
+        resume: Continue an interrupted update, skipping steps that were completed.
+        rollback: Undo an interrupted update, restoring previous images and recreating updated containers.
+        client: Initialized Docker class to use. A new one is created if not set.
     """
-    client = Docker(CONFIG_PATH)
+    client = client or Docker(CONFIG_PATH)
     group = _group_get(client, group_name)
     master, containers = _group_list(client, group)
+    journal = Journal(CONFIG_PATH, 'group-update', group_name)
+
+    with cli_errors():
+        if resume or rollback:
+            if not journal.exists():
+                raise DockerError("No interrupted update recorded for group '{0!s}'".format(group_name))
+            if rollback:
+                LOGGER.info("Rolling back update of group '%s'", group_name)
+                _group_rollback(group, master, containers, journal, client.settings.max_workers)
+                LOGGER.info("Rolled back update of group '%s'", group_name)
+                return
+        else:
+            journal.begin()
 
     LOGGER.info("Updating and rebuilding members of group '%s'", group_name)
 
-    if master:
-        LOGGER.info("Updating container image for '%s'", master.info.name)
-        master.image.pull()
-    for container in containers:
-        LOGGER.info("Updating container image for '%s'", container.info.name)
-        container.image.pull()
+    _group_update_pull(client, ([master] if master else []) + containers, journal)
 
-    _group_stop(master, containers, True)
+    _group_stop(master, containers, True, journal)
 
-    _group_start(master, containers)
+    _group_start(master, containers, group.ready_timeout, journal, client.settings.max_workers)
 
+    journal.finish()
     LOGGER.info("Finished updating and rebuilding members of group '%s'", group_name)
 
+    if gc or client.settings.image_gc_after_update:
+        image_gc(client)
+
 
 def groups_list() -> None:
     """Returns a list of currently defined groups."""
@@ -214,22 +498,42 @@ def groups_list() -> None:
         LOGGER.info('No Currently Defined Groups')
 
 
+# group operations that only take a group name
+_GROUP_ACTIONS = (
+    ('group_define', group_define),
+    ('group_info', group_info),
+    ('group_place', group_place),
+    ('group_prepare', group_prepare),
+    ('group_reload', group_reload),
+    ('group_restart', group_restart),
+    ('group_start', group_start),
+    ('group_stop', group_stop)
+)
+
+
 # noinspection PyUnresolvedReferences
 def do_group(args: argparse.Namespace) -> None:
-    """Runs group operations"""
-    if args.group_define:
-        group_define(args.group_define)
-    elif args.group_info:
-        group_info(args.group_info)
+    """Runs group operations, under the batch_timeout deadline"""
+    with deadline(read_settings(CONFIG_PATH).batch_timeout, 'Group operation'):
+        _do_group(args)
+
+
+def _do_group(args: argparse.Namespace) -> None:
+    client = Docker(CONFIG_PATH)
+    for dest, func in _GROUP_ACTIONS:
+        if getattr(args, dest):
+            with client.governor.hold(KIND_GROUP, getattr(args, dest)):
+                func(getattr(args, dest), client)
+            return
+
+    if args.group_exec:
+        group_exec(*args.group_exec)
     elif args.group_set_master:
         group_name, master_name = args.group_set_master.split(',')
         group_set_master(group_name, master_name)
-    elif args.group_start:
-        group_start(args.group_start)
-    elif args.group_stop:
-        group_stop(args.group_stop)
     elif args.group_update:
-        group_update(args.group_update)
+        with client.governor.hold(KIND_GROUP, args.group_update):
+            group_update(args.group_update, args.group_gc, args.group_resume, args.group_rollback, client)
     elif args.groups_list:
         groups_list()
     else:
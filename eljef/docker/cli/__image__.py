@@ -0,0 +1,157 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# __image__.py : CLI functions for ElJef Docker Images
+"""ElJef Docker CLI Image Functions
+
+CLI functions for ElJef Docker Images.
+"""
+import logging
+import argparse
+
+from typing import List
+
+from eljef.core.check import version_check
+from eljef.docker.cli.__errors__ import cli_errors
+from eljef.docker.cli.__vars__ import (CONFIG_PATH, PROJECT_NAME)
+from eljef.docker.docker import Docker
+from eljef.docker.image import DockerImage
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+_MIB = 1024 * 1024
+
+
+def log_build_stats(image: DockerImage) -> None:
+    """Logs build cache statistics for an image that was built locally.
+
+    Args:
+        image: Initialized DockerImage class.
+    """
+    if not image.build_stats or not image.build_stats.steps:
+        return
+
+    LOGGER.info("Built image '%s': %d of %d steps from cache (%.0f%%)", image.name, image.build_stats.cached,
+                len(image.build_stats.steps), image.build_stats.hit_rate() * 100)
+    for count, step in enumerate(image.build_stats.steps, 1):
+        LOGGER.info("    %d: %s %s", count, 'cached' if step['cached'] else 'built ', step['step'])
+
+
+def image_gc(client: Docker, keep: int = None) -> None:
+    """Removes images no longer used by defined containers.
+
+    Args:
+        client: Initialized Docker class.
+        keep: Number of unused images per repository to keep for rollback.
+    """
+    LOGGER.info("Removing unused images")
+    report = client.gc_images(keep)
+
+    for image_id, err in report.failed.items():
+        LOGGER.warning("Could not remove image '%s': %s", image_id, err)
+    LOGGER.info("Removed %d images, reclaimed %.1f MiB (%.1f MiB estimated, %.1f MiB in shared layers)",
+                len(report.removed), report.reclaimed_bytes / _MIB, report.reclaimed_estimate / _MIB,
+                report.shared_bytes / _MIB)
+
+
+def images_gc(keep: int = None) -> None:
+    """Removes images no longer used by defined containers.
+
+    Args:
+        keep: Number of unused images per repository to keep for rollback.
+    """
+    if keep is not None and keep < 0:
+        LOGGER.error("--keep must be 0 or more")
+        raise SystemExit(1)
+
+    with cli_errors():
+        image_gc(Docker(CONFIG_PATH), keep)
+
+
+def _log_archive_report(report, action: str) -> None:
+    for image_ref, err in report.failed.items():
+        LOGGER.error("Could not %s image '%s': %s", action, image_ref, err)
+    for image_ref in report.skipped:
+        LOGGER.info("Image '%s' is current, skipping", image_ref)
+    LOGGER.info("Finished: %d images, %.1f MiB", len(report.transferred), report.bytes / _MIB)
+    if report.failed:
+        raise SystemExit(-1)
+
+
+def images_distribute(image_ref: str, targets: List[str] = None) -> None:
+    """Copies an image to other engines in a fan-out tree.
+
+    Args:
+        image_ref: Image reference to distribute.
+        targets: URLs of the engines to distribute to.
+    """
+    LOGGER.info("Distributing image '%s'", image_ref)
+    with cli_errors():
+        report = Docker(CONFIG_PATH).distribute_image(image_ref, targets)
+
+    for hop in report.hops:
+        LOGGER.info("    %s -> %s: %.1f MiB in %.1fs (%.1f MiB/s), %.1f MiB of held layers skipped", hop.source,
+                    hop.target, hop.bytes / _MIB, hop.seconds, hop.rate() / _MIB, hop.skipped_bytes / _MIB)
+    for target in report.skipped:
+        LOGGER.info("Engine '%s' already holds the image, skipping", target)
+    for target, err in report.failed.items():
+        LOGGER.error("Could not distribute to '%s': %s", target, err)
+    LOGGER.info("Finished: %d engines in %d rounds", len(report.hops), report.rounds)
+    if report.failed:
+        raise SystemExit(-1)
+
+
+def images_load(archive_path: str = None) -> None:
+    """Loads images from an image archive.
+
+    Args:
+        archive_path: Path to directory holding the archive.
+    """
+    LOGGER.info("Loading images from archive")
+    with cli_errors():
+        report = Docker(CONFIG_PATH).load_images(archive_path)
+
+    _log_archive_report(report, 'load')
+
+
+def images_save(archive_path: str = None) -> None:
+    """Saves images used by defined containers into an image archive.
+
+    Args:
+        archive_path: Path to directory holding the archive.
+    """
+    LOGGER.info("Saving images to archive")
+    with cli_errors():
+        report = Docker(CONFIG_PATH).save_images(archive_path)
+
+    _log_archive_report(report, 'save')
+
+
+# noinspection PyUnresolvedReferences
+def do_image(args: argparse.Namespace) -> None:
+    """Runs image operations"""
+    if args.images_gc:
+        images_gc(args.images_keep)
+    elif args.images_distribute:
+        images_distribute(args.images_distribute, args.images_targets)
+    elif args.images_load:
+        images_load(args.images_archive)
+    elif args.images_save:
+        images_save(args.images_archive)
+    else:
+        LOGGER.error("You must specify an action. Try %s image --help", PROJECT_NAME)
+        raise SystemExit(1)
@@ -20,18 +20,35 @@
 """
 import logging
 import argparse
+import signal
 import sys
 
 from eljef.core.applog import setup_app_logging
 from eljef.core.check import version_check
+from eljef.docker import deadline
 from eljef.docker.cli.__opts__ import (C_LINE_ARGS, C_LINE_GROUPS)
 from eljef.docker.cli.__vars__ import (PROJECT_DESCRIPTION, PROJECT_NAME, PROJECT_VERSION)
+from eljef.docker.stats import API_STATS
 
 LOGGER = logging.getLogger(__name__)
 
 version_check(3, 6)
 
 
+def _interrupt(signum, frame) -> None:
+    """SIGINT handler cancelling the deadlines active in the main thread.
+
+    Running operations stop at their next deadline check and report the cancellation. A second interrupt, or one
+    received with no deadline active, stops the process as usual.
+    """
+    active = [i for i in deadline.context() if not i.expired()]
+    if not active:
+        signal.default_int_handler(signum, frame)
+    LOGGER.warning("Interrupted, cancelling running operations. Interrupt again to stop immediately.")
+    for item in active:
+        item.cancel()
+
+
 def main() -> None:
     """Main function"""
     parser = argparse.ArgumentParser(description=PROJECT_DESCRIPTION)
@@ -64,7 +81,11 @@ def main() -> None:
         parser.print_help()
         raise SystemExit(1)
 
-    args.func(args)
+    signal.signal(signal.SIGINT, _interrupt)
+    try:
+        args.func(args)
+    finally:
+        API_STATS.log_summary(logging.INFO if args.api_stats else logging.DEBUG)
 
 
 if __name__ == "__main__":
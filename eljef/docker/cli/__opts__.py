@@ -23,12 +23,22 @@
 from eljef.core.check import version_check
 from eljef.docker.cli.__container__ import do_container
 from eljef.docker.cli.__group__ import do_group
+from eljef.docker.cli.__image__ import do_image
 
 LOGGER = logging.getLogger(__name__)
 
 version_check(3, 6)
 
 C_LINE_ARGS = [
+    {
+        'short': '-a',
+        'long': '--api-stats',
+        'opts': {
+            'dest': 'api_stats',
+            'action': 'store_true',
+            'help': 'Print the number of docker engine API requests made by each operation.'
+        }
+    },
     {
         'short': '-d',
         'long': '--debug',
@@ -62,7 +72,13 @@
             '--define': {
                 'dest': 'container_define',
                 'metavar': 'CONTAINER_DEFINITION.YAML',
-                'help': 'Define a new container using specified YAML definition file.'
+                'nargs': '+',
+                'help': 'Define new containers using specified YAML definition files.'
+            },
+            '--scale': {
+                'dest': 'container_scale',
+                'metavar': 'CONTAINER_NAME=REPLICAS',
+                'help': 'Set the number of replicas to run for a defined container and start or remove replicas.'
             },
             '--name': {
                 'dest': 'container_name',
@@ -87,13 +103,28 @@
             '--restart': {
                 'dest': 'container_restart',
                 'action': 'store_true',
-                'help': 'Restarts the defined container.'
+                'help': 'Restarts the defined container using its reload strategy.'
+            },
+            '--prepare': {
+                'dest': 'container_prepare',
+                'action': 'store_true',
+                'help': 'Create the defined container, stopped, so a later --start only has to start it.'
+            },
+            '--limits': {
+                'dest': 'container_limits',
+                'action': 'store_true',
+                'help': 'Apply resource limits from the definition, rebuilding only if they cannot be changed live.'
             },
             '--update': {
                 'dest': 'container_update',
                 'action': 'store_true',
                 'help': 'Update the specified containers image and rebuild the container.'
             },
+            '--gc': {
+                'dest': 'container_gc',
+                'action': 'store_true',
+                'help': 'Remove images no longer used by defined containers after --update.'
+            },
             '--tag': {
                 'dest': 'container_tag',
                 'metavar': 'IMAGE_TAG',
@@ -110,11 +141,27 @@
                 'metavar': 'GROUP_NAME',
                 'help': 'Define new container group.'
             },
+            '--exec': {
+                'dest': 'group_exec',
+                'nargs': 2,
+                'metavar': ('GROUP_NAME', 'COMMAND'),
+                'help': 'Run a command inside every running member of the specified group concurrently.'
+            },
             '--info': {
                 'dest': 'group_info',
                 'metavar': 'GROUP_NAME',
                 'help': 'Returns group information for the specified group.'
             },
+            '--place': {
+                'dest': 'group_place',
+                'metavar': 'GROUP_NAME',
+                'help': 'Assign cpusets and NUMA memory nodes to members of the specified group that request CPUs.'
+            },
+            '--prepare': {
+                'dest': 'group_prepare',
+                'metavar': 'GROUP_NAME',
+                'help': 'Create all containers in the specified group, stopped, so a later --start only starts them.'
+            },
             '--set-master': {
                 'dest': 'group_set_master',
                 'metavar': 'GROUP_NAME,MASTER_NAME',
@@ -123,7 +170,12 @@
             '--restart': {
                 'dest': 'group_restart',
                 'metavar': 'GROUP_NAME',
-                'help': 'Restarts the specified group of containers.'
+                'help': 'Stops and then starts the specified group of containers.'
+            },
+            '--reload': {
+                'dest': 'group_reload',
+                'metavar': 'GROUP_NAME',
+                'help': 'Reloads all containers in the specified group concurrently using their reload strategies.'
             },
             '--start': {
                 'dest': 'group_start',
@@ -140,11 +192,69 @@
                 'metavar': 'GROUP_NAME',
                 'help': 'Update all containers in the specified group and rebuild them.'
             },
+            '--gc': {
+                'dest': 'group_gc',
+                'action': 'store_true',
+                'help': 'Remove images no longer used by defined containers after --update.'
+            },
+            '--resume': {
+                'dest': 'group_resume',
+                'action': 'store_true',
+                'help': 'Continue an interrupted --update, skipping steps that were completed.'
+            },
+            '--rollback': {
+                'dest': 'group_rollback',
+                'action': 'store_true',
+                'help': 'Undo an interrupted --update, restoring previous images and recreating updated containers.'
+            },
             '--list': {
                 'dest': 'groups_list',
                 'action': 'store_true',
                 'help': 'Returns a list of currently defined groups.'
             }
         }
+    },
+    'image': {
+        'help': 'Operations to be performed on images used by defined containers.',
+        'func': do_image,
+        'ops': {
+            '--gc': {
+                'dest': 'images_gc',
+                'action': 'store_true',
+                'help': 'Remove images no longer used by any defined container.'
+            },
+            '--keep': {
+                'dest': 'images_keep',
+                'metavar': 'COUNT',
+                'type': int,
+                'help': 'Number of unused images per repository to keep for rollback with --gc.'
+            },
+            '--save': {
+                'dest': 'images_save',
+                'action': 'store_true',
+                'help': 'Save every image used by defined containers into the image archive.'
+            },
+            '--load': {
+                'dest': 'images_load',
+                'action': 'store_true',
+                'help': 'Load every image held in the image archive that is not already present.'
+            },
+            '--archive': {
+                'dest': 'images_archive',
+                'metavar': 'ARCHIVE_PATH',
+                'help': 'Image archive directory for --save and --load. (Defaults to image_archive_path setting.)'
+            },
+            '--distribute': {
+                'dest': 'images_distribute',
+                'metavar': 'IMAGE',
+                'help': 'Copy an image to other engines, each engine that receives it passing it on.'
+            },
+            '--targets': {
+                'dest': 'images_targets',
+                'metavar': 'ENGINE_URL',
+                'nargs': '+',
+                'help': 'Engines for --distribute. (Defaults to distribute_targets setting.)'
+            }
+        }
     }
 }
@@ -19,92 +19,102 @@
 
 This module holds functionality for performing operations on Docker Containers.
 """
+import copy
+import functools
 import logging
 import os
+import re
 
 from typing import Any
+from typing import Callable
+from typing import List
+from typing import Tuple
 
 import docker
 
+from docker.errors import DockerException
 from docker.errors import NotFound
-from docker.types.services import Mount
+from docker.types import LogConfig
+from docker.types import Ulimit
 
 from eljef.core import fops
 from eljef.core.check import version_check
-from eljef.core.dictobj import DictObj
 
+from eljef.docker.deadline import deadline
+from eljef.docker.deadline import iterate
 from eljef.docker.exceptions import ConfigError
 from eljef.docker.exceptions import DockerError
+from eljef.docker.governor import KIND_CONTAINER
+from eljef.docker.governor import KIND_RECREATE
+from eljef.docker.governor import hold
+from eljef.docker.governor import slot
 from eljef.docker.group import DockerGroups
+from eljef.docker.health import DEFAULT_READY_TIMEOUT
+from eljef.docker.health import duration_ns
+from eljef.docker.health import wait_ready
 from eljef.docker.image import DockerImage
+from eljef.docker.mounts import bind_string
+from eljef.docker.mounts import ensure_volume
+from eljef.docker.mounts import make_mount
+from eljef.docker.options import HEALTHCHECK_DURATIONS
+from eljef.docker.options import LIMIT_ATTRS
+from eljef.docker.options import LIMIT_ATTRS_DEFAULTED
+from eljef.docker.options import LIMIT_ATTRS_LIVE
+from eljef.docker.options import ContainerOpts
+from eljef.docker.options import limit_value
+from eljef.docker.options import validate_options
+from eljef.docker.options import validate_replicas
+from eljef.docker.parallel import DEFAULT_WORKERS
+from eljef.docker.parallel import run_parallel
+from eljef.docker.persist import read_yaml
+from eljef.docker.persist import write_yaml
+from eljef.docker.registry import parse_reference
+from eljef.docker.registry import tagged_reference
+from eljef.docker.stats import api_operation
 
 LOGGER = logging.getLogger(__name__)
 
 version_check(3, 6)
 
-VALIDATE_TE = "Incorrect key type: '{0!s}' is '{1!s}' but needs to be '{2!s}'"
-VALIDATE_TE_LIST = "Incorrect list contents: Value at position '{0!s}' in key '{1!s} has a type of '{2!s}' when it " \
-                   "should be 'str'"
-
 _ERR_CONTAINER_UNDEF_GROUP = "Container definition for '{0!s}' contains group that is not defined. Add group first."
 
+# signal sent by the signal reload strategy when reload_signal is not set
+RELOAD_SIGNAL = 'SIGHUP'
+
+# name suffixes and readiness timeout of the containers of a swap rebuild
+SWAP_SUFFIX_NEW = '-swap'
+SWAP_SUFFIX_OLD = '-old'
+SWAP_TIMEOUT = DEFAULT_READY_TIMEOUT
+
 
 def _save_container_file(container_name: str, file_path: str, out_dict: dict) -> None:
     LOGGER.debug("Saving configuration for '%s'", container_name)
-    for i in {'group', 'image_password', 'image_username', 'image_build_path', 'net', 'network', 'restart', 'tag'}:
-        if out_dict[i] is None:
-            out_dict[i] = ''
-    fops.file_write_convert(file_path, 'YAML', out_dict)
-
-
-class ContainerOpts(DictObj):
-    """Docker Container options class"""
-    def __init__(self):
-        super().__init__()
-        self.cap_add = []
-        self.cap_drop = []
-        self.devices = []
-        self.dns = []
-        self.environment = []
-        self.group = ''
-        self.image = ''
-        self.image_args = []
-        self.image_insecure = False
-        self.image_password = ''
-        self.image_username = ''
-        self.image_build_path = ''
-        self.image_build_squash = False
-        self.mounts = []
-        self.name = ''
-        self.net = ''
-        self.network = ''
-        self.ports = []
-        self.restart = ''
-        self.tag = ''
-        self.tmpfs = []
-
-    def set_with_type(self, key: Any, value: Any) -> None:
-        """Sets an attribute after checking type.
-
-        This will check the type of ``value`` matches the type of ``key`` before setting.
-        """
-        o_value = getattr(self, key)
+    for key, value in out_dict.items():
+        if value is None:
+            out_dict[key] = ''
+    write_yaml(file_path, out_dict)
+
+
+def _ulimit(name: str, value: Any) -> Ulimit:
+    if isinstance(value, dict):
+        soft = value.get('soft', value.get('hard', None))
+        return Ulimit(name=name, soft=soft, hard=value.get('hard', soft))
+    return Ulimit(name=name, soft=value, hard=value)
+
+
+def replica_name(container_name: str, index: int) -> str:
+    """Returns the name of replica ``index`` (1 based) of a container definition."""
+    return "{0!s}-{1!s}".format(container_name, index)
 
-        if not isinstance(value, type(o_value)):
-            k_is = type(value).__name__
-            k_sb = type(o_value).__name__
-            err_s = VALIDATE_TE.format(key, k_is, k_sb)
-            raise ConfigError(err_s)
-        elif isinstance(value, list):
-            count = 0
-            while count < len(value):
-                if not isinstance(value[count], (bytes, str)):
-                    k_is = type(value[count]).__name__
-                    err_s = VALIDATE_TE_LIST.format(count, key, k_is)
-                    raise ConfigError(err_s)
-                count += 1
 
-        setattr(self, key, None if value == '' else value)
+def _replica_ports(ports: List[str], index: int) -> List[str]:
+    ret = []
+    for port_group in ports:
+        host_port, cont_port = port_group.split(':')
+        start, sep, _ = host_port.partition('-')
+        ret.append("{0!s}:{1!s}".format(int(start) + index - 1 if sep else host_port, cont_port))
+
+    return ret
 
 
 class _CommandDict(object):
@@ -120,41 +130,49 @@ def build(self) -> dict:
             dict: A dictionary of keyword arguments
         """
         self.ret['name'] = self.options.name
+        self.healthcheck()
         self.img_args()
+        self.log_config()
         self.mounts()
         self.networking()
         self.optional_attrs()
         self.ports()
+        self.resources()
         self.restart()
         self.tmpfs()
+        self.ulimits()
 
         return self.ret
 
+    def healthcheck(self):
+        """Adds healthcheck"""
+        if self.options.healthcheck_test:
+            check = {'test': self.options.healthcheck_test}
+            for attr in HEALTHCHECK_DURATIONS:
+                if getattr(self.options, attr):
+                    check[attr[len('healthcheck_'):]] = duration_ns(getattr(self.options, attr))
+            if self.options.healthcheck_retries:
+                check['retries'] = self.options.healthcheck_retries
+            self.ret['healthcheck'] = check
+
     def img_args(self):
         """Adds arguments to send to docker image on startup"""
         if self.options.image_args:
             self.ret['command'] = self.options.image_args
 
+    def log_config(self):
+        """Set Logging Driver"""
+        if self.options.log_config:
+            log_opts = {k: str(v) for k, v in self.options.log_config.get('config', {}).items()}
+            self.ret['log_config'] = LogConfig(type=self.options.log_config.get('type', 'json-file'), config=log_opts)
+
     def mounts(self):
-        """Add Volumes to Mount"""
+        """Add Bind Mounts and Volumes to Mount"""
         if self.options.mounts:
-            volumes = list()
-
-            for vol in self.options.mounts:
-                host_path, cont_path, mode = None, None, None
-                if vol.count(':') == 1:
-                    host_path, cont_path = vol.split(':')
-                elif vol.count(':') == 2:
-                    host_path, cont_path, mode = vol.split(':')
-                else:
-                    raise ConfigError("Malformed Path: {0!s}".format(vol))
-
-                read_only = True if mode == 'ro' else False
-
-                mount = Mount(cont_path, host_path, type='bind', read_only=read_only, propagation='slave')
-                volumes.append(mount)
-
-            self.ret['mounts'] = volumes
+            binds = [bind_string(i) for i in self.options.mounts]
+            self.ret['mounts'] = [make_mount(i) for i, j in zip(self.options.mounts, binds) if not j]
+            if any(binds):
+                self.ret['volumes'] = [i for i in binds if i]
 
     def networking(self):
         """Setup Networking"""
@@ -166,10 +184,12 @@ def networking(self):
 
     def optional_attrs(self):
         """Add Optional Attributes"""
-        for attr in {'cap_add', 'cap_drop', 'devices', 'dns', 'environment'}:
+        for attr in {'cap_add', 'cap_drop', 'devices', 'dns', 'environment', 'ipc_mode', 'pid_mode'}:
             data = getattr(self.options, attr)
             if data:
                 self.ret[attr] = data
+        if self.options.sysctls:
+            self.ret['sysctls'] = {k: str(v) for k, v in self.options.sysctls.items()}
 
     def ports(self):
         """Add Port Maps"""
@@ -180,6 +200,13 @@ def ports(self):
                 ports[cont_port] = host_port
             self.ret['ports'] = ports
 
+    def resources(self):
+        """Add Resource Limits"""
+        for attr in LIMIT_ATTRS:
+            data = getattr(self.options, attr)
+            if data:
+                self.ret[attr] = data
+
     def restart(self):
         """Set Restart Policy"""
         self.ret['restart_policy'] = {'Name': 'always'}
@@ -191,13 +218,48 @@ def tmpfs(self):
         if self.options.tmpfs:
             t_dict = {}
             for i in self.options.tmpfs:
-                if ':' in i:
+                if isinstance(i, dict):
+                    self.ret.setdefault('mounts', []).append(make_mount(dict(i, type='tmpfs')))
+                elif ':' in i:
                     t_var = i.split(':')
                     t_dict[t_var[0]] = t_var[1]
                 else:
                     t_dict[i] = ''
 
-            self.ret['tmpfs'] = t_dict
+            if t_dict:
+                self.ret['tmpfs'] = t_dict
+
+    def ulimits(self):
+        """Set ulimits"""
+        if self.options.ulimits:
+            self.ret['ulimits'] = [_ulimit(k, v) for k, v in sorted(self.options.ulimits.items())]
+
+
+def _container_deadline(func: Callable) -> Callable:
+    """Decorator running ``func`` under the containers operation deadline."""
+    @functools.wraps(func)
+    def _wrapper(self, *args, **kwargs):
+        with deadline(self.timeout, "'{0!s}' {1!s}".format(self.info.name, func.__name__)):
+            return func(self, *args, **kwargs)
+
+    return _wrapper
+
+
+def _container_locked(func: Callable) -> Callable:
+    """Decorator holding the host-wide lock on a container while ``func`` runs, under the containers deadline."""
+    @functools.wraps(func)
+    def _wrapper(self, *args, **kwargs):
+        with hold(KIND_CONTAINER, self.info.name):
+            return func(self, *args, **kwargs)
+
+    return _container_deadline(_wrapper)
+
+
+def _log_exec_line(container_name: str, stream: str, line: str) -> None:
+    if stream == 'stderr':
+        LOGGER.warning("[%s] %s", container_name, line)
+    else:
+        LOGGER.info("[%s] %s", container_name, line)
 
 
 class DockerContainer(object):
@@ -210,6 +272,14 @@ class DockerContainer(object):
 
     Keyword Args:
         file_p: Path to container configuration file.
+        timeout (int): Seconds an operation on the container may take, if its operation_timeout is not set. Not
+                       limited if 0.
+        workers (int): Maximum number of replicas to operate on at the same time.
+
+    Notes:
+        A definition with ``replicas`` set runs containers named name-1 through
+        name-N. Operations on such a definition are applied to every replica
+        concurrently.
     """
     def __init__(self, client: docker.DockerClient, info: ContainerOpts, image: DockerImage, **kwargs) -> None:
         self.__client = client
@@ -217,6 +287,8 @@ def __init__(self, client: docker.DockerClient, info: ContainerOpts, image: Dock
         self.info = info
         self.image = image
         self.file_p = kwargs.get('file_p', None)
+        self.timeout = info.operation_timeout or kwargs.get('timeout', 0)
+        self.__workers = kwargs.get('workers', DEFAULT_WORKERS)
 
     def __get(self):
         if not self.__container:
@@ -225,6 +297,41 @@ def __get(self):
             except NotFound:
                 self.__container = None
 
+    def __each(self, method: str) -> list:
+        results = run_parallel(lambda i: getattr(i, method)(), self.replicas(), self.__workers)
+        errors = ["{0!s}: {1!s}".format(i.item.info.name, i.error) for i in results if i.error]
+        if errors:
+            raise DockerError('; '.join(errors))
+
+        return [i.result for i in results]
+
+    def replicas(self) -> List['DockerContainer']:
+        """Returns the replicas of this container definition.
+
+        Returns:
+            A list of DockerContainer classes, one per replica, or this container if the definition is not
+            replicated.
+        """
+        if not self.info.replicas:
+            return [self]
+
+        ret = []
+        for index in range(1, self.info.replicas + 1):
+            info = ContainerOpts()
+            for key in info.keys():
+                setattr(info, key, copy.deepcopy(getattr(self.info, key)))
+            info.name = replica_name(self.info.name, index)
+            info.ports = _replica_ports(self.info.ports, index)
+            if index <= len(self.info.replica_cpuset_cpus):
+                info.cpuset_cpus = self.info.replica_cpuset_cpus[index - 1]
+            if index <= len(self.info.replica_cpuset_mems):
+                info.cpuset_mems = self.info.replica_cpuset_mems[index - 1]
+            info.replica_cpuset_cpus, info.replica_cpuset_mems = [], []
+            info.replicas = 0
+            ret.append(DockerContainer(self.__client, info, self.image, timeout=self.timeout))
+
+        return ret
+
     def dump(self) -> str:
         """Dumps the configuration for this container to a file in the
            current working directory.
@@ -240,20 +347,199 @@ def dump(self) -> str:
 
         return yaml_file
 
+    def __exec_output(self, output: Callable, buffers: dict, stream: str, data: bytes) -> None:
+        buffers[stream] += data
+        *lines, buffers[stream] = buffers[stream].split(b'\n')
+        for line in lines:
+            output(self.info.name, stream, fops.makestr(line).rstrip('\r'))
+
+    @api_operation
+    @_container_deadline
+    def exec(self, command: Any, output: Callable = None) -> int:
+        """Runs a command inside a running container, streaming its output.
+
+        Args:
+            command: Command to run, as a string or a list of arguments.
+            output: Function called with (container name, 'stdout' or 'stderr', line) for each line of output.
+                    Defaults to logging each line prefixed with the container name.
+
+        Returns:
+            Exit code of the command. For a definition with replicas, the highest exit code of any replica.
+
+        Raises:
+            DeadlineError: If the command does not finish before the operation deadline.
+            DockerError: If the container is not running.
+        """
+        if self.info.replicas:
+            results = run_parallel(lambda i: i.exec(command, output), self.replicas(), self.__workers)
+            errors = ["{0!s}: {1!s}".format(i.item.info.name, i.error) for i in results if i.error]
+            if errors:
+                raise DockerError('; '.join(errors))
+            return max(i.result for i in results)
+
+        if not output:
+            output = _log_exec_line
+        self.__get()
+        if not self.__container or self.__container.status != 'running':
+            raise DockerError("Container '{0!s}' is not running".format(self.info.name))
+
+        LOGGER.debug("Running command in container '%s': %s", self.info.name, command)
+        api = self.__client.api
+        exec_id = api.exec_create(self.__container.id, command)['Id']
+        buffers = {'stdout': b'', 'stderr': b''}
+        for stdout, stderr in iterate(api.exec_start(exec_id, stream=True, demux=True)):
+            if stdout:
+                self.__exec_output(output, buffers, 'stdout', stdout)
+            if stderr:
+                self.__exec_output(output, buffers, 'stderr', stderr)
+        for stream, data in buffers.items():
+            if data:
+                output(self.info.name, stream, fops.makestr(data))
+
+        return api.exec_inspect(exec_id).get('ExitCode') or 0
+
+    @api_operation
+    @_container_locked
     def rebuild(self) -> None:
-        """Stops a container, removes it, and starts a new container with
-           the stored definition.
+        """Replaces a container with a new container using the stored definition.
+
+        Notes:
+            By default the container is stopped and removed before the new
+            container is started. With ``rebuild_mode`` set to swap, the new
+            container is created first, see swap().
         """
-        self.stop()
-        self.remove()
-        self.start()
+        if self.info.replicas:
+            self.__each('rebuild')
+            return
+        if self.info.rebuild_mode == 'swap':
+            self.swap()
+            return
+
+        with slot(KIND_RECREATE):
+            self.stop()
+            self.remove()
+            self.start()
+
+    def __swap_replace(self, new, timeout: int) -> None:
+        new_name = self.info.name + SWAP_SUFFIX_NEW
+        old_name = self.info.name + SWAP_SUFFIX_OLD
+        try:
+            if self.info.ports:
+                self.__container.stop()
+            new.start()
+            wait_ready(self.__client, [new_name], timeout)
+        except (DockerError, DockerException) as err:
+            LOGGER.debug("Swap failed for container '%s', keeping the old container: %s", self.info.name, err)
+            new.remove(force=True)
+            self.__container.start()
+            if isinstance(err, DockerError):
+                raise
+            raise DockerError(str(err))
+
+        if not self.info.ports:
+            self.__container.stop()
+        self.__container.rename(old_name)
+        new.rename(self.info.name)
+        self.__container.remove()
+        self.__container = new
+
+    def __swap_temp(self, name: str) -> None:
+        try:
+            self.__client.containers.get(name).remove(force=True)
+            LOGGER.debug("Removed leftover container: %s", name)
+        except NotFound:
+            pass
+
+    @api_operation
+    @_container_locked
+    def swap(self, timeout: int = SWAP_TIMEOUT) -> None:
+        """Replaces a running container by creating the new container before the old one is stopped.
+
+        The new container is created under a temporary name, the old container is renamed out of the way, and the
+        new container is renamed into place before the old one is removed.
+
+        Notes:
+            Containers without host ports have the new container started,
+            and waited on until it is running and healthy, before the old
+            container is stopped. Containers that bind host ports cannot run
+            side by side, so the new container is created ahead of time and
+            only started once the old container has stopped.
+
+        Args:
+            timeout: Seconds to wait for the new container to become ready.
 
+        Raises:
+            DockerError: If the new container does not become ready. The old container is left in place.
+        """
+        if self.info.replicas:
+            self.__each('swap')
+            return
+        LOGGER.debug("Swapping container: %s", self.info.name)
+        self.__get()
+        if not self.__container:
+            self.start()
+            return
+
+        new_name = self.info.name + SWAP_SUFFIX_NEW
+        old_name = self.info.name + SWAP_SUFFIX_OLD
+        self.__swap_temp(new_name)
+        self.__swap_temp(old_name)
+
+        kw_args = self.__create_args()
+        kw_args['name'] = new_name
+        with slot(KIND_RECREATE):
+            self.__swap_replace(self.__client.containers.create(self.info.image, **kw_args), timeout)
+        LOGGER.debug("Swapped container: %s", self.info.name)
+
+    @api_operation
+    @_container_locked
     def remove(self) -> None:
-        """Removes a container."""
+        """Removes a container. A container that does not exist is treated as already removed."""
+        if self.info.replicas:
+            self.__each('remove')
+            return
         self.__get()
+        if not self.__container:
+            LOGGER.debug("Container '%s' does not exist, nothing to remove", self.info.name)
+            return
         self.__container.remove()
         self.__container = None
 
+    def __create_args(self) -> dict:
+        if not self.image.exists():
+            self.image.pull()
+
+        kw_args = _CommandDict(self.info).build()
+
+        for mount in self.info.mounts:
+            ensure_volume(self.__client, mount)
+
+        return kw_args
+
+    @api_operation
+    @_container_locked
+    def prepare(self) -> bool:
+        """Creates a container, stopped, so a later start only has to start it.
+
+        The image is pulled or built if it is not present, and named volumes are created.
+
+        Returns:
+            True if the container was created. False if it already exists.
+        """
+        if self.info.replicas:
+            return any(self.__each('prepare'))
+        LOGGER.debug("Preparing container: %s", self.info.name)
+        self.__get()
+        if self.__container:
+            LOGGER.debug("Container '%s' already exists", self.info.name)
+            return False
+
+        self.__container = self.__client.containers.create(self.info.image, **self.__create_args())
+        LOGGER.debug("Prepared container: %s", self.info.name)
+
+        return True
+
+    @api_operation
     def run(self) -> None:
         """Runs a container.
 
@@ -266,42 +552,188 @@ def run(self) -> None:
             log_s = "Container '{0!s}' exists. Must stop() and remove() first."
             raise DockerError(log_s.format(self.info.name))
 
-        if not self.image.exists():
-            self.image.pull()
-
-        kw_args = _CommandDict(self.info).build()
+        kw_args = self.__create_args()
         kw_args['detach'] = True
 
         self.__container = self.__client.containers.run(self.info.image, **kw_args)
         LOGGER.debug("Ran container: %s", self.info.name)
 
+    @api_operation
+    @_container_locked
+    def reload(self) -> None:
+        """Applies configuration changes to a container using its reload strategy.
+
+        Notes:
+            signal sends ``reload_signal`` (SIGHUP by default) to the container,
+            exec runs ``reload_command`` inside the container, restart has the
+            engine restart the container, and recreate rebuilds the container.
+            The default is restart. A container that is not running is started.
+
+        Raises:
+            DockerError: If ``reload_command`` exits with an error.
+        """
+        if self.info.replicas:
+            self.__each('reload')
+            return
+        LOGGER.debug("Reloading container: %s", self.info.name)
+        self.__get()
+        strategy = self.info.reload or 'restart'
+        if strategy == 'recreate':
+            self.rebuild()
+        elif not self.__container or self.__container.status != 'running':
+            self.start()
+        elif strategy == 'signal':
+            self.__container.kill(signal=self.info.reload_signal or RELOAD_SIGNAL)
+        elif strategy == 'exec':
+            exit_code, output = self.__container.exec_run(self.info.reload_command)
+            if exit_code:
+                err_s = "Reload command for '{0!s}' exited with {1!s}: {2!s}"
+                raise DockerError(err_s.format(self.info.name, exit_code, fops.makestr(output).strip()))
+        else:
+            self.__container.restart()
+        LOGGER.debug("Reloaded container: %s", self.info.name)
+
     def restart(self) -> None:
         """Restarts a container."""
         self.stop()
         self.start()
 
+    def save(self) -> None:
+        """Saves the stored definition for this container to its configuration file."""
+        if self.file_p:
+            _save_container_file(self.info.name, self.file_p, self.info.to_dict())
+
+    @api_operation
+    @_container_locked
+    def scale(self, replicas: int) -> None:
+        """Sets the number of replicas for this container definition and saves it.
+
+        New replicas are started, and replicas beyond ``replicas`` are stopped and removed, concurrently. A
+        container running from the definition before it was replicated is stopped and removed first.
+
+        Args:
+            replicas: Number of replicas to run.
+
+        Raises:
+            ConfigError: If ``replicas`` is less than 1, or the host port ranges in ``ports`` are too small.
+        """
+        if replicas < 1:
+            raise ConfigError("replicas must be at least 1")
+        validate_replicas(self.info, replicas)
+
+        LOGGER.debug("Scaling container '%s' to %d replicas", self.info.name, replicas)
+        if not self.info.replicas:
+            self.__get()
+            if self.__container:
+                self.__container.stop()
+                self.__container.remove()
+                self.__container = None
+
+        self.info.replicas = replicas
+        self.save()
+        self.__each('start')
+
+        replica_re = re.compile(r'^/?{0!s}-(\d+)$'.format(re.escape(self.info.name)))
+        extra = []
+        for container in self.__client.containers.list(all=True, filters={'name': self.info.name + '-'}):
+            match = replica_re.match(container.name)
+            if match and int(match.group(1)) > replicas:
+                extra.append(container)
+        for result in run_parallel(lambda i: (i.stop(), i.remove()), extra, self.__workers):
+            if result.error:
+                raise DockerError("{0!s}: {1!s}".format(result.item.name, result.error))
+        LOGGER.debug("Scaled container '%s' to %d replicas", self.info.name, replicas)
+
+    @api_operation
+    @_container_locked
     def start(self) -> None:
         """Starts a container.
 
         Notes:
             The container is started in daemonized (background, detached)
-            mode.
+            mode. Resource limits that changed in the stored definition are
+            applied to an existing container, including one created by
+            prepare(), before it is started.
         """
+        if self.info.replicas:
+            self.__each('start')
+            return
         LOGGER.debug("Starting container: %s", self.info.name)
         self.__get()
         if not self.__container:
             self.run()
         else:
+            if not self.update_limits():
+                LOGGER.warning("Container '%s' must be rebuilt to apply its resource limits.", self.info.name)
             self.__container.start()
         LOGGER.debug("Started container: %s", self.info.name)
 
+    @api_operation
+    def wait_ready(self, timeout: int = DEFAULT_READY_TIMEOUT) -> None:
+        """Waits for a started container, or every replica, to be running and healthy.
+
+        Args:
+            timeout: Seconds to wait.
+
+        Raises:
+            DockerError: If the container stops, becomes unhealthy, or is not ready before ``timeout``.
+        """
+        wait_ready(self.__client, [i.info.name for i in self.replicas()], timeout)
+
+    @api_operation
+    @_container_locked
     def stop(self) -> None:
-        """Stops a running container."""
+        """Stops a running container. A container that does not exist is treated as already stopped."""
+        if self.info.replicas:
+            self.__each('stop')
+            return
         LOGGER.debug("Stopping container: %s", self.info.name)
         self.__get()
+        if not self.__container:
+            LOGGER.debug("Container '%s' does not exist, nothing to stop", self.info.name)
+            return
         self.__container.stop()
         LOGGER.debug("Stopped container: %s", self.info.name)
 
+    def __limit_changes(self) -> Tuple[dict, List[str]]:
+        host_config = self.__container.attrs.get('HostConfig', {})
+        live, recreate = dict(), []
+        for attr, key in LIMIT_ATTRS.items():
+            wanted = limit_value(attr, getattr(self.info, attr))
+            if wanted == (host_config.get(key) or None) or (wanted is None and attr in LIMIT_ATTRS_DEFAULTED):
+                continue
+            if wanted is not None and attr in LIMIT_ATTRS_LIVE:
+                live[attr] = getattr(self.info, attr)
+            else:
+                recreate.append(attr)
+
+        return live, recreate
+
+    @api_operation
+    @_container_locked
+    def update_limits(self) -> bool:
+        """Applies the resource limits in the stored definition to the existing container without recreating it.
+
+        Returns:
+            True if the container matches the stored limits, or does not exist. False if a changed limit cannot be
+            applied to an existing container and the container must be rebuilt.
+        """
+        if self.info.replicas:
+            return all(self.__each('update_limits'))
+        self.__get()
+        if not self.__container:
+            return True
+
+        live, recreate = self.__limit_changes()
+        if recreate:
+            LOGGER.debug("Container '%s' must be rebuilt to change: %s", self.info.name, ', '.join(sorted(recreate)))
+            return False
+        if live:
+            LOGGER.debug("Updating limits for container '%s': %s", self.info.name, live)
+            self.__container.update(**live)
+
+        return True
+
     def tag(self, img_tag: str) -> None:
         """Set the tag for this containers image.
 
@@ -311,8 +743,7 @@ def tag(self, img_tag: str) -> None:
         LOGGER.debug("Setting tag for container: %s", self.info.name)
         self.__get()
         self.info.tag = img_tag
-        if self.file_p:
-            _save_container_file(self.info.name, self.file_p, self.info.to_dict())
+        self.save()
 
     def update(self) -> None:
         """Updates the image for a container."""
@@ -326,8 +757,21 @@ class DockerContainers(object):
         client: Initialized DockerClient class (Required)
         config_path: Path to base of configuration directory
         groups: Initialized DockerGroups class (Not required)
+
+    Keyword Args:
+        archive (DockerImageArchive): Image archive to load images from before pulling them from a registry.
+        mirrors (dict): Registry mirrors, keyed by the registry they mirror. Used for images without mirrors of their
+                        own.
+        timeout (int): Seconds an operation on a container may take, for containers without an operation_timeout.
+        token_cache (TokenCache): Registry token cache shared by the images of all containers.
+        workers (int): Maximum number of replicas to operate on at the same time.
     """
-    def __init__(self, client: docker.DockerClient, config_path: str, groups: DockerGroups = None) -> None:
+    def __init__(self, client: docker.DockerClient, config_path: str, groups: DockerGroups = None, **kwargs) -> None:
+        self.__archive = kwargs.get('archive', None)
+        self.__mirrors = kwargs.get('mirrors', None) or {}
+        self.__timeout = kwargs.get('timeout', 0)
+        self.__token_cache = kwargs.get('token_cache', None)
+        self.__workers = kwargs.get('workers', DEFAULT_WORKERS)
         self.__client = client
         self.__config_path = os.path.join(os.path.abspath(config_path), 'containers')
         fops.mkdir(self.__config_path)
@@ -346,6 +790,12 @@ def __list_defined(self) -> dict:
 
         return containers
 
+    def __image_mirrors(self, container_info: ContainerOpts) -> list:
+        if container_info.image_mirrors or container_info.image_build_path:
+            return container_info.image_mirrors
+        return self.__mirrors.get(parse_reference(container_info.image)[0], [])
+
+    @api_operation
     def define(self, container_def: str) -> str:
         """Adds a container via a container definition file
 
@@ -365,21 +815,24 @@ def define(self, container_def: str) -> str:
             err_s = "Container '{0!s}' already defined.".format(c_opts['name'])
             raise DockerError(err_s)
 
+        if self.__groups and c_opts['group'] and c_opts['group'] not in self.__groups.list():
+            err_s = _ERR_CONTAINER_UNDEF_GROUP.format(c_opts['name'])
+            raise ConfigError(err_s)
+
+        file_path = os.path.join(self.__config_path, "{0!s}.yaml".format(c_opts['name']))
+        _save_container_file(c_opts['name'], file_path, c_opts.to_dict())
+        self.__containers[c_opts['name']] = file_path
+
+        # membership is recorded only once the definition is on file
         if self.__groups and c_opts['group']:
-            if c_opts['group'] not in self.__groups.list():
-                err_s = _ERR_CONTAINER_UNDEF_GROUP.format(c_opts['name'])
-                raise ConfigError(err_s)
             g_info = self.__groups.get(c_opts['group'])
             if c_opts['name'] not in g_info.members:
                 g_info.members.append(c_opts['name'])
-                self.__groups.save()
-
-        self.__containers[c_opts['name']] = os.path.join(self.__config_path, "{0!s}.yaml".format(c_opts['name']))
-
-        _save_container_file(c_opts['name'], self.__containers[c_opts['name']], c_opts.to_dict())
+                self.__groups.save([c_opts['group']])
 
         return c_opts.name
 
+    @api_operation
     def get(self, container_name: str) -> DockerContainer:
         """Returns an already defined container
 
@@ -394,20 +847,38 @@ def get(self, container_name: str) -> DockerContainer:
             raise DockerError(err_s.format(container_name))
 
         LOGGER.debug("Reading container info for %s", container_name)
-        file_d = fops.file_read_convert(self.__containers[container_name], 'YAML')
+        file_d = read_yaml(self.__containers[container_name])
 
         LOGGER.debug("Validating container info for %s", container_name)
         container_info = self.validate_container_options(file_d)
 
         LOGGER.debug("Initializing image class for %s", container_name)
         container_image = DockerImage(self.__client, container_info.image,
+                                      archive=self.__archive,
+                                      build_args=container_info.image_build_args,
+                                      build_cache_dir=container_info.image_build_cache_dir,
+                                      build_cache_export=container_info.image_build_cache_export,
+                                      build_cache_from=container_info.image_build_cache_from,
                                       build_path=container_info.image_build_path,
                                       build_squash=container_info.image_build_squash,
+                                      build_target=container_info.image_build_target,
                                       insecure_registry=container_info.image_insecure,
+                                      mirrors=self.__image_mirrors(container_info),
                                       username=container_info.image_username,
-                                      password=container_info.image_password)
+                                      password=container_info.image_password,
+                                      timeout=container_info.operation_timeout or self.__timeout,
+                                      token_cache=self.__token_cache)
 
-        return DockerContainer(self.__client, container_info, container_image, file_p=self.__containers[container_name])
+        return DockerContainer(self.__client, container_info, container_image, file_p=self.__containers[container_name],
+                               timeout=self.__timeout, workers=self.__workers)
+
+    def images(self) -> list:
+        """Returns a list of images used by currently defined containers.
+
+        Returns:
+            A list of image references used by currently defined containers, with their tags.
+        """
+        return sorted({tagged_reference(self.get(i).info.image) for i in self.__containers})
 
     def list(self) -> list:
         """Returns a list of currently defined containers.
@@ -431,17 +902,4 @@ def validate_container_options(options: dict) -> ContainerOpts:
         Raises:
             ConfigError: If type of data is incorrect or data is missing.
        """
-        validated = ContainerOpts()
-        for key in validated.keys():
-            if key in options:
-                data = options[key]
-                if isinstance(data, (bytes, str)):
-                    data = fops.makestr(data)
-                validated.set_with_type(key, data)
-
-        if not validated.image:
-            raise ConfigError("'image' not defined in container options.")
-        if not validated.name:
-            raise ConfigError("'name' not defined in container options.")
-
-        return validated
+        return validate_options(options)
@@ -0,0 +1,302 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# context.py : Docker Build Contexts
+"""ElJef Docker Build Contexts.
+
+This module holds functionality for streaming build contexts to the engine from a directory, or from a git
+repository without checking it out.
+"""
+import logging
+import os
+import re
+import subprocess
+import tarfile
+import tempfile
+
+from typing import Dict
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from docker.utils.build import PatternMatcher
+
+from eljef.core.check import version_check
+
+from eljef.docker.exceptions import DockerError
+from eljef.docker.stream import CHUNK_SIZE
+from eljef.docker.stream import ChunkPipe
+from eljef.docker.stream import ChunkReader
+from eljef.docker.stream import pipe_from
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+DOCKERFILE = 'Dockerfile'
+DOCKERIGNORE = '.dockerignore'
+GIT_COMMAND = 'git'
+GIT_SEPARATOR = '#'
+
+_ARG_RE = re.compile(r'^ARG\s+([A-Za-z_][A-Za-z0-9_]*)(?:=(\S*))?', re.IGNORECASE)
+_FROM_RE = re.compile(r'^FROM\s+(?:--\S+\s+)*(\S+)(?:\s+AS\s+(\S+))?', re.IGNORECASE)
+_VAR_RE = re.compile(r'\$(?:\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}|([A-Za-z_][A-Za-z0-9_]*))')
+
+# always sent, so the engine can read them even if .dockerignore excludes them
+_ALWAYS = {DOCKERFILE, DOCKERIGNORE}
+
+
+def git_source(build_path: str) -> Union[Tuple[str, str, str], None]:
+    """Splits a git build source into its parts.
+
+    Git sources are given as /path/to/repository#ref or /path/to/repository#ref:subdirectory.
+
+    Args:
+        build_path: Build path or git source.
+
+    Returns:
+        A tuple of (repository, ref, subdirectory), or None if ``build_path`` is a plain directory. Paths holding the
+        separator are only git sources if the part before it is a git repository, so /srv/app#2 may be a directory.
+    """
+    if GIT_SEPARATOR not in build_path or os.path.isdir(build_path):
+        return None
+
+    repository, ref = build_path.rsplit(GIT_SEPARATOR, 1)
+    if not _git_repository(repository):
+        return None
+    ref, _, subdir = ref.partition(':')
+
+    return repository, ref or 'HEAD', subdir.strip('/')
+
+
+def _git(repository: str, *args, stderr=subprocess.PIPE) -> subprocess.Popen:
+    return subprocess.Popen([GIT_COMMAND, '-C', repository] + list(args), stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=stderr)
+
+
+def _git_repository(repository: str) -> bool:
+    if not os.path.isdir(repository):
+        return False
+    try:
+        proc = _git(repository, 'rev-parse', '--git-dir', stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
+    proc.communicate()
+
+    return proc.returncode == 0
+
+
+def _git_file(source: Tuple[str, str, str], file_name: str) -> Union[str, None]:
+    repository, ref, subdir = source
+    path = '/'.join(i for i in (subdir, file_name) if i)
+    proc = _git(repository, 'show', "{0!s}:{1!s}".format(ref, path))
+    out, _ = proc.communicate()
+
+    return out.decode('utf-8') if proc.returncode == 0 else None
+
+
+def read_context_file(build_path: str, file_name: str) -> Union[str, None]:
+    """Reads a file from the root of a build context.
+
+    Args:
+        build_path: Build path or git source.
+        file_name: Name of file. (ie: Dockerfile)
+
+    Returns:
+        Contents of the file, or None if it does not exist.
+    """
+    source = git_source(build_path)
+    if source:
+        return _git_file(source, file_name)
+
+    file_path = os.path.join(build_path, file_name)
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r', encoding='utf-8') as open_file:
+        return open_file.read()
+
+
+def _instructions(dockerfile: str) -> List[str]:
+    ret, current = [], ''
+    for line in dockerfile.splitlines():
+        line = line.strip()
+        if not current and (not line or line.startswith('#')):
+            continue
+        if line.endswith('\\'):
+            current += line[:-1] + ' '
+            continue
+        ret.append(current + line)
+        current = ''
+
+    return ret
+
+
+def _expand(value: str, args: Dict[str, str]) -> str:
+    return _VAR_RE.sub(lambda m: args.get(m.group(1) or m.group(3)) or m.group(2) or '', value)
+
+
+def _patterns(build_path: str) -> list:
+    ignore = read_context_file(build_path, DOCKERIGNORE) or ''
+    lines = [i.strip() for i in ignore.splitlines()]
+
+    return PatternMatcher([i for i in lines if i and not i.startswith('#')]).patterns
+
+
+def dockerfile_parents(dockerfile: str, build_args: Dict[str, str] = None) -> Set[str]:
+    """Returns the images a Dockerfile builds FROM.
+
+    ARG values declared before the first FROM, and ``build_args``, are substituted. References to earlier build
+    stages and ``scratch`` are not included.
+
+    Args:
+        dockerfile: Contents of Dockerfile.
+        build_args: Build-time variables the image is built with.
+
+    Returns:
+        A set of image references.
+    """
+    args, stages, parents = dict(), set(), set()
+    for instruction in _instructions(dockerfile):
+        arg = _ARG_RE.match(instruction)
+        if arg and not stages:
+            args[arg.group(1)] = (build_args or {}).get(arg.group(1), arg.group(2) or '')
+            continue
+        match = _FROM_RE.match(instruction)
+        if not match:
+            continue
+        parent = _expand(match.group(1), args)
+        if parent.lower() != 'scratch' and parent not in stages:
+            parents.add(parent)
+        stages.add(match.group(2) or '')
+
+    return parents
+
+
+def excluded(patterns: list, path: str) -> bool:
+    """Determines if a path is excluded from a build context by .dockerignore patterns.
+
+    A pattern applies to a path if it matches the path or one of its parent directories. The last pattern that
+    applies decides, so ``!`` patterns can include paths inside excluded directories.
+
+    Args:
+        patterns: Patterns from PatternMatcher.
+        path: Path relative to the root of the context, separated by ``/``.
+
+    Returns:
+        True if the path is excluded.
+    """
+    if path in _ALWAYS:
+        return False
+
+    parts = path.split('/')
+    prefixes = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    ret = False
+    for pattern in patterns:
+        if any(pattern.match(i) for i in prefixes):
+            ret = not pattern.exclusion
+
+    return ret
+
+
+def _walk(build_path: str, patterns: list) -> List[str]:
+    prune = not any(i.exclusion for i in patterns)
+    ret = []
+    for root, dirs, files in os.walk(build_path):
+        rel_root = os.path.relpath(root, build_path).replace(os.sep, '/')
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        for name in sorted(dirs):
+            if os.path.islink(os.path.join(root, name)):
+                dirs.remove(name)
+                files.append(name)
+            elif not excluded(patterns, rel_root + name):
+                ret.append(rel_root + name)
+            elif prune:
+                dirs.remove(name)
+        dirs.sort()
+        ret += [rel_root + i for i in sorted(files) if not excluded(patterns, rel_root + i)]
+
+    return ret
+
+
+def _directory_tar(pipe: ChunkPipe, build_path: str) -> None:
+    patterns = _patterns(build_path)
+    with tarfile.open(fileobj=pipe, mode='w|', bufsize=CHUNK_SIZE, format=tarfile.PAX_FORMAT) as tar:
+        for path in _walk(build_path, patterns):
+            file_path = os.path.join(build_path, path)
+            info = tar.gettarinfo(file_path, arcname=path)
+            info.uid, info.gid, info.uname, info.gname = 0, 0, '', ''
+            if info.isreg():
+                with open(file_path, 'rb') as open_file:
+                    tar.addfile(info, open_file)
+            else:
+                tar.addfile(info)
+
+
+def _git_tar_copy(pipe: ChunkPipe, chunks, patterns: list) -> None:
+    if not patterns:
+        for chunk in chunks:
+            pipe.write(chunk)
+        return
+
+    with tarfile.open(fileobj=ChunkReader(chunks), mode='r|') as source_tar:
+        with tarfile.open(fileobj=pipe, mode='w|', bufsize=CHUNK_SIZE, format=tarfile.PAX_FORMAT) as tar:
+            for member in source_tar:
+                if not excluded(patterns, member.name.rstrip('/')):
+                    tar.addfile(member, source_tar.extractfile(member) if member.isreg() else None)
+    for _ in chunks:
+        continue
+
+
+def _git_tar(pipe: ChunkPipe, source: Tuple[str, str, str], patterns: list) -> None:
+    repository, ref, subdir = source
+    # stderr goes to a file, a pipe left unread while stdout is drained blocks git once it fills
+    with tempfile.TemporaryFile() as err_file:
+        proc = _git(repository, 'archive', '--format=tar', "{0!s}:{1!s}".format(ref, subdir) if subdir else ref,
+                    stderr=err_file)
+        try:
+            _git_tar_copy(pipe, iter(lambda: proc.stdout.read(CHUNK_SIZE), b''), patterns)
+        finally:
+            proc.stdout.close()
+            if proc.wait() != 0:
+                err_file.seek(0)
+                err_s = err_file.read().decode('utf-8', 'replace').strip()
+                raise DockerError("git archive of '{0!s}' failed: {1!s}".format(repository, err_s))
+
+
+def build_context(build_path: str) -> ChunkPipe:
+    """Streams a build context as a tar archive.
+
+    The archive is written by a separate thread while the engine reads it, so no temporary file is needed and only
+    a few chunks are held in memory. Paths excluded by .dockerignore are skipped while walking, without reading
+    them.
+
+    Args:
+        build_path: Directory holding the Dockerfile, or a git source (/path/to/repository#ref[:subdirectory]).
+                    Git sources are read from the object database with git archive, without a checkout.
+
+    Returns:
+        The ChunkPipe to read the archive from.
+    """
+    source = git_source(build_path)
+    if source:
+        LOGGER.debug("Streaming build context from git: %s at %s", source[0], source[1])
+        return pipe_from(_git_tar, source, _patterns(build_path))
+
+    if not os.path.isdir(build_path):
+        raise DockerError("Build path '{0!s}' is not a directory".format(build_path))
+
+    LOGGER.debug("Streaming build context from %s", build_path)
+    return pipe_from(_directory_tar, build_path)
@@ -0,0 +1,212 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# deadline.py : Operation Deadlines
+"""ElJef Docker Operation Deadlines.
+
+This module holds functionality for bounding how long operations, and batches of operations, may run.
+"""
+import contextlib
+import logging
+import queue
+import threading
+import time
+
+from typing import Iterable
+from typing import Iterator
+from typing import Union
+
+from eljef.core.check import version_check
+
+from eljef.docker.exceptions import DeadlineError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+_END = object()
+_LOCAL = threading.local()
+_QUEUE_DEPTH = 16
+
+
+class Deadline(object):
+    """Point in time an operation must finish by
+
+    Args:
+        seconds: Seconds from now.
+        name: Name of the operation, used in error messages.
+    """
+    def __init__(self, seconds: float, name: str = 'operation') -> None:
+        self.__cancelled = threading.Event()
+        self.__end = time.monotonic() + seconds
+        self.__seconds = seconds
+        self.name = name
+
+    def cancel(self) -> None:
+        """Cancels the operation. Work checking this deadline stops at its next check."""
+        self.__cancelled.set()
+
+    def check(self) -> None:
+        """Raises DeadlineError if the deadline has passed or the operation was cancelled."""
+        if self.__cancelled.is_set():
+            raise DeadlineError("{0!s} cancelled".format(self.name))
+        if self.remaining() <= 0:
+            raise DeadlineError("{0!s} did not finish within {1!s}s".format(self.name, self.__seconds))
+
+    def expired(self) -> bool:
+        """Returns True if the deadline has passed or the operation was cancelled."""
+        return self.__cancelled.is_set() or self.remaining() <= 0
+
+    def remaining(self) -> float:
+        """Returns the seconds left before the deadline."""
+        return self.__end - time.monotonic()
+
+
+def _stack() -> list:
+    if not hasattr(_LOCAL, 'stack'):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+
+def check() -> None:
+    """Raises DeadlineError if any deadline active in this thread has passed or was cancelled."""
+    for active in _stack():
+        active.check()
+
+
+def current() -> Union[Deadline, None]:
+    """Returns the deadline active in this thread that ends first, or None if there is none."""
+    stack = _stack()
+    return min(stack, key=lambda i: i.remaining()) if stack else None
+
+
+def context() -> tuple:
+    """Returns the deadlines active in this thread, to be passed to ``inherit`` in another thread."""
+    return tuple(_stack())
+
+
+def remaining(default: float = None) -> Union[float, None]:
+    """Returns the seconds left before the first active deadline, or ``default`` if there is none.
+
+    Raises:
+        DeadlineError: If the deadline has passed.
+    """
+    check()
+    active = current()
+    if not active:
+        return default
+
+    return active.remaining() if default is None else min(default, active.remaining())
+
+
+@contextlib.contextmanager
+def deadline(seconds: float, name: str = 'operation') -> Iterator[Union[Deadline, None]]:
+    """Context manager running the enclosed code under a deadline.
+
+    Deadlines nest. The one ending first applies.
+
+    Args:
+        seconds: Seconds the enclosed code may run. No deadline is set if 0 or less.
+        name: Name of the operation, used in error messages.
+
+    Yields:
+        The Deadline, so it can be cancelled, or None if no deadline was set.
+    """
+    if not seconds or seconds <= 0:
+        yield None
+        return
+
+    active = Deadline(seconds, name)
+    stack = _stack()
+    stack.append(active)
+    try:
+        yield active
+    finally:
+        stack.remove(active)
+
+
+@contextlib.contextmanager
+def inherit(deadlines: tuple) -> Iterator[None]:
+    """Context manager making deadlines from another thread active in this thread."""
+    stack = _stack()
+    saved = list(stack)
+    stack[:] = saved + [i for i in deadlines if i not in saved]
+    try:
+        yield
+    finally:
+        stack[:] = saved
+
+
+def _put(out: queue.Queue, item, aborted: threading.Event) -> bool:
+    while not aborted.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def _produce(items: Iterable, out: queue.Queue, aborted: threading.Event) -> None:
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            if not _put(out, item, aborted):
+                return
+        _put(out, _END, aborted)
+    except Exception as err:  # pylint: disable=broad-except
+        _put(out, err, aborted)
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+
+def iterate(items: Iterable) -> Iterator:
+    """Iterates over a stream, such as engine pull or build output, under the active deadlines.
+
+    The stream is read in a separate thread, so a stream that stops sending does not block past the deadline.
+
+    Args:
+        items: Stream to iterate over.
+
+    Yields:
+        Items from the stream.
+
+    Raises:
+        DeadlineError: If the deadline passes before the stream ends.
+    """
+    check()
+    if not current():
+        yield from items
+        return
+
+    aborted = threading.Event()
+    out = queue.Queue(_QUEUE_DEPTH)
+    threading.Thread(target=_produce, args=(items, out, aborted), daemon=True).start()
+    try:
+        while True:
+            check()
+            try:
+                item = out.get(timeout=max(0.0, min(0.5, current().remaining())))
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        aborted.set()
@@ -0,0 +1,222 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# distribute.py : Docker Image Distribution
+"""ElJef Docker Image Distribution.
+
+This module holds functionality for copying an image from one engine to many engines in a fan-out tree.
+"""
+import logging
+import tarfile
+import time
+
+from typing import List
+from typing import Set
+from typing import Tuple
+
+import docker
+
+from docker.errors import APIError
+from docker.errors import ImageNotFound
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.cleanup import shared_layers
+from eljef.docker.exceptions import DeadlineError
+from eljef.docker.exceptions import DockerError
+from eljef.docker.parallel import run_parallel
+from eljef.docker.stream import CHUNK_SIZE
+from eljef.docker.stream import ChunkPipe
+from eljef.docker.stream import ChunkReader
+from eljef.docker.stream import pipe_from
+from eljef.docker.transport import engine_client
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+DISTRIBUTE_TIMEOUT = 600
+SEED = 'seed'
+
+_BLOB_PREFIX = 'blobs/sha256/'
+
+
+class DistributeHop(DictObj):
+    """Single image transfer between two engines
+
+    Args:
+        source: Engine the image was sent from.
+        target: Engine the image was sent to.
+    """
+    def __init__(self, source: str, target: str) -> None:
+        super().__init__()
+        self.bytes = 0
+        self.seconds = 0.0
+        self.skipped_bytes = 0
+        self.source = source
+        self.target = target
+
+    def rate(self) -> float:
+        """Returns the throughput of the transfer in bytes per second."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class DistributeReport(DictObj):
+    """Image distribution report class"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.failed = dict()
+        self.hops = []
+        self.rounds = 0
+        self.skipped = []
+
+
+class DockerImageDistributor(object):
+    """Docker image distribution class
+
+    The image is streamed from the seed engine (``docker save``) into the first target (``docker load``). From then
+    on every engine holding the image sends it to one engine that does not, so the number of engines holding it
+    doubles each round and no engine sends more than one stream at a time. The engine API has no way for one engine
+    to send an image to another, so every stream is relayed through this process: each hop crosses this host's link
+    twice, and a round carries as many streams as it has hops. This host's bandwidth, not the number of rounds, is
+    what bounds the time taken, which grows with the number of engines.
+
+    Layers a target already holds are left out of the stream when the source writes OCI layout archives
+    (Docker 25 and later). The engine only reads layers it does not have.
+
+    Args:
+        client: Initialized DockerClient class for the seed engine. (Required)
+        targets: URLs of the engines to distribute to. (ie: tcp://host:2375, ssh://user@host)
+
+    Keyword Args:
+        timeout (int): Timeout in seconds for each request to a target engine.
+    """
+    def __init__(self, client: docker.DockerClient, targets: List[str], **kwargs) -> None:
+        self.__clients = {SEED: client}
+        self.__targets = list(targets)
+        self.__timeout = kwargs.get('timeout', DISTRIBUTE_TIMEOUT)
+
+    def __client(self, engine: str) -> docker.DockerClient:
+        if engine not in self.__clients:
+            self.__clients[engine] = engine_client(engine, timeout=self.__timeout)
+
+        return self.__clients[engine]
+
+    def __held_layers(self, engine: str, image_ref: str, layers: List[str]) -> Set[str]:
+        best = 0
+        repository = image_ref.rsplit(':', 1)[0] if ':' in image_ref.rsplit('/', 1)[-1] else image_ref
+        for image in self.__client(engine).images.list(name=repository):
+            other = self.__client(engine).api.inspect_image(image.id).get('RootFS', {}).get('Layers') or []
+            best = max(best, shared_layers(layers, other))
+
+        return set(layers[:best])
+
+    @staticmethod
+    def __filter(pipe: ChunkPipe, chunks, skip: Set[str], hop: DistributeHop) -> None:
+        with tarfile.open(fileobj=ChunkReader(chunks), mode='r|') as source:
+            with tarfile.open(fileobj=pipe, mode='w|', format=tarfile.GNU_FORMAT) as target:
+                for member in source:
+                    if member.isfile() and member.name.startswith(_BLOB_PREFIX) and \
+                            'sha256:' + member.name[len(_BLOB_PREFIX):] in skip:
+                        hop.skipped_bytes += member.size
+                        continue
+                    target.addfile(member, source.extractfile(member) if member.isfile() else None)
+        for _ in chunks:
+            continue
+
+    def __status(self, engine: str, image_id: str) -> bool:
+        try:
+            return self.__client(engine).images.get(image_id).id == image_id
+        except ImageNotFound:
+            return False
+
+    def __transfer(self, hop: DistributeHop, image_ref: str, skip: Set[str]) -> None:
+        def _counted(chunks):
+            for chunk in chunks:
+                hop.bytes += len(chunk)
+                yield chunk
+
+        hop.bytes, hop.skipped_bytes = 0, 0
+        start = time.monotonic()
+        chunks = self.__client(hop.source).api.get_image(image_ref, chunk_size=CHUNK_SIZE)
+        if skip:
+            chunks = pipe_from(self.__filter, chunks, skip, hop)
+        for line in self.__client(hop.target).api.load_image(_counted(chunks)) or []:
+            if 'error' in line:
+                raise DockerError("Loading '{0!s}' on {1!s} failed: {2!s}".format(image_ref, hop.target, line['error']))
+            LOGGER.debug(line.get('stream', '').strip())
+        hop.seconds = time.monotonic() - start
+
+    def __send(self, pair: Tuple[str, str], image_ref: str, layers: List[str]) -> DistributeHop:
+        hop = DistributeHop(*pair)
+        skip = self.__held_layers(hop.target, image_ref, layers)
+        LOGGER.debug("Sending '%s' from %s to %s, %d of %d layers already held", image_ref, hop.source, hop.target,
+                     len(skip), len(layers))
+        try:
+            self.__transfer(hop, image_ref, skip)
+        except DeadlineError:
+            raise
+        except (APIError, DockerError) as err:
+            if not skip:
+                raise
+            LOGGER.debug("Sending '%s' to %s without held layers failed, sending every layer: %s", image_ref,
+                         hop.target, err)
+            self.__transfer(hop, image_ref, set())
+
+        return hop
+
+    def distribute(self, image_ref: str) -> DistributeReport:
+        """Copies an image from the seed engine to every target engine that does not hold it.
+
+        Args:
+            image_ref: Image reference to distribute. It must be present on the seed engine.
+
+        Returns:
+            A filled DistributeReport information holder.
+
+        Raises:
+            DockerError: If the image is not present on the seed engine.
+        """
+        try:
+            image_attrs = self.__client(SEED).images.get(image_ref).attrs
+        except ImageNotFound:
+            raise DockerError("Image '{0!s}' not present on the seed engine".format(image_ref))
+        layers = image_attrs.get('RootFS', {}).get('Layers') or []
+
+        report = DistributeReport()
+        pending = []
+        for result in run_parallel(lambda i: self.__status(i, image_attrs['Id']), self.__targets, len(self.__targets)):
+            if result.error:
+                report.failed[result.item] = str(result.error)
+            elif result.result:
+                report.skipped.append(result.item)
+            else:
+                pending.append(result.item)
+
+        holders = [SEED] + report.skipped
+        while pending:
+            pairs = list(zip(holders, pending))
+            pending = pending[len(pairs):]
+            report.rounds += 1
+            LOGGER.debug("Distribution round %d: %s", report.rounds, ', '.join(i[1] for i in pairs))
+            for result in run_parallel(lambda i: self.__send(i, image_ref, layers), pairs, len(pairs)):
+                if result.error:
+                    report.failed[result.item[1]] = str(result.error)
+                else:
+                    report.hops.append(result.result)
+                    holders.append(result.item[1])
+
+        return report
@@ -24,13 +24,39 @@
 """
 import logging
 import os
+
+from typing import List
+
 import docker
 
 from eljef.core import fops
 from eljef.core.check import version_check
 
+from eljef.docker.archive import ArchiveReport
+from eljef.docker.archive import DockerImageArchive
+from eljef.docker.cleanup import DockerImageGC
+from eljef.docker.cleanup import GCReport
 from eljef.docker.containers import DockerContainers
+from eljef.docker.deadline import deadline
+from eljef.docker.distribute import DistributeReport
+from eljef.docker.distribute import DockerImageDistributor
+from eljef.docker.exceptions import ConfigError
+from eljef.docker.governor import KIND_BUILD
+from eljef.docker.governor import KIND_PULL
+from eljef.docker.governor import KIND_RECREATE
+from eljef.docker.governor import Governor
+from eljef.docker.governor import install
 from eljef.docker.group import DockerGroups
+from eljef.docker.image import DockerImage
+from eljef.docker.pullplan import DockerPullPlanner
+from eljef.docker.pullplan import PullReport
+from eljef.docker.registry import parse_reference
+from eljef.docker.settings import read_settings
+from eljef.docker.stats import API_STATS
+from eljef.docker.stats import api_operation
+from eljef.docker.tokens import TOKEN_FILE
+from eljef.docker.tokens import TokenCache
+from eljef.docker.transport import engine_client
 
 LOGGER = logging.getLogger(__name__)
 
@@ -42,15 +68,136 @@ class Docker(object):
 
     Args:
         config_path: Path to base configuration directory.
-        host: If the host running dockerd is remote, the hostname must should be provided in [hostname/ip]:port format.
+        host: URL of the engine, if it is not the one configured in the environment. (ie: tcp://host:2375,
+              ssh://user@host) One SSH connection is kept open per ssh:// host.
     """
     def __init__(self, config_path: str, host: str = None) -> None:
         fops.mkdir(os.path.abspath(config_path))
-        self.__client = self.__connect(host)
+        self.settings = read_settings(config_path)
+        self.__client = self.__connect(host, self.settings.engine_timeout)
+        API_STATS.attach(self.__client)
+        self.governor = Governor(config_path, {KIND_BUILD: self.settings.max_parallel_builds,
+                                               KIND_PULL: self.settings.max_parallel_pulls,
+                                               KIND_RECREATE: self.settings.max_parallel_recreates})
+        install(self.governor)
         self.groups = DockerGroups(config_path)
-        self.containers = DockerContainers(self.__client, config_path, self.groups)
+        archive = None
+        if self.settings.image_archive_path and self.settings.image_archive_pull:
+            archive = self.image_archive()
+        token_file = None
+        if self.settings.registry_token_cache:
+            token_file = os.path.join(os.path.abspath(config_path), TOKEN_FILE)
+        self.containers = DockerContainers(self.__client, config_path, self.groups, archive=archive,
+                                           mirrors=self.settings.registry_mirrors, token_cache=TokenCache(token_file),
+                                           timeout=self.settings.operation_timeout, workers=self.settings.max_workers)
 
     @staticmethod
-    def __connect(host: str = None) -> docker.DockerClient:
+    def __connect(host: str = None, timeout: int = None) -> docker.DockerClient:
         LOGGER.debug('Creating docker connection client.')
-        return docker.from_env() if host else docker.DockerClient(base_url=host)
+        return engine_client(host, timeout=timeout)
+
+    @api_operation
+    def distribute_image(self, image_ref: str, targets: List[str] = None) -> DistributeReport:
+        """Copies an image from this engine to other engines in a fan-out tree.
+
+        The image is pulled on this engine first if it is not present.
+
+        Args:
+            image_ref: Image reference to distribute.
+            targets: URLs of the engines to distribute to. Defaults to the ``distribute_targets`` setting.
+
+        Returns:
+            A filled DistributeReport information holder.
+
+        Raises:
+            ConfigError: If no targets are given or set.
+        """
+        targets = targets or self.settings.distribute_targets
+        if not targets:
+            raise ConfigError("'distribute_targets' not set and no targets given.")
+
+        image = DockerImage(self.__client, image_ref,
+                            mirrors=self.settings.registry_mirrors.get(parse_reference(image_ref)[0], []))
+        if not image.local_id():
+            image.pull()
+
+        return DockerImageDistributor(self.__client, targets).distribute(image.name)
+
+    @api_operation
+    def gc_images(self, keep: int = None) -> GCReport:
+        """Removes images no longer used by any defined container.
+
+        Args:
+            keep: Number of unused images per repository to keep for rollback. Defaults to the ``image_gc_keep``
+                  setting.
+
+        Returns:
+            A filled GCReport information holder.
+
+        Raises:
+            ConfigError: If ``keep`` is less than 0.
+        """
+        keep = self.settings.image_gc_keep if keep is None else keep
+        if keep < 0:
+            raise ConfigError("Number of images to keep must be 0 or more, not {0!s}".format(keep))
+        collector = DockerImageGC(self.__client, workers=self.settings.max_workers)
+
+        return collector.collect(self.containers.images(), keep)
+
+    def image_archive(self, archive_path: str = None) -> DockerImageArchive:
+        """Returns an image archive.
+
+        Args:
+            archive_path: Path to directory holding the archive. Defaults to the ``image_archive_path`` setting.
+
+        Returns:
+            Initialized DockerImageArchive class.
+
+        Raises:
+            ConfigError: If no archive path is given or set.
+        """
+        archive_path = archive_path or self.settings.image_archive_path
+        if not archive_path:
+            raise ConfigError("'image_archive_path' not set and no archive path given.")
+
+        return DockerImageArchive(self.__client, archive_path, workers=self.settings.max_workers)
+
+    @api_operation
+    def load_images(self, archive_path: str = None) -> ArchiveReport:
+        """Loads every image held in an image archive that is not already present.
+
+        Args:
+            archive_path: Path to directory holding the archive. Defaults to the ``image_archive_path`` setting.
+
+        Returns:
+            A filled ArchiveReport information holder.
+        """
+        return self.image_archive(archive_path).load_all()
+
+    @api_operation
+    def pull_images(self, images: List[DockerImage]) -> PullReport:
+        """Pulls or builds images, ordering pulls so shared layers are only downloaded once.
+
+        Args:
+            images: Images to pull or build.
+
+        Returns:
+            A filled PullReport information holder.
+        """
+        planner = DockerPullPlanner(self.__client, workers=self.settings.max_workers,
+                                    build_workers=self.settings.max_parallel_builds)
+
+        with deadline(self.settings.batch_timeout, 'pull batch'):
+            return planner.pull(images)
+
+    @api_operation
+    def save_images(self, archive_path: str = None) -> ArchiveReport:
+        """Saves every image used by defined containers into an image archive.
+
+        Args:
+            archive_path: Path to directory holding the archive. Defaults to the ``image_archive_path`` setting.
+
+        Returns:
+            A filled ArchiveReport information holder.
+        """
+        return self.image_archive(archive_path).save_all(self.containers.images())
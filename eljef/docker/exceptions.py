@@ -47,3 +47,11 @@ class DockerError(Exception):
     def __init__(self, message: str = None) -> None:
         Exception.__init__(self, message)
         self.message = message
+
+
+class DeadlineError(DockerError):
+    """Deadline passed or operation cancelled error class.
+
+    Args:
+        message: Error Message
+    """
@@ -0,0 +1,168 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# governor.py : Host-wide Concurrency Governor
+"""ElJef Docker Host-wide Concurrency Governor.
+
+This module holds functionality for limiting engine operations across every process sharing a configuration
+directory.
+"""
+import contextlib
+import logging
+import os
+import re
+import threading
+import time
+
+from typing import Dict
+from typing import Iterator
+
+from eljef.core import fops
+from eljef.core.check import version_check
+
+from eljef.docker import deadline
+from eljef.docker.locks import FileLock
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+LOCK_DIR = 'locks'
+
+KIND_BUILD = 'build'
+KIND_CONTAINER = 'container'
+KIND_GROUP = 'group'
+KIND_PULL = 'pull'
+KIND_RECREATE = 'recreate'
+
+_SAFE_RE = re.compile(r'[^A-Za-z0-9_.-]')
+_SLOT_WAIT_MAX = 0.25
+
+_GOVERNOR = None
+
+
+class Governor(object):
+    """Host-wide concurrency governor class
+
+    Slots limit how many operations of a kind run at the same time across processes. Holds serialize operations
+    on the same container or group. Both are reentrant within a thread.
+
+    Args:
+        config_path: Path to base configuration directory.
+        limits: Dictionary of operation kind to number of slots. Kinds without a limit are not limited.
+    """
+    def __init__(self, config_path: str, limits: Dict[str, int]) -> None:
+        self.__held = threading.local()
+        self.__limits = limits
+        self.__path = os.path.join(os.path.abspath(config_path), LOCK_DIR)
+        fops.mkdir(self.__path)
+
+    def __held_set(self) -> set:
+        if not hasattr(self.__held, 'locks'):
+            self.__held.locks = set()
+        return self.__held.locks
+
+    def __lock_file(self, kind: str, name: str) -> str:
+        return os.path.join(self.__path, "{0!s}-{1!s}.lock".format(kind, _SAFE_RE.sub('_', str(name))))
+
+    @contextlib.contextmanager
+    def hold(self, kind: str, name: str) -> Iterator[None]:
+        """Context manager holding an exclusive lock on one container or group.
+
+        Args:
+            kind: KIND_CONTAINER or KIND_GROUP.
+            name: Name of the container or group.
+
+        Raises:
+            DeadlineError: If an active deadline passes while waiting for the lock.
+        """
+        lock_file = self.__lock_file(kind, name)
+        held = self.__held_set()
+        if lock_file in held:
+            yield
+            return
+
+        lock = FileLock(lock_file)
+        if not lock.acquire(False):
+            LOGGER.info("Waiting for another operation on %s '%s' to finish", kind, name)
+            delay = 0.05
+            while not lock.acquire(False):
+                deadline.check()
+                time.sleep(delay)
+                delay = min(delay * 2, _SLOT_WAIT_MAX)
+        held.add(lock_file)
+        try:
+            yield
+        finally:
+            held.discard(lock_file)
+            lock.release()
+
+    @contextlib.contextmanager
+    def slot(self, kind: str) -> Iterator[None]:
+        """Context manager holding one of the slots for an operation kind.
+
+        Args:
+            kind: KIND_BUILD, KIND_PULL, or KIND_RECREATE.
+
+        Raises:
+            DeadlineError: If an active deadline passes while waiting for a slot.
+        """
+        held = self.__held_set()
+        if self.__limits.get(kind, 0) <= 0 or kind in held:
+            yield
+            return
+
+        delay = 0.05
+        while True:
+            for index in range(self.__limits[kind]):
+                lock = FileLock(self.__lock_file(kind, index))
+                if lock.acquire(False):
+                    held.add(kind)
+                    try:
+                        yield
+                    finally:
+                        held.discard(kind)
+                        lock.release()
+                    return
+            LOGGER.debug("Waiting for a free %s slot", kind)
+            deadline.check()
+            time.sleep(delay)
+            delay = min(delay * 2, _SLOT_WAIT_MAX)
+
+
+def install(governor: Governor) -> None:
+    """Sets the governor used by ``hold`` and ``slot``."""
+    global _GOVERNOR  # pylint: disable=global-statement
+    _GOVERNOR = governor
+
+
+@contextlib.contextmanager
+def hold(kind: str, name: str) -> Iterator[None]:
+    """Context manager for ``Governor.hold`` on the installed governor. Does nothing if none is installed."""
+    if not _GOVERNOR:
+        yield
+        return
+    with _GOVERNOR.hold(kind, name):
+        yield
+
+
+@contextlib.contextmanager
+def slot(kind: str) -> Iterator[None]:
+    """Context manager for ``Governor.slot`` on the installed governor. Does nothing if none is installed."""
+    if not _GOVERNOR:
+        yield
+        return
+    with _GOVERNOR.slot(kind):
+        yield
@@ -18,14 +18,20 @@
 
 This module holds functionality for performing operations on Docker Groups.
 """
+import contextlib
 import logging
 import os
 
+from typing import Iterator
+from typing import List
+
 from eljef.core import fops
 from eljef.core.check import version_check
 from eljef.core.dictobj import DictObj
 
 from eljef.docker.exceptions import DockerError
+from eljef.docker.persist import read_yaml
+from eljef.docker.persist import update_yaml
 
 LOGGER = logging.getLogger(__name__)
 
@@ -36,12 +42,13 @@ class DockerGroup(DictObj):
     """Docker group information class.
 
     Args:
-        group_data: ``master`` and ``members`` data for the group.
+        group_data: ``master``, ``members``, and ``ready_timeout`` data for the group.
     """
     def __init__(self, group_data: dict = None) -> None:
         super().__init__()
         self.master = None
         self.members = []
+        self.ready_timeout = 0
         if group_data and 'master' in group_data and group_data['master']:
             if not isinstance(group_data['master'], str):
                 err_s = "'master' key in 'group_data' needs to be a str"
@@ -52,6 +59,11 @@ def __init__(self, group_data: dict = None) -> None:
                 err_s = "'members' key in 'group_data' needs to be a list"
                 raise TypeError(err_s)
             self.members += group_data['members']
+        if group_data and 'ready_timeout' in group_data and group_data['ready_timeout']:
+            if not isinstance(group_data['ready_timeout'], int):
+                err_s = "'ready_timeout' key in 'group_data' needs to be an int"
+                raise TypeError(err_s)
+            self.ready_timeout = group_data['ready_timeout']
 
 
 class DockerGroups(object):
@@ -63,15 +75,43 @@ def __init__(self, config_path) -> None:
         fops.mkdir(os.path.abspath(config_path))
         self.__config = os.path.join(os.path.abspath(config_path),
                                      'groups.yaml')
+        self.__batch = 0
         self.__groups = DictObj()
+        self.__pending = set()
         self.__read()
 
+    def __merge(self, names: set, groups_yaml: dict) -> dict:
+        for name in sorted(names):
+            if name not in self.__groups:
+                continue
+            group_d = self.__groups[name].to_dict()
+            disk_d = groups_yaml.get(name) or {}
+            group_d['members'] += [i for i in disk_d.get('members') or [] if i not in group_d['members']]
+            groups_yaml[name] = group_d
+
+        return groups_yaml
+
     def __read(self) -> None:
         LOGGER.debug('Building list of currently defined groups.')
-        groups_yaml = fops.file_read_convert(self.__config, 'YAML', True)
+        groups_yaml = read_yaml(self.__config, True)
         for key, value in groups_yaml.items():
             self.add(key, value, False)
 
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Context manager deferring saves, so several changes are written to file once when it exits.
+
+        Changes made before an error in the batch are still written, so container definitions already written to
+        file keep their group membership.
+        """
+        self.__batch += 1
+        try:
+            yield
+        finally:
+            self.__batch -= 1
+            if self.__batch == 0 and self.__pending:
+                self.save(self.__pending)
+
     def add(self, group: str, group_data: dict = None,
             save: bool = True) -> None:
         """Define a new group by name.
@@ -84,7 +124,7 @@ def add(self, group: str, group_data: dict = None,
         if group not in self.__groups:
             self.__groups[group] = DockerGroup(group_data)
             if save:
-                self.save()
+                self.save([group])
             LOGGER.debug("Group '%s' successfully added.", group)
         else:
             LOGGER.debug("Group '%s' already exists.", group)
@@ -117,7 +157,25 @@ def list(self) -> list:
             ret += [*self.__groups]
         return ret
 
-    def save(self) -> None:
-        """Save group information to file."""
+    def save(self, names: List[str] = None) -> None:
+        """Save group information to file.
+
+        The file is re-read under an exclusive lock and only the saved groups are replaced, so groups and members
+        saved by other processes in the meantime are kept.
+
+        Args:
+            names: Names of groups to save. All groups are saved if not set.
+        """
+        names = set(names if names is not None else self.__groups)
+        if self.__batch > 0:
+            self.__pending |= names
+            return
+
         LOGGER.debug('Saving groups information.')
-        fops.file_write_convert(self.__config, 'YAML', self.__groups.to_dict())
+        self.__pending = set()
+        groups_yaml = update_yaml(self.__config, lambda x: self.__merge(names, x))
+        for key, value in groups_yaml.items():
+            if key in self.__groups:
+                self.__groups[key].update(DockerGroup(value))
+            else:
+                self.__groups[key] = DockerGroup(value)
@@ -0,0 +1,157 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# health.py : Docker Container Health and Readiness
+"""ElJef Docker Container Health and Readiness.
+
+This module holds functionality for parsing healthcheck settings and waiting for containers to become ready.
+"""
+import logging
+import math
+import re
+import time
+
+from typing import List
+from typing import Union
+
+import docker
+
+from docker.errors import NotFound
+
+from eljef.core.check import version_check
+
+from eljef.docker.deadline import remaining
+from eljef.docker.exceptions import ConfigError
+from eljef.docker.exceptions import DockerError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+DEFAULT_READY_TIMEOUT = 120
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ns|us|ms|s|m|h)')
+_DURATION_UNITS = {'ns': 1, 'us': 1000, 'ms': 1000000, 's': 1000000000, 'm': 60000000000, 'h': 3600000000000}
+
+
+def duration_ns(duration: str) -> int:
+    """Converts a duration string into nanoseconds.
+
+    Args:
+        duration: Duration with units. (ie: 1m30s, 500ms)
+
+    Returns:
+        Duration in nanoseconds.
+
+    Raises:
+        ConfigError: If the duration is malformed.
+    """
+    parts = _DURATION_RE.findall(duration)
+    if not parts or ''.join(i[0] + i[1] for i in parts) != duration:
+        raise ConfigError("Malformed duration: {0!s}".format(duration))
+
+    return int(sum(float(value) * _DURATION_UNITS[unit] for value, unit in parts))
+
+
+def container_ready(attrs: dict) -> Union[bool, None]:
+    """Checks whether a container is ready from its inspect data.
+
+    A running container is ready when it is healthy, or when it has no healthcheck.
+
+    Args:
+        attrs: Container inspect data.
+
+    Returns:
+        True if the container is ready. False if it stopped or is unhealthy. None if it is still starting.
+    """
+    state = attrs.get('State', {})
+    if state.get('Status') in {'dead', 'exited'}:
+        return False
+    if state.get('Status') != 'running':
+        return None
+
+    health = (state.get('Health') or {}).get('Status', 'healthy')
+    if health == 'unhealthy':
+        return False
+
+    return True if health == 'healthy' else None
+
+
+def _ready_now(client: docker.DockerClient, names: set) -> set:
+    ret = set()
+    for name in sorted(names):
+        try:
+            ready = container_ready(client.api.inspect_container(name))
+        except NotFound:
+            raise DockerError("Container '{0!s}' does not exist".format(name))
+        if ready is False:
+            raise DockerError("Container '{0!s}' stopped or is unhealthy".format(name))
+        if ready:
+            ret.add(name)
+
+    return ret
+
+
+def _event_ready(client: docker.DockerClient, event: dict, pending: set) -> set:
+    name = event.get('Actor', {}).get('Attributes', {}).get('name', '')
+    status = event.get('status', '')
+    if name not in pending:
+        return set()
+    if status == 'die' or status.endswith('unhealthy'):
+        raise DockerError("Container '{0!s}' stopped or is unhealthy".format(name))
+    if status == 'start':
+        return _ready_now(client, {name})
+
+    return {name} if status.endswith(': healthy') else set()
+
+
+def wait_ready(client: docker.DockerClient, names: List[str], timeout: int = DEFAULT_READY_TIMEOUT) -> None:
+    """Waits for containers to become ready.
+
+    The engine event stream is watched for health status changes, so containers are seen as ready as soon as the
+    engine reports them healthy.
+
+    Args:
+        client: Initialized DockerClient class.
+        names: Names of containers to wait for.
+        timeout: Seconds to wait. Shortened to the time left before an active deadline.
+
+    Raises:
+        DockerError: If a container stops, becomes unhealthy, or is not ready before ``timeout``.
+    """
+    pending = set(names)
+    if not pending:
+        return
+
+    timeout = remaining(timeout)
+
+    LOGGER.debug("Waiting for containers to become ready: %s", ', '.join(sorted(pending)))
+    deadline = time.time() + timeout
+    events = client.events(decode=True, until=int(math.ceil(deadline)),
+                           filters={'type': 'container', 'container': sorted(pending),
+                                    'event': ['die', 'health_status', 'start']})
+    try:
+        pending -= _ready_now(client, pending)
+        while pending:
+            event = next(events, None)
+            if event is None:
+                break
+            pending -= _event_ready(client, event, pending)
+    finally:
+        events.close()
+
+    if pending:
+        raise DockerError("Containers not ready after {0!s}s: {1!s}".format(timeout, ', '.join(sorted(pending))))
+    LOGGER.debug("Containers ready: %s", ', '.join(sorted(names)))
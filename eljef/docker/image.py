@@ -20,16 +20,62 @@
 """
 import logging
 import json
+import re
 import docker
+import requests
 
+from docker.errors import APIError
 from docker.errors import ImageNotFound
 
 from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.archive import DockerImageArchive
+from eljef.docker.context import DOCKERFILE
+from eljef.docker.context import build_context
+from eljef.docker.context import dockerfile_parents
+from eljef.docker.context import read_context_file
+from eljef.docker.deadline import deadline
+from eljef.docker.deadline import iterate
+from eljef.docker.exceptions import DeadlineError
+from eljef.docker.exceptions import DockerError
+from eljef.docker.governor import KIND_BUILD
+from eljef.docker.governor import KIND_PULL
+from eljef.docker.governor import slot
+from eljef.docker.mirrors import mirror_host
+from eljef.docker.registry import RegistryClient
+from eljef.docker.registry import parse_reference
+from eljef.docker.stats import api_operation
 
 LOGGER = logging.getLogger(__name__)
 
 version_check(3, 6)
 
+_STEP_RE = re.compile(r'^Step (\d+)/(\d+) : (.*)$')
+_CACHE_HIT = '---> Using cache'
+
+
+class BuildStats(DictObj):
+    """Image build cache statistics class"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.cached = 0
+        self.steps = []
+
+    def hit_rate(self) -> float:
+        """Returns the fraction of build steps that were satisfied from cache."""
+        return self.cached / len(self.steps) if self.steps else 0.0
+
+    def line(self, stream: str) -> None:
+        """Records a line of build output."""
+        stream = stream.strip()
+        match = _STEP_RE.match(stream)
+        if match:
+            self.steps.append({'step': match.group(3), 'cached': False})
+        elif stream == _CACHE_HIT and self.steps:
+            self.steps[-1]['cached'] = True
+            self.cached += 1
+
 
 class DockerImage(object):
     """Docker Image interaction class
@@ -39,24 +85,50 @@ class DockerImage(object):
         image_name: Image name
 
     Keyword Args:
-        build_path (str): Path to directory containing Dockerfile.
-                          For images to be built locally.
+        archive (DockerImageArchive): Image archive to load the image from before pulling it from a registry.
+        build_args (dict): Build-time variables for the Dockerfile.
+        build_cache_dir (str): Directory the built image is imported from before building, so builds on a fresh
+                               host start from a warm cache.
+        build_cache_export (bool): Export the built image to ``build_cache_dir`` after building. This is not a
+                                   BuildKit cache export: the whole image is saved with ``docker save``, one full
+                                   image archive per build, for the classic builder to use as cache.
+        build_cache_from (list): Images to use as cache sources when building. Missing images are pulled first.
+        build_path (str): Path to directory containing Dockerfile, or a git source
+                          (/path/to/repository#ref[:subdirectory]). For images to be built locally.
         build_squash (bool): Squash the build image. (Remove intermediate layers.)
+        build_target (str): Build stage to build in a multi-stage Dockerfile.
         insecure_registry (bool): Registry that image is in is insecure
+        mirrors (list): Registry mirrors to try, in order, before the registry that image is in.
+        timeout (int): Seconds a pull or build may take. Not limited if 0.
         username (str): Username for connecting to registry. If the username is defined, `password` is required.
         password (str): Password for connecting to registry
+        token_cache (TokenCache): Registry token cache. If set, pulls with credentials send a cached bearer token
+                                  instead of the username and password.
     """
     def __init__(self, client: docker.DockerClient, image_name: str, **kwargs) -> None:
         self.__args = self.__args_dict(kwargs.get('insecure_registry', False),
                                        kwargs.get('username', None),
                                        kwargs.get('password', None))
+        self.__archive = kwargs.get('archive', None)
+        self.__build_args = {k: str(v) for k, v in (kwargs.get('build_args', None) or {}).items()}
+        self.__build_cache_dir = kwargs.get('build_cache_dir', None)
+        self.__build_cache_export = kwargs.get('build_cache_export', False)
+        self.__build_cache_from = kwargs.get('build_cache_from', None) or []
         self.__build_path = kwargs.get('build_path', None)
         self.__build_squash = kwargs.get('build_squash', False)
+        self.__build_target = kwargs.get('build_target', None)
         self.__client = client
         self.__image = image_name
+        self.__insecure = kwargs.get('insecure_registry', False)
+        self.__local_parents = []
+        self.__mirrors = list(kwargs.get('mirrors', None) or [])
         self.__tag = 'latest'
-        if ':' in image_name:
+        self.__timeout = kwargs.get('timeout', 0)
+        self.__token_cache = kwargs.get('token_cache', None)
+        if ':' in image_name.rsplit('/', 1)[-1]:
             self.__image, self.__tag = image_name.rsplit(':', 1)
+        self.build_stats = None
+        self.downloaded = 0
 
     @staticmethod
     def __args_dict(insecure_registry, username, password) -> dict:
@@ -73,7 +145,7 @@ def __args_dict(insecure_registry, username, password) -> dict:
         return kw_args
 
     @staticmethod
-    def __log_build_pull(line: str) -> None:
+    def __log_build_pull(line: str) -> dict:
         r_data = json.loads(line)
         log_line = ''
         if 'id' in r_data:
@@ -84,22 +156,195 @@ def __log_build_pull(line: str) -> None:
             log_line += "{0!s}".format(r_data['stream'].strip())
         LOGGER.debug(log_line)
 
+        return r_data
+
+    @property
+    def build_args(self) -> dict:
+        """Build-time variables for the Dockerfile."""
+        return self.__build_args
+
+    @property
+    def build_path(self) -> str:
+        """Path to directory containing Dockerfile, if this image is built locally."""
+        return self.__build_path
+
+    @property
+    def local_parents(self) -> list:
+        """Images this image builds FROM that are built locally, and so are never pulled when building."""
+        return self.__local_parents
+
+    @local_parents.setter
+    def local_parents(self, local_parents: list) -> None:
+        self.__local_parents = list(local_parents)
+
+    @property
+    def mirrors(self) -> list:
+        """Registry mirrors tried, in order, before the registry this image is in."""
+        return self.__mirrors
+
+    @mirrors.setter
+    def mirrors(self, mirrors: list) -> None:
+        self.__mirrors = list(mirrors)
+
+    @property
+    def name(self) -> str:
+        """Full image reference, including tag."""
+        return "{0!s}:{1!s}".format(self.__image, self.__tag)
+
+    def registry_args(self) -> dict:
+        """Returns keyword arguments for a RegistryClient that can read this image from its registry."""
+        ret = {'insecure_registry': self.__insecure}
+        if 'auth_config' in self.__args:
+            ret.update(self.__args['auth_config'])
+        if self.__token_cache:
+            ret['token_cache'] = self.__token_cache
+
+        return ret
+
+    def __pull_args(self) -> dict:
+        if 'auth_config' not in self.__args or not self.__token_cache:
+            return self.__args
+
+        try:
+            token = RegistryClient(**self.registry_args()).token(self.name)
+        except (DockerError, requests.RequestException) as err:
+            LOGGER.debug("Registry token for '%s' unavailable, using credentials: %s", self.name, err)
+            return self.__args
+
+        return dict(self.__args, auth_config={'registrytoken': token}) if token else self.__args
+
+    def __build_cache_import(self) -> DockerImageArchive:
+        cache = DockerImageArchive(self.__client, self.__build_cache_dir, workers=1)
+        if cache.has(self.name) and not self.exists():
+            LOGGER.debug("Importing build cache for '%s' from %s", self.name, self.__build_cache_dir)
+            cache.load(self.name)
+
+        return cache
+
+    def __build_cache_sources(self) -> list:
+        sources = []
+        for image_ref in self.__build_cache_from:
+            try:
+                self.__client.images.get(image_ref)
+            except ImageNotFound:
+                try:
+                    LOGGER.debug("Pulling build cache source '%s'", image_ref)
+                    self.__client.images.pull(image_ref)
+                except APIError as err:
+                    LOGGER.debug("Build cache source '%s' unavailable: %s", image_ref, err.explanation)
+                    continue
+            sources.append(image_ref)
+        if self.__build_cache_dir or self.__build_cache_from:
+            sources.append(self.name)
+
+        return sources
+
+    def __pull_parents(self) -> bool:
+        dockerfile = read_context_file(self.__build_path, DOCKERFILE)
+        parents = dockerfile_parents(dockerfile, self.__build_args) if dockerfile is not None else set()
+        local = {parse_reference(i) for i in self.__local_parents}
+
+        external = []
+        for parent in sorted(parents):
+            if parse_reference(parent) in local:
+                continue
+            try:
+                if not self.__client.images.get(parent).attrs.get('RepoDigests'):
+                    continue
+            except ImageNotFound:
+                pass
+            external.append(parent)
+
+        if len(external) == len(parents):
+            return True
+
+        for parent in external:
+            LOGGER.debug("Pulling base image '%s' for '%s'", parent, self.name)
+            try:
+                self.__client.api.pull(parent)
+            except APIError as err:
+                LOGGER.debug("Pulling base image '%s' failed: %s", parent, err.explanation)
+
+        return False
+
     def _build(self) -> None:
-        """Build a local image."""
+        """Build a local image.
+
+        Base images are pulled so the build starts from their newest version. Parents that are built locally, those
+        in ``local_parents`` and present images that never came from a registry, are not pulled, because pulling
+        would replace them with a registry copy or fail.
+
+        The build context is streamed to the engine as it is read, without a temporary archive. Build cache sources
+        are imported before building. With ``build_cache_export`` set, the built image is saved to the build cache
+        directory afterwards, which writes the whole image each build. Cache hits for each build step are recorded in
+        ``build_stats``.
+        """
         LOGGER.debug("Building image - %s:%s:%s", self.__build_path, self.__image, self.__tag)
 
+        cache = self.__build_cache_import() if self.__build_cache_dir else None
+        kw_args = {'rm': True, 'pull': self.__pull_parents(), 'squash': self.__build_squash}
+        if self.__build_args:
+            kw_args['buildargs'] = self.__build_args
+        if self.__build_target:
+            kw_args['target'] = self.__build_target
+        cache_from = self.__build_cache_sources()
+        if cache_from:
+            kw_args['cache_from'] = cache_from
+
+        self.build_stats = BuildStats()
         build = self.__client.api.build
-        for line in build(path=self.__build_path, tag=self.__tag, rm=True, pull=True, squash=self.__build_squash):
-            self.__log_build_pull(line)
+        context = build_context(self.__build_path)
+        for line in iterate(build(fileobj=context, custom_context=True, tag=self.name, **kw_args)):
+            r_data = self.__log_build_pull(line)
+            if 'error' in r_data:
+                raise DockerError("Building '{0!s}' failed: {1!s}".format(self.name, r_data['error']))
+            self.build_stats.line(r_data.get('stream', ''))
 
-    def _pull(self) -> None:
-        """Pull an image from a registry."""
-        LOGGER.debug("Pulling image - %s:%s", self.__image, self.__tag)
+        LOGGER.debug("Built image '%s': %d of %d steps from cache", self.name, self.build_stats.cached,
+                     len(self.build_stats.steps))
+        if cache and self.__build_cache_export:
+            LOGGER.debug("Exporting build cache for '%s' to %s", self.name, self.__build_cache_dir)
+            cache.save(self.name)
 
+    def __pull_stream(self, repository: str, kw_args: dict) -> None:
+        layers = dict()
         pull = self.__client.api.pull
-        for line in pull(self.__image, tag=self.__tag, **self.__args):
-            self.__log_build_pull(line)
+        for line in iterate(pull(repository, tag=self.__tag, **kw_args)):
+            r_data = self.__log_build_pull(line)
+            if 'error' in r_data:
+                raise DockerError("Pulling '{0!s}' failed: {1!s}".format(repository, r_data['error']))
+            if r_data.get('status') == 'Downloading' and 'id' in r_data:
+                layers[r_data['id']] = r_data.get('progressDetail', {}).get('total', 0)
+
+        self.downloaded = sum(layers.values())
+
+    def __pull_mirror(self, mirror: str) -> None:
+        repository = "{0!s}/{1!s}".format(mirror_host(mirror)[0], parse_reference(self.name)[1])
+        mirror_name = "{0!s}:{1!s}".format(repository, self.__tag)
+        LOGGER.debug("Pulling image - %s from mirror %s", self.name, mirror)
+
+        self.__pull_stream(repository, {'stream': True})
+        self.__client.images.get(mirror_name).tag(self.__image, self.__tag)
+        self.__client.images.remove(mirror_name)
+
+    def _pull(self) -> None:
+        """Pull an image from a registry.
+
+        Mirrors are tried in order first. The registry the image is in is used if every mirror fails.
+        """
+        for mirror in self.__mirrors:
+            try:
+                self.__pull_mirror(mirror)
+                return
+            except DeadlineError:
+                raise
+            except (APIError, DockerError) as err:
+                LOGGER.warning("Pulling '%s' from mirror '%s' failed: %s", self.name, mirror, err)
+
+        LOGGER.debug("Pulling image - %s:%s", self.__image, self.__tag)
+        self.__pull_stream(self.__image, self.__pull_args())
 
+    @api_operation
     def exists(self) -> bool:
         """Determines if the containers image exists on the system.
 
@@ -115,9 +360,72 @@ def exists(self) -> bool:
             LOGGER.debug(err.explanation)
             return False
 
-    def pull(self) -> None:
-        """Pull or Build an Image."""
-        if not self.__build_path:
+    def local_id(self) -> str:
+        """Returns the ID of the image currently tagged with this images reference.
+
+        Returns:
+            Image ID, or an empty string if the image is not present.
+        """
+        try:
+            return self.__client.images.get(self.name).id
+        except ImageNotFound:
+            return ''
+
+    def retag(self, image_id: str) -> None:
+        """Points this images reference back at a previously present image.
+
+        Args:
+            image_id: ID of the image to tag.
+        """
+        LOGGER.debug("Tagging image '%s' as '%s'", image_id, self.name)
+        self.__client.images.get(image_id).tag(self.__image, self.__tag)
+
+    def _load(self) -> bool:
+        """Load an image from the image archive.
+
+        Returns:
+            True if the archived image is present, False if it is not held in the archive or could not be loaded. The
+            archive is not read if the engine already holds the archived image.
+        """
+        if not self.__archive or not self.__archive.has(self.name):
+            return False
+        if self.__archive.loaded(self.name):
+            LOGGER.debug("Archived image for '%s' already present", self.name)
+            return True
+
+        try:
+            self.__archive.load(self.name)
+            return True
+        except DeadlineError:
+            raise
+        except DockerError as err:
+            LOGGER.debug("Loading '%s' from archive failed: %s", self.name, err.message)
+            return False
+
+    def __pull_or_load(self) -> None:
+        try:
             self._pull()
-        else:
-            self._build()
+        except DeadlineError:
+            raise
+        except (APIError, DockerError) as err:
+            if not self._load():
+                raise
+            LOGGER.warning("Pulling '%s' failed, using the copy in the image archive: %s", self.name, err)
+
+    @api_operation
+    def pull(self) -> None:
+        """Pull or Build an Image.
+
+        If an image archive was provided and holds this image, the archived image is used when pulling it fails, so
+        a newer image in the registry is always preferred. Builds and pulls wait for a free host-wide slot.
+
+        Raises:
+            DeadlineError: If the pull or build does not finish within ``timeout``, or an active deadline passes.
+        """
+        with deadline(self.__timeout, "Pull of '{0!s}'".format(self.name)):
+            if self.__build_path:
+                with slot(KIND_BUILD):
+                    self._build()
+            else:
+                with slot(KIND_PULL):
+                    self.__pull_or_load()
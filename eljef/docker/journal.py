@@ -0,0 +1,135 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# journal.py : Docker Operation Journal
+"""ElJef Docker Operation Journal.
+
+This module holds functionality for recording the completed steps of multi-step operations, so interrupted
+operations can be resumed or rolled back.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from typing import List
+from typing import Union
+
+from eljef.core import fops
+from eljef.core.check import version_check
+
+from eljef.docker.exceptions import DockerError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+JOURNAL_DIR = 'journal'
+
+STEP_PULLED = 'pulled'
+STEP_REMOVED = 'removed'
+STEP_STARTED = 'started'
+STEP_STOPPED = 'stopped'
+
+
+class Journal(object):
+    """Append-only journal of completed operation steps
+
+    Each step is written as a line of JSON and synced to disk before the operation moves on.
+
+    Args:
+        config_path: Path to base configuration directory.
+        operation: Name of the operation. (ie: group-update)
+        target: Name of what the operation is ran against. (ie: the group name)
+    """
+    def __init__(self, config_path: str, operation: str, target: str) -> None:
+        journal_path = os.path.join(os.path.abspath(config_path), JOURNAL_DIR)
+        fops.mkdir(journal_path)
+        self.__file = os.path.join(journal_path, "{0!s}-{1!s}.jsonl".format(operation, target))
+        self.__lock = threading.Lock()
+        self.__steps = self.__read()
+
+    def __read(self) -> List[dict]:
+        if not os.path.isfile(self.__file):
+            return []
+
+        steps = []
+        with open(self.__file, 'r', encoding='utf-8') as open_file:
+            for line in open_file:
+                try:
+                    steps.append(json.loads(line))
+                except ValueError:
+                    LOGGER.debug("Ignoring partly written journal line: %s", line.strip())
+
+        return steps
+
+    def begin(self) -> None:
+        """Starts a new run of the operation.
+
+        Raises:
+            DockerError: If an interrupted run of the operation is recorded.
+        """
+        if self.__steps:
+            raise DockerError("Operation was interrupted, resume or roll it back first: {0!s}".format(self.__file))
+        self.record('begin', '')
+
+    def done(self, step: str, name: str) -> bool:
+        """Returns True if ``step`` was completed for ``name``."""
+        return self.find(step, name) is not None
+
+    def exists(self) -> bool:
+        """Returns True if an unfinished run of the operation is recorded."""
+        return bool(self.__steps)
+
+    def find(self, step: str, name: str) -> Union[dict, None]:
+        """Returns the recorded step for ``name``, or None if it was not completed."""
+        with self.__lock:
+            for entry in self.__steps:
+                if entry['step'] == step and entry['name'] == name:
+                    return entry
+
+        return None
+
+    def finish(self) -> None:
+        """Marks the operation as finished by removing its journal."""
+        with self.__lock:
+            self.__steps = []
+            if os.path.isfile(self.__file):
+                os.remove(self.__file)
+
+    def record(self, step: str, name: str, **data) -> None:
+        """Records a completed step.
+
+        Args:
+            step: Step that was completed.
+            name: Container or image the step was completed for.
+
+        Keyword Args:
+            Extra information needed to undo the step.
+        """
+        entry = dict(data, step=step, name=name, time=time.time())
+        with self.__lock:
+            with open(self.__file, 'a', encoding='utf-8') as open_file:
+                open_file.write(json.dumps(entry, sort_keys=True) + '\n')
+                open_file.flush()
+                os.fsync(open_file.fileno())
+            self.__steps.append(entry)
+        LOGGER.debug("Journal: %s %s", step, name)
+
+    def steps(self, step: str) -> List[dict]:
+        """Returns every recorded entry for ``step``."""
+        with self.__lock:
+            return [i for i in self.__steps if i['step'] == step]
@@ -0,0 +1,86 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# locks.py : File Locks
+"""ElJef Docker File Locks.
+
+This module holds functionality for advisory file locks shared between processes.
+"""
+import logging
+import os
+
+from eljef.core.check import version_check
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+
+class FileLock(object):
+    """Advisory lock on a file, shared between processes
+
+    Every FileLock opens its own descriptor, so locks also exclude each other between threads of one process. On
+    platforms without fcntl, locking does nothing.
+
+    Args:
+        lock_file: Path to the lock file. It is created if it does not exist.
+        shared: Take a shared (reader) lock instead of an exclusive (writer) lock.
+    """
+    def __init__(self, lock_file: str, shared: bool = False) -> None:
+        self.__fd = None
+        self.__file = lock_file
+        self.__shared = shared
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes the lock.
+
+        Args:
+            blocking: Wait for the lock if it is held elsewhere.
+
+        Returns:
+            True if the lock was taken. False if ``blocking`` is False and the lock is held elsewhere.
+        """
+        if not fcntl:
+            return True
+
+        self.__fd = os.open(self.__file, os.O_RDWR | os.O_CREAT, 0o644)
+        flags = (fcntl.LOCK_SH if self.__shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(self.__fd, flags)
+        except BlockingIOError:
+            os.close(self.__fd)
+            self.__fd = None
+            return False
+
+        return True
+
+    def release(self) -> None:
+        """Releases the lock."""
+        if self.__fd is not None:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+            os.close(self.__fd)
+            self.__fd = None
@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# mirrors.py : Docker Registry Mirrors
+"""ElJef Docker Registry Mirrors.
+
+This module holds functionality for choosing the fastest registry mirror that holds an image.
+"""
+import logging
+import time
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from eljef.core.check import version_check
+
+from eljef.docker.parallel import DEFAULT_WORKERS
+from eljef.docker.parallel import run_parallel
+from eljef.docker.registry import RegistryClient
+from eljef.docker.registry import parse_reference
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+PROBE_TIMEOUT = 5
+
+_INSECURE_PREFIX = 'http://'
+_SECURE_PREFIX = 'https://'
+
+
+def mirror_host(mirror: str) -> Tuple[str, bool]:
+    """Splits a mirror into its host and whether it uses plain http.
+
+    Args:
+        mirror: Mirror host, optionally prefixed with http:// or https://. (ie: http://cache.local:5000)
+
+    Returns:
+        A tuple of (host, insecure).
+    """
+    if mirror.startswith(_INSECURE_PREFIX):
+        return mirror[len(_INSECURE_PREFIX):].rstrip('/'), True
+    if mirror.startswith(_SECURE_PREFIX):
+        return mirror[len(_SECURE_PREFIX):].rstrip('/'), False
+
+    return mirror.rstrip('/'), False
+
+
+def mirror_reference(mirror: str, image_ref: str) -> str:
+    """Rewrites an image reference to pull it from a mirror.
+
+    Args:
+        mirror: Mirror host.
+        image_ref: Image reference.
+
+    Returns:
+        The image reference on the mirror. (ie: cache.local:5000/library/nginx:latest)
+    """
+    _, repository, tag = parse_reference(image_ref)
+    return "{0!s}/{1!s}{2!s}{3!s}".format(mirror_host(mirror)[0], repository, '@' if ':' in tag else ':', tag)
+
+
+def _probe(pair: Tuple[str, str]) -> float:
+    mirror, image_ref = pair
+    host, insecure = mirror_host(mirror)
+    start = time.monotonic()
+    RegistryClient(insecure_registry=insecure, timeout=PROBE_TIMEOUT).digest(mirror_reference(host, image_ref))
+
+    return time.monotonic() - start
+
+
+def rank_mirrors(mirrors: Dict[str, List[str]], workers: int = DEFAULT_WORKERS) -> Dict[str, List[str]]:
+    """Probes mirrors for images, all at the same time.
+
+    Each mirror is asked for the manifest of each image it may serve. Mirrors that do not answer, or do not hold the
+    image, are dropped.
+
+    Args:
+        mirrors: Mirrors to probe, keyed by image reference.
+        workers: Maximum number of probes to run at the same time.
+
+    Returns:
+        Mirrors holding each image, fastest first, keyed by image reference.
+    """
+    pairs = [(j, i) for i in sorted(mirrors) for j in mirrors[i]]
+    ret = {i: [] for i in mirrors}
+    latency = dict()
+    for result in run_parallel(_probe, pairs, workers):
+        mirror, image_ref = result.item
+        if result.error:
+            LOGGER.debug("Mirror '%s' unavailable for '%s': %s", mirror, image_ref, result.error)
+            continue
+        LOGGER.debug("Mirror '%s' answered for '%s' in %.3fs", mirror, image_ref, result.result)
+        latency[result.item] = result.result
+        ret[image_ref].append(mirror)
+
+    for image_ref, found in ret.items():
+        found.sort(key=lambda i, r=image_ref: latency[(i, r)])
+
+    return ret
@@ -0,0 +1,214 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# mounts.py : Docker Container Mounts
+"""ElJef Docker Container Mounts.
+
+This module holds functionality for turning container mount definitions into docker mounts.
+"""
+import logging
+
+from typing import Any
+from typing import Union
+
+import docker
+
+from docker.errors import DockerException
+from docker.errors import NotFound
+from docker.types import DriverConfig
+from docker.types.services import Mount
+from docker.utils import parse_bytes
+
+from eljef.core.check import version_check
+
+from eljef.docker.exceptions import ConfigError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+BIND_PROPAGATION = 'slave'
+CONSISTENCY_MODES = {'consistent', 'cached', 'delegated'}
+MOUNT_KEYS = {'consistency', 'driver', 'driver_opts', 'labels', 'mode', 'nocopy', 'propagation', 'read_only',
+              'relabel', 'size', 'source', 'target', 'type'}
+MOUNT_TYPES = {'bind', 'tmpfs', 'volume'}
+PROPAGATION_MODES = {'private', 'rprivate', 'shared', 'rshared', 'slave', 'rslave'}
+# SELinux relabeling: z shares the label between containers, Z makes it private to the container
+RELABEL_MODES = {'z', 'Z'}
+
+_ERR_MALFORMED = "Malformed Path: {0!s}"
+
+
+def _is_host_path(source: str) -> bool:
+    return source.startswith(('/', '.', '~'))
+
+
+def _str_dict(value: dict) -> Union[dict, None]:
+    return {k: str(v) for k, v in value.items()} if value else None
+
+
+def _tmpfs_mode(mode: Union[int, str]) -> int:
+    if isinstance(mode, str):
+        return int(mode, 8)
+    return mode
+
+
+def _shorthand(definition: str) -> dict:
+    parts = definition.split(':')
+    if len(parts) not in {2, 3} or not all(parts[:2]):
+        raise ConfigError(_ERR_MALFORMED.format(definition))
+
+    ret = {'source': parts[0], 'target': parts[1]}
+    for option in (parts[2].split(',') if len(parts) == 3 else []):
+        if option in {'ro', 'rw'}:
+            ret['read_only'] = option == 'ro'
+        elif option == 'nocopy':
+            ret['nocopy'] = True
+        elif option in PROPAGATION_MODES:
+            ret['propagation'] = option
+        elif option in CONSISTENCY_MODES:
+            ret['consistency'] = option
+        elif option in RELABEL_MODES:
+            ret['relabel'] = option
+        else:
+            raise ConfigError("Unknown mount option '{0!s}' in: {1!s}".format(option, definition))
+
+    return ret
+
+
+def mount_spec(definition: Union[dict, str]) -> dict:
+    """Normalizes a mount definition.
+
+    Mount definitions are either ``source:target[:options]`` strings, where options is a comma separated list of
+    ro, rw, nocopy, a propagation mode, a consistency mode, or an SELinux relabel mode (z or Z), or dictionaries
+    using the keys in ``MOUNT_KEYS``. Sources that are not paths are named volumes.
+
+    Args:
+        definition: Mount definition.
+
+    Returns:
+        Mount definition dictionary with ``type`` filled in.
+
+    Raises:
+        ConfigError: If the definition is malformed.
+    """
+    spec = _shorthand(definition) if isinstance(definition, str) else dict(definition)
+    if set(spec) - MOUNT_KEYS or not spec.get('target'):
+        raise ConfigError(_ERR_MALFORMED.format(definition))
+
+    if 'type' not in spec:
+        spec['type'] = 'bind' if _is_host_path(spec.get('source', '')) else 'volume'
+    if spec['type'] not in MOUNT_TYPES or (spec['type'] != 'tmpfs' and not spec.get('source')):
+        raise ConfigError(_ERR_MALFORMED.format(definition))
+    if spec.get('relabel') and (spec['type'] == 'tmpfs' or spec['relabel'] not in RELABEL_MODES):
+        raise ConfigError("SELinux relabel must be z or Z, on a bind mount or named volume: {0!s}".format(definition))
+    if spec['type'] == 'bind':
+        spec.setdefault('propagation', BIND_PROPAGATION)
+
+    return spec
+
+
+def bind_string(definition: Union[dict, str]) -> Union[str, None]:
+    """Creates a ``docker run -v`` style volume string for mounts that request SELinux relabeling.
+
+    The engine only relabels volumes given this way, not mounts created by ``make_mount``.
+
+    Args:
+        definition: Mount definition, as accepted by ``mount_spec``.
+
+    Returns:
+        Volume string (ie: /path/on/host:/path/in/container:ro,z), or None if the mount does not request
+        relabeling.
+    """
+    spec = mount_spec(definition)
+    if not spec.get('relabel'):
+        return None
+
+    options = ['ro' if spec.get('read_only', False) else 'rw', spec['relabel']]
+    if spec['type'] == 'bind':
+        options.append(spec['propagation'])
+    elif spec.get('nocopy'):
+        options.append('nocopy')
+    if spec.get('consistency'):
+        options.append(spec['consistency'])
+
+    return "{0!s}:{1!s}:{2!s}".format(spec['source'], spec['target'], ','.join(options))
+
+
+def _tmpfs_args(spec: dict) -> dict:
+    ret = dict()
+    try:
+        if spec.get('size'):
+            ret['tmpfs_size'] = parse_bytes(spec['size'])
+        if spec.get('mode'):
+            ret['tmpfs_mode'] = _tmpfs_mode(spec['mode'])
+    except (DockerException, ValueError):
+        raise ConfigError("Malformed tmpfs size or mode: {0!s}".format(spec))
+
+    return ret
+
+
+def make_mount(definition: Union[dict, str]) -> Mount:
+    """Creates a docker mount from a mount definition.
+
+    Mounts requesting SELinux relabeling must be given to the engine with ``bind_string`` instead.
+
+    Args:
+        definition: Mount definition, as accepted by ``mount_spec``.
+
+    Returns:
+        docker Mount class.
+    """
+    spec = mount_spec(definition)
+    kw_args = {'type': spec['type'], 'read_only': spec.get('read_only', False)}
+
+    if spec['type'] == 'bind':
+        kw_args['propagation'] = spec['propagation']
+    elif spec['type'] == 'volume':
+        kw_args['no_copy'] = spec.get('nocopy', False)
+        kw_args['labels'] = _str_dict(spec.get('labels', None))
+        if spec.get('driver') or spec.get('driver_opts'):
+            kw_args['driver_config'] = DriverConfig(spec.get('driver', 'local'), _str_dict(spec.get('driver_opts')))
+    else:
+        kw_args.update(_tmpfs_args(spec))
+    if spec.get('consistency'):
+        kw_args['consistency'] = spec['consistency']
+
+    return Mount(spec['target'], spec.get('source', None), **kw_args)
+
+
+def ensure_volume(client: docker.DockerClient, definition: Any) -> None:
+    """Creates the named volume used by a mount definition if it does not already exist.
+
+    Existing volumes are reused as they are.
+
+    Args:
+        client: Initialized DockerClient class.
+        definition: Mount definition, as accepted by ``mount_spec``.
+    """
+    spec = mount_spec(definition)
+    if spec['type'] != 'volume':
+        return
+
+    try:
+        volume = client.volumes.get(spec['source'])
+        if spec.get('driver') and volume.attrs.get('Driver') != spec['driver']:
+            LOGGER.warning("Volume '%s' exists with driver '%s', not '%s'", spec['source'],
+                           volume.attrs.get('Driver'), spec['driver'])
+    except NotFound:
+        LOGGER.debug("Creating volume '%s'", spec['source'])
+        client.volumes.create(name=spec['source'], driver=spec.get('driver', 'local'),
+                              driver_opts=_str_dict(spec.get('driver_opts', None)),
+                              labels=_str_dict(spec.get('labels', None)))
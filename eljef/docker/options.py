@@ -0,0 +1,306 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# options.py : Docker Container Options
+"""ElJef Docker Container Options.
+
+This module holds functionality for reading and validating container definition options.
+"""
+import copy
+import logging
+import re
+
+from typing import Any
+
+from docker.errors import DockerException
+from docker.utils import parse_bytes
+
+from eljef.core import fops
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.exceptions import ConfigError
+from eljef.docker.health import duration_ns
+from eljef.docker.mounts import make_mount
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+VALIDATE_TE = "Incorrect key type: '{0!s}' is '{1!s}' but needs to be '{2!s}'"
+VALIDATE_TE_LIST = "Incorrect list contents: Value at position '{0!s}' in key '{1!s} has a type of '{2!s}' when it " \
+                   "should be 'str'"
+VALIDATE_TE_LIST_DICT = "Incorrect list contents: Value at position '{0!s}' in key '{1!s} has a type of '{2!s}' when " \
+                        "it should be 'str' or 'dict'"
+VALIDATE_TE_DICT = "Incorrect dict contents: Value for '{0!s}' in key '{1!s}' has a type of '{2!s}' when it " \
+                   "should be one of: {3!s}"
+
+# resource limits and the HostConfig keys the engine reports them under
+LIMIT_ATTRS = {'cpu_shares': 'CpuShares', 'cpuset_cpus': 'CpusetCpus', 'cpuset_mems': 'CpusetMems',
+               'mem_limit': 'Memory', 'memswap_limit': 'MemorySwap', 'nano_cpus': 'NanoCpus',
+               'oom_score_adj': 'OomScoreAdj', 'pids_limit': 'PidsLimit', 'shm_size': 'ShmSize'}
+# resource limits that can be changed on a running container
+LIMIT_ATTRS_LIVE = {'cpu_shares', 'cpuset_cpus', 'cpuset_mems', 'mem_limit', 'memswap_limit'}
+# resource limits given in bytes, with optional units
+LIMIT_ATTRS_BYTES = {'mem_limit', 'memswap_limit', 'shm_size'}
+# resource limits the engine fills with its own default when unset
+LIMIT_ATTRS_DEFAULTED = {'memswap_limit', 'shm_size'}
+
+# ways a container can pick up configuration changes, '' uses the engine restart
+RELOAD_STRATEGIES = {'exec', 'recreate', 'restart', 'signal'}
+
+# healthcheck options given as durations (ie: 30s)
+HEALTHCHECK_DURATIONS = {'healthcheck_interval', 'healthcheck_start_period', 'healthcheck_timeout'}
+
+# ways a container can be rebuilt, '' stops and removes the old container before running the new one
+REBUILD_MODES = {'stop', 'swap'}
+
+LOG_DRIVERS = {'json-file', 'local', 'none', 'journald', 'syslog'}
+SYSCTL_PREFIXES = ('fs.mqueue.', 'kernel.msg', 'kernel.sem', 'kernel.shm', 'net.')
+ULIMIT_NAMES = {'core', 'cpu', 'data', 'fsize', 'locks', 'memlock', 'msgqueue', 'nice', 'nofile', 'nproc', 'rss',
+                'rtprio', 'rttime', 'sigpending', 'stack'}
+
+# lists that may hold dictionaries as well as strings
+STRUCTURED_LISTS = {'mounts', 'tmpfs'}
+
+_DICT_SCALARS = (bool, float, int, str)
+_DICT_VALUES = _DICT_SCALARS + (dict,)
+
+_CPUSET_RE = re.compile(r'^\d+(-\d+)?(,\d+(-\d+)?)*$')
+
+# container definition keys and their defaults, values must have the type of their default
+_DEFAULTS = {
+    'cap_add': [],
+    'cap_drop': [],
+    'cpu_shares': 0,
+    'cpuset_cpus': '',
+    'cpuset_mems': '',
+    'devices': [],
+    'dns': [],
+    'environment': [],
+    'group': '',
+    'healthcheck_interval': '',
+    'healthcheck_retries': 0,
+    'healthcheck_start_period': '',
+    'healthcheck_test': [],
+    'healthcheck_timeout': '',
+    'image': '',
+    'image_args': [],
+    'image_insecure': False,
+    'image_mirrors': [],
+    'image_password': '',
+    'image_username': '',
+    'image_build_args': {},
+    'image_build_cache_dir': '',
+    'image_build_cache_export': False,
+    'image_build_cache_from': [],
+    'image_build_path': '',
+    'image_build_squash': False,
+    'image_build_target': '',
+    'ipc_mode': '',
+    'log_config': {},
+    'mem_limit': '',
+    'memswap_limit': '',
+    'mounts': [],
+    'name': '',
+    'nano_cpus': 0,
+    'net': '',
+    'network': '',
+    'oom_score_adj': 0,
+    'operation_timeout': 0,
+    'pid_mode': '',
+    'pids_limit': 0,
+    'ports': [],
+    'rebuild_mode': '',
+    'reload': '',
+    'reload_command': [],
+    'reload_signal': '',
+    'replica_cpuset_cpus': [],
+    'replica_cpuset_mems': [],
+    'replicas': 0,
+    'restart': '',
+    'shm_size': '',
+    'sysctls': {},
+    'tag': '',
+    'tmpfs': [],
+    'ulimits': {},
+}
+
+
+def limit_value(attr: str, value: Any) -> Any:
+    """Returns a resource limit as the engine takes it, with byte sizes parsed, or None if it is not set."""
+    if not value:
+        return None
+    if attr in LIMIT_ATTRS_BYTES:
+        return parse_bytes(value)
+    return value
+
+
+def _check_dict(key: str, value: dict, allowed: tuple = _DICT_VALUES) -> None:
+    for d_key, d_value in value.items():
+        if not isinstance(d_key, str) or not isinstance(d_value, allowed):
+            err_s = VALIDATE_TE_DICT.format(d_key, key, type(d_value).__name__, ', '.join(i.__name__ for i in allowed))
+            raise ConfigError(err_s)
+        if isinstance(d_value, dict):
+            _check_dict("{0!s}.{1!s}".format(key, d_key), d_value, _DICT_SCALARS)
+
+
+def _validate_limits(options: 'ContainerOpts') -> None:
+    for attr in ('cpuset_cpus', 'cpuset_mems'):
+        for value in [getattr(options, attr)] + getattr(options, "replica_{0!s}".format(attr)):
+            if value and not _CPUSET_RE.match(value):
+                raise ConfigError("Malformed {0!s}: {1!s}".format(attr, value))
+    for attr in LIMIT_ATTRS_BYTES:
+        try:
+            limit_value(attr, getattr(options, attr))
+        except DockerException:
+            raise ConfigError("Malformed {0!s}: {1!s}".format(attr, getattr(options, attr)))
+
+
+def _validate_mounts(options: 'ContainerOpts') -> None:
+    for mount in options.mounts:
+        make_mount(mount)
+    for mount in options.tmpfs:
+        if isinstance(mount, dict):
+            make_mount(dict(mount, type='tmpfs'))
+
+
+def _validate_tuning(options: 'ContainerOpts') -> None:
+    for name, value in options.ulimits.items():
+        if name not in ULIMIT_NAMES:
+            raise ConfigError("Unknown ulimit: {0!s}".format(name))
+        if isinstance(value, dict) and not {'soft', 'hard'} >= set(value):
+            raise ConfigError("ulimit '{0!s}' may only contain 'soft' and 'hard'".format(name))
+    for name in options.sysctls:
+        if not name.startswith(SYSCTL_PREFIXES):
+            raise ConfigError("sysctl '{0!s}' is not namespaced and cannot be set per container".format(name))
+    if options.log_config:
+        log_type = options.log_config.get('type', 'json-file')
+        log_opts = options.log_config.get('config', {})
+        if log_type not in LOG_DRIVERS or set(options.log_config) - {'type', 'config'}:
+            raise ConfigError("Malformed log_config: {0!s}".format(options.log_config))
+        if log_type == 'json-file' and 'max-size' not in log_opts:
+            raise ConfigError("log_config of type 'json-file' must set 'max-size' in 'config'")
+
+
+def validate_replicas(options: 'ContainerOpts', replicas: int) -> None:
+    """Checks a container definition can run ``replicas`` replicas with its host ports.
+
+    Raises:
+        ConfigError: If replicas is negative, or the host port ranges are malformed or too small.
+    """
+    if replicas < 0:
+        raise ConfigError("replicas must not be negative")
+    for port_group in options.ports:
+        start, sep, end = port_group.split(':')[0].partition('-')
+        try:
+            size = int(end) - int(start) + 1 if sep else 1
+        except ValueError:
+            raise ConfigError("Malformed host port range: {0!s}".format(port_group))
+        if sep and not replicas:
+            raise ConfigError("Host port ranges require replicas: {0!s}".format(port_group))
+        if size < replicas:
+            raise ConfigError("Host ports for {0!s} replicas need a range of at least {0!s} ports: {1!s}".format(
+                replicas, port_group))
+
+
+def _validate_health(options: 'ContainerOpts') -> None:
+    for attr in HEALTHCHECK_DURATIONS:
+        if getattr(options, attr):
+            duration_ns(getattr(options, attr))
+    if options.healthcheck_retries < 0:
+        raise ConfigError("healthcheck_retries must not be negative")
+    if options.healthcheck_test and options.healthcheck_test[0] not in {'CMD', 'CMD-SHELL', 'NONE'}:
+        raise ConfigError("healthcheck_test must start with CMD, CMD-SHELL, or NONE")
+
+
+def _validate_reload(options: 'ContainerOpts') -> None:
+    if options.reload and options.reload not in RELOAD_STRATEGIES:
+        raise ConfigError("Unknown reload strategy: {0!s}".format(options.reload))
+    if options.reload == 'exec' and not options.reload_command:
+        raise ConfigError("reload strategy 'exec' requires 'reload_command'")
+    if options.rebuild_mode and options.rebuild_mode not in REBUILD_MODES:
+        raise ConfigError("Unknown rebuild mode: {0!s}".format(options.rebuild_mode))
+
+
+class ContainerOpts(DictObj):
+    """Docker Container options class"""
+    def __init__(self):
+        super().__init__()
+        self.update(copy.deepcopy(_DEFAULTS))
+
+    def set_with_type(self, key: Any, value: Any) -> None:
+        """Sets an attribute after checking type.
+
+        This will check the type of ``value`` matches the type of ``key`` before setting. Lists may only hold
+        strings, except for lists in ``STRUCTURED_LISTS`` which may also hold dictionaries. Dictionaries may hold
+        strings, numbers, booleans, and dictionaries of those.
+        """
+        o_value = getattr(self, key)
+
+        if not isinstance(value, type(o_value)):
+            k_is = type(value).__name__
+            k_sb = type(o_value).__name__
+            err_s = VALIDATE_TE.format(key, k_is, k_sb)
+            raise ConfigError(err_s)
+        elif isinstance(value, list):
+            count = 0
+            while count < len(value):
+                if key in STRUCTURED_LISTS and isinstance(value[count], dict):
+                    _check_dict("{0!s}[{1!s}]".format(key, count), value[count])
+                elif not isinstance(value[count], (bytes, str)):
+                    k_is = type(value[count]).__name__
+                    err_f = VALIDATE_TE_LIST_DICT if key in STRUCTURED_LISTS else VALIDATE_TE_LIST
+                    raise ConfigError(err_f.format(count, key, k_is))
+                count += 1
+        elif isinstance(value, dict):
+            _check_dict(key, value)
+
+        setattr(self, key, None if value == '' else value)
+
+
+def validate_options(options: dict) -> ContainerOpts:
+    """Validate incoming option types to provide base sanity
+
+    Args:
+        options: Dictionary of options to be used with docker. (Typically fed from a YAML config file.)
+
+    Returns:
+        A filled ContainerOpts information holder.
+
+    Raises:
+        ConfigError: If type of data is incorrect or data is missing.
+    """
+    validated = ContainerOpts()
+    for key in validated.keys():
+        if key in options:
+            data = options[key]
+            if isinstance(data, (bytes, str)):
+                data = fops.makestr(data)
+            validated.set_with_type(key, data)
+
+    if not validated.image:
+        raise ConfigError("'image' not defined in container options.")
+    if not validated.name:
+        raise ConfigError("'name' not defined in container options.")
+
+    _validate_limits(validated)
+    _validate_tuning(validated)
+    _validate_mounts(validated)
+    _validate_reload(validated)
+    validate_replicas(validated, validated.replicas)
+    _validate_health(validated)
+
+    return validated
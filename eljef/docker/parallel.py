@@ -0,0 +1,192 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# parallel.py : Bounded parallel execution
+"""ElJef Docker parallel operations.
+
+This module holds functionality for running operations against the docker engine concurrently.
+"""
+import logging
+import queue
+import threading
+import time
+
+from concurrent.futures import ALL_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import wait
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import Set
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker import deadline
+from eljef.docker.exceptions import DeadlineError
+from eljef.docker.stats import API_STATS
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+DEFAULT_WORKERS = 4
+
+# seconds between checks for cancelled deadlines while waiting for operations
+_POLL_INTERVAL = 0.1
+
+
+class ParallelResult(DictObj):
+    """Result of a single operation ran by ``run_parallel``
+
+    Args:
+        item: Item the operation was ran against.
+    """
+    def __init__(self, item: Any) -> None:
+        super().__init__()
+        self.item = item
+        self.result = None
+        self.error = None
+        self.duration = 0.0
+
+
+class DaemonExecutor(object):
+    """Bounded pool of daemon threads
+
+    Unlike ThreadPoolExecutor, whose threads are joined when the interpreter exits, operations still running when
+    the pool is shut down are abandoned: they run on until they return, or stop at their next deadline check, and do
+    not keep the process alive.
+
+    Args:
+        workers: Maximum number of operations to run at the same time.
+    """
+    def __init__(self, workers: int = DEFAULT_WORKERS) -> None:
+        self.__queue = queue.Queue()
+        self.__workers = max(1, workers)
+        for _ in range(self.__workers):
+            threading.Thread(target=self.__work, daemon=True).start()
+
+    def __work(self) -> None:
+        while True:
+            task = self.__queue.get()
+            if task is None:
+                return
+            future, func, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as err:  # pylint: disable=broad-except
+                future.set_exception(err)
+
+    def shutdown(self) -> None:
+        """Stops the threads once they finish the operations they are running. Queued operations are cancelled."""
+        while True:
+            try:
+                task = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                task[0].cancel()
+        for _ in range(self.__workers):
+            self.__queue.put(None)
+
+    def submit(self, func: Callable, *args) -> Future:
+        """Queues ``func(*args)`` to run on the next free thread.
+
+        Returns:
+            A Future for the result of ``func``.
+        """
+        future = Future()
+        self.__queue.put((future, func, args))
+
+        return future
+
+
+def wait_futures(futures: Iterable[Future], return_when: str = ALL_COMPLETED) -> Set[Future]:
+    """Waits for futures under the deadlines active in this thread.
+
+    Args:
+        futures: Futures to wait for.
+        return_when: ALL_COMPLETED or FIRST_COMPLETED, as for concurrent.futures.wait.
+
+    Returns:
+        The futures that finished. This is short of ``return_when`` if a deadline passed or was cancelled first.
+    """
+    futures = list(futures)
+    deadlines = deadline.context()
+    while True:
+        timeout = min([i.remaining() for i in deadlines] + [_POLL_INTERVAL]) if deadlines else None
+        done, not_done = wait(futures, timeout=max(0.0, timeout) if deadlines else None, return_when=return_when)
+        if not not_done or (done and return_when != ALL_COMPLETED) or any(i.expired() for i in deadlines):
+            return done
+
+
+def _cancelled(item: Any) -> ParallelResult:
+    ret = ParallelResult(item)
+    active = deadline.current()
+    ret.error = DeadlineError("{0!s} cancelled".format(active.name if active else 'operation'))
+
+    return ret
+
+
+def _run_one(func: Callable, item: Any, context: tuple = (), deadlines: tuple = ()) -> ParallelResult:
+    ret = ParallelResult(item)
+    start = time.monotonic()
+    try:
+        with API_STATS.inherit(context), deadline.inherit(deadlines):
+            deadline.check()
+            ret.result = func(item)
+    except Exception as err:  # pylint: disable=broad-except
+        LOGGER.debug("Parallel operation on '%s' failed: %s", item, err)
+        ret.error = err
+    ret.duration = time.monotonic() - start
+
+    return ret
+
+
+def run_parallel(func: Callable, items: Iterable, workers: int = DEFAULT_WORKERS) -> List[ParallelResult]:
+    """Runs ``func`` against every item in ``items`` using a bounded pool of threads.
+
+    Args:
+        func: Function to call with each item.
+        items: Items to run ``func`` against.
+        workers: Maximum number of operations to run at the same time.
+
+    Deadlines active in the calling thread apply to every operation. When the first of them passes, or is
+    cancelled, operations that have not started are cancelled and the results gathered so far are returned.
+    Operations still running are abandoned in daemon threads, see DaemonExecutor. They stop at their own next
+    deadline check, and do not delay the process exiting.
+
+    Returns:
+        A list of ParallelResult classes in the same order as ``items``. Errors raised by ``func`` are stored in the
+        result rather than raised. Cancelled operations hold a DeadlineError.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    deadlines = deadline.context()
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        return [_run_one(func, item, API_STATS.context(), deadlines) for item in items]
+
+    pool = DaemonExecutor(workers)
+    futures = [pool.submit(_run_one, func, item, API_STATS.context(), deadlines) for item in items]
+    done = wait_futures(futures)
+    pool.shutdown()
+
+    return [future.result() if future in done else _cancelled(item) for future, item in zip(futures, items)]
@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# persist.py : Configuration File Persistence
+"""ElJef Docker Configuration File Persistence.
+
+This module holds functionality for reading and atomically writing configuration files under advisory locks.
+"""
+import logging
+import os
+import threading
+
+from typing import Callable
+
+from eljef.core import fops
+from eljef.core.check import version_check
+
+from eljef.docker.locks import FileLock
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+LOCK_SUFFIX = '.lock'
+
+
+def _lock(file_path: str, shared: bool = False) -> FileLock:
+    return FileLock(file_path + LOCK_SUFFIX, shared)
+
+
+def _write(file_path: str, data: dict, mode: int = None) -> None:
+    dir_path, file_name = os.path.split(os.path.abspath(file_path))
+    temp_path = os.path.join(dir_path, ".{0!s}.{1!s}.{2!s}.tmp".format(file_name, os.getpid(), threading.get_ident()))
+    try:
+        if mode is not None:
+            os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode))
+            os.chmod(temp_path, mode)
+        fops.file_write_convert(temp_path, 'YAML', data)
+        with open(temp_path, 'rb') as open_file:
+            os.fsync(open_file.fileno())
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def read_yaml(file_path: str, missing_ok: bool = False) -> dict:
+    """Reads a YAML file while holding a shared lock, so it is never read halfway through a write.
+
+    Args:
+        file_path: Path to file.
+        missing_ok: Return an empty dictionary if the file does not exist.
+
+    Returns:
+        Contents of the file.
+    """
+    with _lock(file_path, True):
+        return fops.file_read_convert(file_path, 'YAML', missing_ok)
+
+
+def write_yaml(file_path: str, data: dict, mode: int = None) -> None:
+    """Atomically replaces a YAML file while holding an exclusive lock.
+
+    The data is written to a temporary file in the same directory and synced to disk before it is renamed over
+    ``file_path``. Readers see either the old or the new contents.
+
+    Args:
+        file_path: Path to file.
+        data: Data to write.
+        mode: Permissions for the file, set before any data is written. Defaults to the umask.
+    """
+    with _lock(file_path):
+        _write(file_path, data, mode)
+    LOGGER.debug("Wrote %s", file_path)
+
+
+def update_yaml(file_path: str, func: Callable[[dict], dict], mode: int = None) -> dict:
+    """Reads, changes, and atomically replaces a YAML file while holding an exclusive lock.
+
+    Changes written by other processes between reading and writing are not lost, because no other writer can run
+    while the lock is held.
+
+    Args:
+        file_path: Path to file. It does not need to exist.
+        func: Function given the current contents, returning the contents to write.
+        mode: Permissions for the file, set before any data is written. Defaults to the umask.
+
+    Returns:
+        The contents written.
+    """
+    with _lock(file_path):
+        data = func(fops.file_read_convert(file_path, 'YAML', True))
+        _write(file_path, data, mode)
+    LOGGER.debug("Updated %s", file_path)
+
+    return data
@@ -0,0 +1,255 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# placement.py : Docker Container CPU and NUMA Placement
+"""ElJef Docker Container CPU and NUMA Placement.
+
+This module holds functionality for assigning cpusets and NUMA memory nodes to containers.
+"""
+import glob
+import logging
+import math
+import os
+import re
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from docker.utils import parse_bytes
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.containers import DockerContainer
+from eljef.docker.exceptions import DockerError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+SYS_CPU = '/sys/devices/system/cpu'
+SYS_NODE = '/sys/devices/system/node'
+
+_MEMINFO_RE = re.compile(r'MemTotal:\s+(\d+)\s+kB')
+_NANO = 1000000000
+
+
+def _read(file_path: str) -> str:
+    with open(file_path, 'r', encoding='utf-8') as open_file:
+        return open_file.read().strip()
+
+
+def format_cpulist(cpus: List[int]) -> str:
+    """Formats CPU numbers as a cpuset list.
+
+    Args:
+        cpus: CPU numbers.
+
+    Returns:
+        cpuset list string. (ie: 0-3,8)
+    """
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+
+    return ','.join(str(i[0]) if i[0] == i[1] else "{0!s}-{1!s}".format(*i) for i in ranges)
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    """Parses a cpuset list into CPU numbers.
+
+    Args:
+        cpulist: cpuset list string. (ie: 0-3,8)
+
+    Returns:
+        A sorted list of CPU numbers.
+    """
+    ret = set()
+    for part in (i for i in cpulist.split(',') if i.strip()):
+        start, _, end = part.partition('-')
+        ret.update(range(int(start), int(end or start) + 1))
+
+    return sorted(ret)
+
+
+class NumaNode(DictObj):
+    """NUMA node information class
+
+    Args:
+        node_id: NUMA node number.
+        cpus: CPUs on this node, ordered so hyperthread siblings are next to each other.
+        memory: Memory on this node in bytes. 0 if unknown.
+    """
+    def __init__(self, node_id: int, cpus: List[int], memory: int = 0) -> None:
+        super().__init__()
+        self.cpus = cpus
+        self.memory = memory
+        self.node_id = node_id
+
+
+def _sibling_order(cpus: List[int], sys_cpu: str) -> List[int]:
+    ordered = []
+    for cpu in cpus:
+        if cpu in ordered:
+            continue
+        siblings_file = os.path.join(sys_cpu, "cpu{0!s}".format(cpu), 'topology', 'thread_siblings_list')
+        siblings = parse_cpulist(_read(siblings_file)) if os.path.isfile(siblings_file) else [cpu]
+        ordered += [i for i in siblings if i in cpus and i not in ordered]
+
+    return ordered
+
+
+def read_topology(sys_cpu: str = SYS_CPU, sys_node: str = SYS_NODE) -> List[NumaNode]:
+    """Reads host CPU and NUMA topology from sysfs.
+
+    Hosts without NUMA information are treated as a single node holding every online CPU.
+
+    Args:
+        sys_cpu: Path to sysfs cpu directory.
+        sys_node: Path to sysfs node directory.
+
+    Returns:
+        A list of NumaNode information classes.
+    """
+    nodes = []
+    for node_path in sorted(glob.glob(os.path.join(sys_node, 'node[0-9]*'))):
+        node_id = int(os.path.basename(node_path)[4:])
+        cpus = parse_cpulist(_read(os.path.join(node_path, 'cpulist')))
+        if not cpus:
+            continue
+        memory = 0
+        if os.path.isfile(os.path.join(node_path, 'meminfo')):
+            match = _MEMINFO_RE.search(_read(os.path.join(node_path, 'meminfo')))
+            memory = int(match.group(1)) * 1024 if match else 0
+        nodes.append(NumaNode(node_id, _sibling_order(cpus, sys_cpu), memory))
+
+    if not nodes:
+        nodes.append(NumaNode(0, _sibling_order(parse_cpulist(_read(os.path.join(sys_cpu, 'online'))), sys_cpu)))
+
+    LOGGER.debug("Host topology: %s", ', '.join("node{0!s}: {1!s} cpus".format(i.node_id, len(i.cpus)) for i in nodes))
+
+    return nodes
+
+
+def _cpu_request(container: DockerContainer) -> int:
+    return int(math.ceil(container.info.nano_cpus / _NANO)) if container.info.nano_cpus else 0
+
+
+def _mem_request(container: DockerContainer) -> int:
+    return parse_bytes(container.info.mem_limit) if container.info.mem_limit else 0
+
+
+def _net_units(containers: List[DockerContainer]) -> List[List[DockerContainer]]:
+    by_name = {i.info.name: i for i in containers}
+    parent = {i: i for i in by_name}
+
+    def _root(name: str) -> str:
+        while parent[name] != name:
+            name = parent[name]
+        return name
+
+    for container in containers:
+        if container.info.net in by_name:
+            parent[_root(container.info.name)] = _root(container.info.net)
+
+    units = dict()
+    for name, container in by_name.items():
+        units.setdefault(_root(name), []).append(container)
+
+    return list(units.values())
+
+
+class PlacementPlanner(object):
+    """Container cpuset and NUMA placement planner class
+
+    Args:
+        nodes: Host topology, as returned by ``read_topology``.
+    """
+    def __init__(self, nodes: List[NumaNode]) -> None:
+        self.__free = {i.node_id: list(i.cpus) for i in nodes}
+        self.__memory = {i.node_id: i.memory for i in nodes}
+        self.__memory_known = {i.node_id for i in nodes if i.memory}
+
+    def __fits(self, node_id: int, cpus: int, memory: int) -> bool:
+        mem_ok = node_id not in self.__memory_known or memory <= self.__memory[node_id]
+        return cpus <= len(self.__free[node_id]) and mem_ok
+
+    def reserve(self, cpuset_cpus: str, memory: int = 0, cpuset_mems: str = '') -> None:
+        """Marks CPUs, and memory, as used by a container outside of this plan.
+
+        The memory is charged once, split evenly over the nodes in ``cpuset_mems``. If ``cpuset_mems`` is not set,
+        it is split over the nodes holding ``cpuset_cpus`` in proportion to the CPUs used on each.
+
+        Args:
+            cpuset_cpus: cpuset list already in use.
+            memory: Memory in bytes used by the container holding ``cpuset_cpus``.
+            cpuset_mems: NUMA memory nodes the container allocates from.
+        """
+        used = set(parse_cpulist(cpuset_cpus))
+        shares = dict()
+        for node_id, free in self.__free.items():
+            shares[node_id] = len(used & set(free))
+            self.__free[node_id] = [i for i in free if i not in used]
+
+        mem_nodes = [i for i in parse_cpulist(cpuset_mems) if i in self.__memory]
+        if mem_nodes:
+            shares = {i: 1 for i in mem_nodes}
+        total = sum(shares.values())
+        for node_id, share in shares.items():
+            if share:
+                self.__memory[node_id] -= memory * share // total
+
+    def plan(self, containers: List[DockerContainer]) -> Dict[str, Tuple[str, str]]:
+        """Assigns non-overlapping cpusets and a NUMA memory node to containers that request CPUs.
+
+        Containers sharing a network namespace (``net``) are placed on the same NUMA node. Containers without a CPU
+        request (``nano_cpus``) are left unpinned.
+
+        Args:
+            containers: Containers to place. Pass each replica of a replicated definition, as returned by
+                        ``DockerContainer.replicas()``, so every replica gets its own CPUs.
+
+        Returns:
+            A dictionary of container name to (cpuset_cpus, cpuset_mems).
+
+        Raises:
+            DockerError: If a set of containers does not fit on any NUMA node.
+        """
+        units = _net_units([i for i in containers if _cpu_request(i)])
+        units.sort(key=lambda u: sum(_cpu_request(i) for i in u), reverse=True)
+
+        ret = dict()
+        for unit in units:
+            cpus = sum(_cpu_request(i) for i in unit)
+            memory = sum(_mem_request(i) for i in unit)
+            nodes = [i for i in self.__free if self.__fits(i, cpus, memory)]
+            if not nodes:
+                names = ', '.join(i.info.name for i in unit)
+                raise DockerError("No NUMA node has {0!s} free CPUs for: {1!s}".format(cpus, names))
+
+            node_id = min(nodes, key=lambda i: len(self.__free[i]))
+            self.__memory[node_id] -= memory
+            for container in unit:
+                assigned = self.__free[node_id][:_cpu_request(container)]
+                self.__free[node_id] = self.__free[node_id][len(assigned):]
+                ret[container.info.name] = (format_cpulist(assigned), str(node_id))
+                LOGGER.debug("Placed '%s' on node %s cpus %s", container.info.name, node_id,
+                             ret[container.info.name][0])
+
+        return ret
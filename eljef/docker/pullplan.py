@@ -0,0 +1,204 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# pullplan.py : Docker Image Pull Planning
+"""ElJef Docker Image Pull Planning.
+
+This module holds functionality for ordering image pulls so layers shared between images are only downloaded once.
+"""
+import logging
+
+from typing import Dict
+from typing import List
+from typing import Set
+
+import docker
+
+from docker.errors import ImageNotFound
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.buildplan import DockerBuildPlanner
+from eljef.docker.image import DockerImage
+from eljef.docker.mirrors import rank_mirrors
+from eljef.docker.parallel import DEFAULT_WORKERS
+from eljef.docker.parallel import run_parallel
+from eljef.docker.registry import RegistryClient
+from eljef.docker.registry import RegistryLayer
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+
+class PullReport(DictObj):
+    """Planned pull report class"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.build_waves = []
+        self.downloaded_bytes = 0
+        self.expected_bytes = 0
+        self.failed = dict()
+        self.total_bytes = 0
+        self.waves = []
+
+
+def _shared_bytes(image_layers: List[RegistryLayer], covered: Set[str], counts: Dict[str, int]) -> int:
+    return sum(i.size for i in image_layers if i.digest not in covered and counts[i.digest] > 1)
+
+
+def plan_waves(layers: Dict[str, List[RegistryLayer]]) -> List[List[str]]:
+    """Orders images into waves of pulls that can run at the same time.
+
+    No two images in the same wave download the same layer. Images sharing the most layer bytes with other
+    images are placed first, so shared base layers are downloaded once before the images that build on them.
+
+    Args:
+        layers: Layers of each image, keyed by image reference.
+
+    Returns:
+        A list of waves, each a list of image references.
+    """
+    counts = dict()
+    for image_layers in layers.values():
+        for digest in {i.digest for i in image_layers}:
+            counts[digest] = counts.get(digest, 0) + 1
+
+    waves = []
+    covered = set()
+    remaining = sorted(layers)
+    while remaining:
+        remaining.sort(key=lambda i: _shared_bytes(layers[i], covered, counts), reverse=True)
+        wave, claimed = [], set()
+        for image_ref in remaining:
+            new_layers = {i.digest for i in layers[image_ref]} - covered
+            if new_layers & claimed:
+                continue
+            wave.append(image_ref)
+            claimed |= new_layers
+        covered |= claimed
+        remaining = [i for i in remaining if i not in wave]
+        waves.append(wave)
+
+    return waves
+
+
+class DockerPullPlanner(object):
+    """Docker layer-aware image pull class
+
+    Args:
+        client: Initialized DockerClient class (Required)
+
+    Keyword Args:
+        workers (int): Maximum number of pulls to run at the same time.
+        build_workers (int): Maximum number of builds to run at the same time. Defaults to ``workers``.
+    """
+    def __init__(self, client: docker.DockerClient, **kwargs) -> None:
+        self.__client = client
+        self.__workers = kwargs.get('workers', DEFAULT_WORKERS)
+        self.__build_workers = kwargs.get('build_workers', self.__workers)
+        self.__platform = None
+
+    def __local_layers(self, images: List[DockerImage]) -> Set[str]:
+        ret = set()
+        for image in images:
+            try:
+                ret.update(self.__client.images.get(image.name).attrs.get('RootFS', {}).get('Layers') or [])
+            except ImageNotFound:
+                LOGGER.debug("Image '%s' not present locally.", image.name)
+
+        return ret
+
+    def __rank_mirrors(self, images: List[DockerImage]) -> None:
+        mirrored = {i.name: i for i in images if i.mirrors and not i.build_path}
+        if not mirrored:
+            return
+
+        LOGGER.debug("Probing registry mirrors for: %s", ', '.join(sorted(mirrored)))
+        for image_ref, mirrors in rank_mirrors({k: v.mirrors for k, v in mirrored.items()}, self.__workers).items():
+            mirrored[image_ref].mirrors = mirrors
+
+    def __remote_layers(self, image: DockerImage) -> List[RegistryLayer]:
+        if not self.__platform:
+            version = self.__client.version()
+            self.__platform = (version.get('Os', 'linux'), version.get('Arch', 'amd64'))
+
+        return RegistryClient(**image.registry_args()).layers(image.name, self.__platform)
+
+    def plan(self, images: List[DockerImage], report: PullReport = None) -> List[List[DockerImage]]:
+        """Plans the order of pulls for ``images``.
+
+        Images that are built locally are skipped. Images whose manifests cannot be read are pulled in the last wave.
+
+        Args:
+            images: Images to pull.
+            report: PullReport to fill with expected byte counts.
+
+        Returns:
+            A list of waves, each a list of images that can be pulled at the same time.
+        """
+        report = report if report is not None else PullReport()
+        by_name = {i.name: i for i in images if not i.build_path}
+
+        layers, unplanned = dict(), []
+        for result in run_parallel(self.__remote_layers, by_name.values(), self.__workers):
+            if result.error:
+                LOGGER.debug("Could not read layers for '%s': %s", result.item.name, result.error)
+                unplanned.append(result.item)
+            else:
+                layers[result.item.name] = result.result
+
+        unique = {j.digest: j for i in layers.values() for j in i}
+        local = self.__local_layers(list(by_name.values()))
+        report.total_bytes = sum(j.size for i in layers.values() for j in i)
+        report.expected_bytes = sum(i.size for i in unique.values() if i.diff_id not in local)
+
+        waves = [[by_name[j] for j in i] for i in plan_waves(layers)]
+        if unplanned:
+            waves.append(unplanned)
+
+        return waves
+
+    def pull(self, images: List[DockerImage]) -> PullReport:
+        """Pulls ``images`` in layer-sharing order, then builds images that are built locally in FROM dependency order.
+
+        Registry mirrors are probed first, so each image is pulled from the fastest mirror holding it.
+
+        Args:
+            images: Images to pull.
+
+        Returns:
+            A filled PullReport information holder.
+        """
+        report = PullReport()
+        self.__rank_mirrors(images)
+        for wave in self.plan(images, report):
+            LOGGER.debug("Pulling wave: %s", ', '.join(i.name for i in wave))
+            report.waves.append([i.name for i in wave])
+            for result in run_parallel(lambda i: i.pull(), wave, self.__workers):
+                if result.error:
+                    report.failed[result.item.name] = str(result.error)
+                report.downloaded_bytes += result.item.downloaded
+
+        builds = DockerBuildPlanner(workers=self.__build_workers).build(images)
+        report.build_waves = builds.waves
+        report.failed.update(builds.failed)
+        report.failed.update(builds.skipped)
+
+        LOGGER.debug("Pulled %d bytes, expected %d bytes (%d without layer sharing)", report.downloaded_bytes,
+                     report.expected_bytes, report.total_bytes)
+
+        return report
@@ -0,0 +1,255 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# registry.py : Docker Registry
+"""ElJef Docker Registry operations.
+
+This module holds functionality for reading image manifests directly from a Docker registry (v2 API).
+"""
+import logging
+import re
+
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import requests
+
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.exceptions import DockerError
+from eljef.docker.tokens import TokenCache
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+DEFAULT_REGISTRY = 'docker.io'
+
+MEDIA_MANIFEST_V2 = 'application/vnd.docker.distribution.manifest.v2+json'
+MEDIA_MANIFEST_LIST = 'application/vnd.docker.distribution.manifest.list.v2+json'
+MEDIA_OCI_MANIFEST = 'application/vnd.oci.image.manifest.v1+json'
+MEDIA_OCI_INDEX = 'application/vnd.oci.image.index.v1+json'
+
+_ACCEPT = ', '.join((MEDIA_MANIFEST_V2, MEDIA_MANIFEST_LIST, MEDIA_OCI_MANIFEST, MEDIA_OCI_INDEX))
+_CHALLENGE_RE = re.compile(r'(\w+)="([^"]*)"')
+_DOCKER_HUB_API = 'registry-1.docker.io'
+_ERR_REGISTRY = "Registry error for '{0!s}': {1!s}"
+
+
+def parse_reference(image_ref: str) -> Tuple[str, str, str]:
+    """Splits an image reference into its registry, repository, and tag or digest.
+
+    Args:
+        image_ref: Image reference as it would be given to docker pull.
+
+    Returns:
+        A tuple of (registry, repository, tag). ``tag`` holds the digest for references pinned by digest.
+    """
+    name, tag = image_ref, 'latest'
+    if '@' in name:
+        name, tag = name.split('@', 1)
+    elif ':' in name.rsplit('/', 1)[-1]:
+        name, tag = name.rsplit(':', 1)
+
+    registry = DEFAULT_REGISTRY
+    parts = name.split('/', 1)
+    if len(parts) == 2 and ('.' in parts[0] or ':' in parts[0] or parts[0] == 'localhost'):
+        registry, name = parts
+    if registry == DEFAULT_REGISTRY and '/' not in name:
+        name = "library/{0!s}".format(name)
+
+    return registry, name, tag
+
+
+def tagged_reference(image_ref: str) -> str:
+    """Returns an image reference with its tag, adding ``latest`` if it has none. (ie: nginx -> nginx:latest)
+
+    This matches ``DockerImage.name``, so references written either way compare equal.
+    """
+    if '@' in image_ref or ':' in image_ref.rsplit('/', 1)[-1]:
+        return image_ref
+
+    return "{0!s}:latest".format(image_ref)
+
+
+class RegistryLayer(DictObj):
+    """Image layer information class
+
+    Args:
+        digest: Compressed (distribution) digest of the layer.
+        size: Compressed size of the layer in bytes.
+        diff_id: Uncompressed digest of the layer, as stored by the engine.
+    """
+    def __init__(self, digest: str, size: int, diff_id: str = None) -> None:
+        super().__init__()
+        self.digest = digest
+        self.diff_id = diff_id
+        self.size = size
+
+
+class RegistryClient(object):
+    """Docker registry v2 API client class
+
+    Keyword Args:
+        insecure_registry (bool): Registry uses plain http.
+        username (str): Username for connecting to registry.
+        password (str): Password for connecting to registry.
+        timeout (float): Timeout in seconds for each request.
+        token_cache (TokenCache): Cache to share bearer tokens through. Tokens are only kept by this client if not
+                                  set.
+    """
+    def __init__(self, **kwargs) -> None:
+        self.__insecure = kwargs.get('insecure_registry', False)
+        self.__auth = None
+        self.__account = kwargs.get('username', None)
+        if kwargs.get('username', None) or kwargs.get('password', None):
+            self.__auth = (kwargs.get('username', None) or '', kwargs.get('password', None) or '')
+        self.__session = requests.Session()
+        self.__timeout = kwargs.get('timeout', 30)
+        self.__tokens = kwargs.get('token_cache', None) or TokenCache()
+
+    def __token(self, challenge: str, registry: str, scope: str) -> str:
+        params = dict(_CHALLENGE_RE.findall(challenge))
+        realm = params.pop('realm', None)
+        if not realm:
+            raise DockerError(_ERR_REGISTRY.format(scope, 'authentication challenge has no realm'))
+        params['scope'] = params.get('scope', scope)
+
+        LOGGER.debug("Requesting registry token for scope '%s'", params['scope'])
+        resp = self.__session.get(realm, params=params, auth=self.__auth, timeout=self.__timeout)
+        if resp.status_code != 200:
+            raise DockerError(_ERR_REGISTRY.format(scope, "token request failed ({0!s})".format(resp.status_code)))
+        data = resp.json()
+        token = data.get('token') or data.get('access_token')
+        self.__tokens.put(registry, scope, token, data.get('expires_in', None), self.__account)
+
+        return token
+
+    def __url(self, registry: str, path: str) -> str:
+        host = _DOCKER_HUB_API if registry == DEFAULT_REGISTRY else registry
+        return "{0!s}://{1!s}/v2/{2!s}".format('http' if self.__insecure else 'https', host, path)
+
+    def _request(self, method: str, registry: str, repository: str, path: str, headers: dict = None) \
+            -> requests.Response:
+        """Sends a request to a registry, performing token or basic authentication when challenged."""
+        scope = "repository:{0!s}:pull".format(repository)
+        headers = dict(headers or {})
+        url = self.__url(registry, path)
+        kw_args = {'headers': headers, 'timeout': self.__timeout}
+
+        token = self.__tokens.get(registry, scope, self.__account)
+        if token:
+            headers['Authorization'] = "Bearer {0!s}".format(token)
+        resp = self.__session.request(method, url, **kw_args)
+
+        challenge = resp.headers.get('WWW-Authenticate', '')
+        if resp.status_code == 401 and challenge.lower().startswith('bearer'):
+            headers['Authorization'] = "Bearer {0!s}".format(self.__token(challenge, registry, scope))
+            resp = self.__session.request(method, url, **kw_args)
+        elif resp.status_code == 401 and self.__auth:
+            resp = self.__session.request(method, url, auth=self.__auth, **kw_args)
+
+        if resp.status_code >= 400:
+            raise DockerError(_ERR_REGISTRY.format(repository, "{0!s} {1!s}".format(resp.status_code, path)))
+
+        return resp
+
+    def token(self, image_ref: str) -> Union[str, None]:
+        """Returns a bearer token that allows pulling an image reference, from the cache when possible.
+
+        Args:
+            image_ref: Image reference.
+
+        Returns:
+            Bearer token, or None if the registry does not use token authentication.
+        """
+        registry, repository, _ = parse_reference(image_ref)
+        scope = "repository:{0!s}:pull".format(repository)
+        token = self.__tokens.get(registry, scope, self.__account)
+        if token:
+            return token
+
+        resp = self.__session.get(self.__url(registry, ''), timeout=self.__timeout)
+        challenge = resp.headers.get('WWW-Authenticate', '')
+        if resp.status_code == 401 and challenge.lower().startswith('bearer'):
+            return self.__token(challenge, registry, scope)
+
+        return None
+
+    def digest(self, image_ref: str) -> str:
+        """Returns the manifest digest the registry currently holds for an image reference.
+
+        Args:
+            image_ref: Image reference.
+
+        Returns:
+            Manifest digest as sha256:xxx.
+        """
+        registry, repository, tag = parse_reference(image_ref)
+        resp = self._request('HEAD', registry, repository, "{0!s}/manifests/{1!s}".format(repository, tag),
+                             {'Accept': _ACCEPT})
+
+        return resp.headers.get('Docker-Content-Digest', '')
+
+    def manifest(self, image_ref: str, platform: Tuple[str, str] = ('linux', 'amd64')) -> dict:
+        """Returns the image manifest for an image reference, resolving manifest lists for ``platform``.
+
+        Args:
+            image_ref: Image reference.
+            platform: (os, architecture) to select from manifest lists.
+
+        Returns:
+            Image manifest dictionary.
+        """
+        registry, repository, tag = parse_reference(image_ref)
+        path = "{0!s}/manifests/{1!s}".format(repository, tag)
+        manifest = self._request('GET', registry, repository, path, {'Accept': _ACCEPT}).json()
+
+        if manifest.get('mediaType') in {MEDIA_MANIFEST_LIST, MEDIA_OCI_INDEX} or 'manifests' in manifest:
+            for entry in manifest.get('manifests', []):
+                entry_platform = entry.get('platform', {})
+                if (entry_platform.get('os'), entry_platform.get('architecture')) == tuple(platform):
+                    path = "{0!s}/manifests/{1!s}".format(repository, entry['digest'])
+                    return self._request('GET', registry, repository, path, {'Accept': _ACCEPT}).json()
+            raise DockerError(_ERR_REGISTRY.format(image_ref, "no manifest for platform {0!s}".format(platform)))
+
+        return manifest
+
+    def layers(self, image_ref: str, platform: Tuple[str, str] = ('linux', 'amd64')) -> List[RegistryLayer]:
+        """Returns the layers that make up an image.
+
+        Args:
+            image_ref: Image reference.
+            platform: (os, architecture) to select from manifest lists.
+
+        Returns:
+            A list of RegistryLayer information classes, base layer first.
+        """
+        registry, repository, _ = parse_reference(image_ref)
+        manifest = self.manifest(image_ref, platform)
+
+        diff_ids = []
+        if manifest.get('config', {}).get('digest'):
+            path = "{0!s}/blobs/{1!s}".format(repository, manifest['config']['digest'])
+            diff_ids = self._request('GET', registry, repository, path).json().get('rootfs', {}).get('diff_ids', [])
+
+        ret = []
+        for count, layer in enumerate(manifest.get('layers', [])):
+            diff_id = diff_ids[count] if count < len(diff_ids) else None
+            ret.append(RegistryLayer(layer['digest'], layer.get('size', 0), diff_id))
+
+        return ret
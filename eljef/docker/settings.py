@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# settings.py : Docker Settings
+"""ElJef Docker Settings.
+
+This module holds the global settings for the ElJef Docker module.
+"""
+import logging
+import os
+
+from eljef.core import fops
+from eljef.core.check import version_check
+from eljef.core.dictobj import DictObj
+
+from eljef.docker.exceptions import ConfigError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+SETTINGS_FILE = 'settings.yaml'
+
+_VALIDATE_TE = "Incorrect setting type: '{0!s}' is '{1!s}' but needs to be '{2!s}'"
+
+
+class DockerSettings(DictObj):
+    """Docker global settings class"""
+    def __init__(self):
+        super().__init__()
+        self.batch_timeout = 0
+        self.distribute_targets = []
+        self.engine_timeout = 60
+        self.image_archive_path = ''
+        self.image_archive_pull = False
+        self.image_gc_after_update = False
+        self.image_gc_keep = 1
+        self.max_parallel_builds = 2
+        self.max_parallel_pulls = 3
+        self.max_parallel_recreates = 4
+        self.max_workers = 4
+        self.operation_timeout = 0
+        self.registry_mirrors = {}
+        self.registry_token_cache = False
+
+
+def read_settings(config_path: str) -> DockerSettings:
+    """Reads global settings from the configuration directory.
+
+    Args:
+        config_path: Path to base configuration directory.
+
+    Returns:
+        A filled DockerSettings information holder. Settings not present in the settings file keep their defaults.
+
+    Raises:
+        ConfigError: If type of data is incorrect.
+    """
+    settings = DockerSettings()
+    settings_file = os.path.join(os.path.abspath(config_path), SETTINGS_FILE)
+
+    LOGGER.debug("Reading settings from %s", settings_file)
+    file_d = fops.file_read_convert(settings_file, 'YAML', True)
+
+    for key in settings.keys():
+        if key in file_d:
+            data = file_d[key]
+            # bool is a subclass of int, so true would otherwise pass as a number
+            if not isinstance(data, type(settings[key])) or isinstance(data, bool) != isinstance(settings[key], bool):
+                raise ConfigError(_VALIDATE_TE.format(key, type(data).__name__, type(settings[key]).__name__))
+            setattr(settings, key, data)
+
+    return settings
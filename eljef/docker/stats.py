@@ -0,0 +1,199 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# stats.py : Docker Engine API Call Statistics
+"""ElJef Docker Engine API Call Statistics.
+
+This module holds functionality for counting the engine API requests made by each library operation.
+"""
+import contextlib
+import functools
+import logging
+import re
+import threading
+
+from collections import Counter
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import Tuple
+
+import docker
+
+from eljef.core.check import version_check
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+NO_OPERATION = '-'
+OPERATION_SEP = ' > '
+
+# (pattern, replacement) pairs turning request paths into endpoints, first match wins
+_ENDPOINTS = (
+    (re.compile(r'^/images/(json|create|load|get|search|prune)$'), r'/images/\1'),
+    (re.compile(r'^/images/.+/(json|history|push|tag|get)$'), r'/images/{name}/\1'),
+    (re.compile(r'^/images/.+$'), '/images/{name}'),
+    (re.compile(r'^/distribution/.+/json$'), '/distribution/{name}/json'),
+    (re.compile(r'^/(containers|exec|networks|volumes|plugins|secrets|configs|services|nodes|tasks)/'
+                r'(?!json$|create$|prune$)[^/]+'), r'/\1/{id}'),
+)
+_VERSION_RE = re.compile(r'^/v\d+\.\d+')
+
+
+def endpoint(path: str) -> str:
+    """Returns the endpoint for an engine API request path, with versions, queries, ids and names removed.
+
+    Args:
+        path: Request path. (ie: /v1.38/containers/web/json?size=1)
+
+    Returns:
+        Endpoint string. (ie: /containers/{id}/json)
+    """
+    path = _VERSION_RE.sub('', path.split('?')[0])
+    for pattern, replacement in _ENDPOINTS:
+        if pattern.match(path):
+            return pattern.sub(replacement, path, count=1)
+
+    return path
+
+
+class ApiStats(object):
+    """Engine API request counter class
+
+    Requests are counted per library operation, method, and endpoint. The operation is the chain of functions
+    decorated with ``api_operation`` running in the thread that made the request, outermost first, so requests
+    count towards every operation they were made under.
+    """
+    def __init__(self) -> None:
+        self.__calls = Counter()
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+
+    def __stack(self) -> list:
+        if not hasattr(self.__local, 'stack'):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def attach(self, client: docker.DockerClient) -> None:
+        """Starts counting requests made through ``client``.
+
+        Args:
+            client: Initialized DockerClient class.
+        """
+        hooks = client.api.hooks.setdefault('response', [])
+        if self.record not in hooks:
+            hooks.append(self.record)
+
+    def calls(self) -> Dict[Tuple[str, str, str], int]:
+        """Returns request counts.
+
+        Returns:
+            A dictionary of (operation chain, method, endpoint) to number of requests. Operations in the chain are
+            separated by ``OPERATION_SEP``.
+        """
+        with self.__lock:
+            return dict(self.__calls)
+
+    def context(self) -> Tuple[str, ...]:
+        """Returns the operation chain of this thread, to be passed to ``inherit`` in worker threads."""
+        return tuple(self.__stack())
+
+    @contextlib.contextmanager
+    def inherit(self, context: Tuple[str, ...]) -> Iterator[None]:
+        """Context manager running with the operation chain of another thread, as returned by ``context``."""
+        saved = self.__stack()[:]
+        self.__stack()[:] = context
+        try:
+            yield
+        finally:
+            self.__stack()[:] = saved
+
+    @contextlib.contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        """Context manager attributing requests made inside it, in this thread, to ``name``."""
+        self.__stack().append(name)
+        try:
+            yield
+        finally:
+            self.__stack().pop()
+
+    def record(self, response, *args, **kwargs) -> None:
+        """Counts one engine API response. Used as a requests response hook."""
+        del args, kwargs
+        stack = self.__stack()
+        chain = OPERATION_SEP.join(stack) if stack else NO_OPERATION
+        key = (chain, response.request.method, endpoint(response.request.path_url))
+        with self.__lock:
+            self.__calls[key] += 1
+        LOGGER.debug("API %s %s (%s)", key[1], response.request.path_url, stack[-1] if stack else NO_OPERATION)
+
+    def reset(self) -> None:
+        """Clears all counts."""
+        with self.__lock:
+            self.__calls.clear()
+
+    def totals(self) -> Dict[str, int]:
+        """Returns request counts per operation, including requests made by the operations it calls.
+
+        Returns:
+            A dictionary of operation to number of requests.
+        """
+        ret = Counter()
+        for (chain, _, _), count in self.calls().items():
+            for operation in set(chain.split(OPERATION_SEP)):
+                ret[operation] += count
+
+        return dict(ret)
+
+    def over_budget(self, budget: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+        """Compares request counts against an upper bound per operation.
+
+        Args:
+            budget: Dictionary of operation to maximum number of requests.
+
+        Returns:
+            A dictionary of operation to (requests made, budget) for each operation over its budget.
+        """
+        totals = self.totals()
+
+        return {k: (totals[k], v) for k, v in budget.items() if totals.get(k, 0) > v}
+
+    def log_summary(self, level: int = logging.DEBUG) -> None:
+        """Logs request counts per operation and endpoint.
+
+        Args:
+            level: Logging level to log the summary at.
+        """
+        calls = self.calls()
+        LOGGER.log(level, "Engine API requests: %d", sum(calls.values()))
+        for chain in sorted({i[0] for i in calls}):
+            LOGGER.log(level, "    %s: %d", chain, sum(v for k, v in calls.items() if k[0] == chain))
+            for (c_chain, method, c_endpoint), count in sorted(calls.items()):
+                if c_chain == chain:
+                    LOGGER.log(level, "        %4d %-6s %s", count, method, c_endpoint)
+
+
+API_STATS = ApiStats()
+
+
+def api_operation(func: Callable) -> Callable:
+    """Decorator attributing engine API requests made by ``func`` to its qualified name."""
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        with API_STATS.operation(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return _wrapper
@@ -0,0 +1,154 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# stream.py : Streaming helpers
+"""ElJef Docker Streaming helpers.
+
+This module holds functionality for passing streamed data between threads without buffering it in memory.
+"""
+import logging
+import queue
+import threading
+
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+from eljef.core.check import version_check
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+CHUNK_SIZE = 1024 * 1024
+PIPE_DEPTH = 8
+
+_END = object()
+
+
+class ChunkPipe(object):
+    """Bounded pipe for passing chunks of data from one thread to another.
+
+    The writing side uses ``write()`` and ``close()`` like a file. The reading side iterates over the pipe. At most
+    ``depth`` chunks are held in memory at once, so a fast writer waits for a slow reader.
+
+    Args:
+        depth: Number of chunks that can be held in the pipe.
+    """
+    def __init__(self, depth: int = PIPE_DEPTH) -> None:
+        self.__aborted = threading.Event()
+        self.__error = None
+        self.__queue = queue.Queue(depth)
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            while True:
+                chunk = self.__queue.get()
+                if chunk is _END:
+                    break
+                yield chunk
+        finally:
+            self.__aborted.set()
+
+        if self.__error:
+            raise self.__error
+
+    def __put(self, item: Any) -> None:
+        while not self.__aborted.is_set():
+            try:
+                self.__queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise BrokenPipeError('reader closed the pipe')
+
+    def close(self, error: Exception = None) -> None:
+        """Marks the end of the data. If ``error`` is set, it is raised on the reading side."""
+        self.__error = error
+        if not self.__aborted.is_set():
+            self.__put(_END)
+
+    def flush(self) -> None:
+        """Does nothing. Provided so the pipe can be used where a file is expected."""
+
+    def write(self, data: bytes) -> int:
+        """Writes a chunk of data into the pipe."""
+        if data:
+            self.__put(bytes(data))
+
+        return len(data)
+
+
+class ChunkReader(object):
+    """File-like reader over an iterable of chunks of data.
+
+    Args:
+        chunks: Iterable of bytes, such as a ChunkPipe or an engine stream.
+    """
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.__chunk = b''
+        self.__chunks = iter(chunks)
+        self.__pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads up to ``size`` bytes. Reads everything that is left if ``size`` is negative."""
+        parts = []
+        while size != 0:
+            if self.__pos >= len(self.__chunk):
+                self.__chunk, self.__pos = next(self.__chunks, None), 0
+                if self.__chunk is None:
+                    self.__chunk = b''
+                    break
+            end = len(self.__chunk) if size < 0 else min(len(self.__chunk), self.__pos + size)
+            parts.append(self.__chunk[self.__pos:end])
+            size -= 0 if size < 0 else end - self.__pos
+            self.__pos = end
+
+        return b''.join(parts)
+
+
+def pipe_from(producer: Callable, *args, depth: int = PIPE_DEPTH) -> ChunkPipe:
+    """Runs ``producer(pipe, *args)`` in a thread and returns the pipe it writes into.
+
+    The pipe is closed when ``producer`` returns. Errors raised by ``producer`` are raised on the reading side.
+
+    Args:
+        producer: Function that writes into the pipe.
+        args: Extra arguments for ``producer``.
+        depth: Number of chunks that can be held in the pipe.
+
+    Returns:
+        The ChunkPipe to read from.
+    """
+    pipe = ChunkPipe(depth)
+
+    def _run() -> None:
+        error = None
+        try:
+            producer(pipe, *args)
+        except BrokenPipeError:
+            return
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.debug("Stream producer failed: %s", err)
+            error = err
+        try:
+            pipe.close(error)
+        except BrokenPipeError:
+            return
+
+    threading.Thread(target=_run, daemon=True).start()
+
+    return pipe
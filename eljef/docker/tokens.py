@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# tokens.py : Docker Registry Token Cache
+"""ElJef Docker Registry Token Cache.
+
+This module holds functionality for caching registry bearer tokens between requests, pulls, and invocations.
+"""
+import logging
+import threading
+import time
+
+from typing import Union
+
+from eljef.core.check import version_check
+
+from eljef.docker.persist import read_yaml
+from eljef.docker.persist import update_yaml
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+TOKEN_FILE = 'registry-tokens.yaml'
+TOKEN_FILE_MODE = 0o600
+
+# lifetime registries are required to assume when a token response has no expires_in
+DEFAULT_EXPIRES_IN = 60
+REFRESH_MARGIN = 15
+
+
+def _key(registry: str, scope: str, account: str = None) -> str:
+    return '|'.join((registry, scope, account or ''))
+
+
+class TokenCache(object):
+    """Registry bearer token cache class
+
+    Tokens are kept per registry, scope, and account. A token is no longer handed out once it is within
+    ``refresh_margin`` seconds of expiring, so it is refreshed before requests start failing with it.
+
+    Args:
+        cache_file: File to share tokens between invocations through. It is only readable by its owner. Tokens are
+                    only kept in memory if not set.
+        refresh_margin: Seconds before expiry to stop using a token.
+    """
+    def __init__(self, cache_file: str = None, refresh_margin: int = REFRESH_MARGIN) -> None:
+        self.__file = cache_file
+        self.__lock = threading.Lock()
+        self.__margin = refresh_margin
+        self.__tokens = self.__read() if cache_file else dict()
+
+    def __read(self) -> dict:
+        return {k: v for k, v in read_yaml(self.__file, True).items() if isinstance(v, dict) and 'token' in v}
+
+    def __valid(self, key: str) -> Union[str, None]:
+        entry = self.__tokens.get(key)
+        if entry and entry.get('expires', 0) - self.__margin > time.time():
+            return entry['token']
+
+        return None
+
+    def __write(self, tokens: dict) -> dict:
+        now = time.time()
+        tokens = {k: v for k, v in tokens.items() if isinstance(v, dict) and v.get('expires', 0) > now}
+        tokens.update({k: v for k, v in self.__tokens.items() if v['expires'] > now})
+
+        return tokens
+
+    def get(self, registry: str, scope: str, account: str = None) -> Union[str, None]:
+        """Returns a cached token.
+
+        Args:
+            registry: Registry the token is for.
+            scope: Scope the token grants. (ie: repository:library/nginx:pull)
+            account: Account the token was requested with.
+
+        Returns:
+            The token, or None if no token is cached or it is about to expire.
+        """
+        key = _key(registry, scope, account)
+        with self.__lock:
+            token = self.__valid(key)
+            if not token and self.__file:
+                self.__tokens.update(self.__read())
+                token = self.__valid(key)
+
+        LOGGER.debug("Registry token for '%s' on %s: %s", scope, registry, 'cached' if token else 'not cached')
+        return token
+
+    def put(self, registry: str, scope: str, token: str, expires_in: int = None, account: str = None) -> None:
+        """Caches a token.
+
+        Args:
+            registry: Registry the token is for.
+            scope: Scope the token grants.
+            token: Bearer token.
+            expires_in: Seconds the token is valid for, as returned by the token server.
+            account: Account the token was requested with.
+        """
+        entry = {'expires': time.time() + (expires_in or DEFAULT_EXPIRES_IN), 'token': token}
+        with self.__lock:
+            self.__tokens[_key(registry, scope, account)] = entry
+            if self.__file:
+                update_yaml(self.__file, self.__write, TOKEN_FILE_MODE)
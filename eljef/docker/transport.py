@@ -0,0 +1,231 @@
+# -*- coding: UTF-8 -*-
+# pylint: disable=R0902
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# transport.py : Docker Engine Transports
+"""ElJef Docker Engine Transports.
+
+This module holds functionality for connecting to local and remote engines, keeping one SSH connection open per
+remote host.
+"""
+import atexit
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from typing import List
+from urllib.parse import urlparse
+
+import docker
+
+from eljef.core.check import version_check
+
+from eljef.docker.exceptions import DockerError
+
+LOGGER = logging.getLogger(__name__)
+
+version_check(3, 6)
+
+CONNECT_TIMEOUT = 15
+KEEPALIVE_INTERVAL = 15
+KEEPALIVE_COUNT = 3
+REMOTE_SOCKET = '/var/run/docker.sock'
+SSH_COMMAND = 'ssh'
+
+_SSH_SCHEME = 'ssh://'
+
+_TUNNELS = dict()
+_TUNNELS_LOCK = threading.Lock()
+
+
+class SshTunnel(object):
+    """Persistent SSH tunnel to the engine socket on a remote host
+
+    One SSH connection is kept open, and the remote engine socket is forwarded to a local socket through it. Every
+    engine connection made to the local socket is a channel on that SSH connection, so the SSH handshake is paid
+    once per host rather than once per connection. SSH keepalives detect dead connections, and the connection is
+    opened again when it drops.
+
+    Args:
+        url: Remote host. (ie: ssh://user@host:22)
+
+    Keyword Args:
+        remote_socket (str): Path to the engine socket on the remote host.
+        ssh_options (list): Extra options for ssh. (ie: ['-i', '/path/to/key'])
+    """
+    def __init__(self, url: str, **kwargs) -> None:
+        parsed = urlparse(url)
+        if parsed.scheme != 'ssh' or not parsed.hostname:
+            raise DockerError("Not an ssh:// engine URL: {0!s}".format(url))
+
+        self.__dir = tempfile.mkdtemp(prefix='eljef-docker-ssh-')
+        self.__host = "{0!s}@{1!s}".format(parsed.username, parsed.hostname) if parsed.username else parsed.hostname
+        self.__lock = threading.Lock()
+        self.__port = parsed.port
+        self.__proc = None
+        self.__remote = kwargs.get('remote_socket', REMOTE_SOCKET)
+        self.__socket = os.path.join(self.__dir, 'docker.sock')
+        self.__ssh_options = list(kwargs.get('ssh_options', None) or [])
+        self.__stop = threading.Event()
+        self.__url = url
+
+    def __command(self) -> List[str]:
+        command = [SSH_COMMAND, '-N', '-T',
+                   '-o', 'BatchMode=yes',
+                   '-o', 'ExitOnForwardFailure=yes',
+                   '-o', "ServerAliveInterval={0!s}".format(KEEPALIVE_INTERVAL),
+                   '-o', "ServerAliveCountMax={0!s}".format(KEEPALIVE_COUNT),
+                   '-o', "ConnectTimeout={0!s}".format(CONNECT_TIMEOUT),
+                   '-L', "{0!s}:{1!s}".format(self.__socket, self.__remote)]
+        if self.__port:
+            command += ['-p', str(self.__port)]
+
+        return command + self.__ssh_options + [self.__host]
+
+    def __start(self) -> None:
+        if os.path.exists(self.__socket):
+            os.remove(self.__socket)
+
+        LOGGER.debug("Opening SSH connection to %s", self.__url)
+        log_path = os.path.join(self.__dir, 'ssh.log')
+        with open(log_path, 'wb') as log_file:
+            # the connection outlives this call, close() terminates it
+            self.__proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                self.__command(), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=log_file)
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while not os.path.exists(self.__socket):
+            if self.__proc.poll() is not None:
+                with open(log_path, 'rb') as log_file:
+                    err_s = log_file.read().decode('utf-8', 'replace').strip()
+                raise DockerError("SSH connection to {0!s} failed: {1!s}".format(self.__url, err_s))
+            if time.monotonic() > deadline:
+                self.__proc.kill()
+                raise DockerError("SSH connection to {0!s} timed out".format(self.__url))
+            time.sleep(0.05)
+        LOGGER.debug("Forwarding %s on %s to %s", self.__remote, self.__url, self.__socket)
+
+    def __watch(self) -> None:
+        while not self.__stop.wait(KEEPALIVE_INTERVAL):
+            try:
+                self.ensure()
+            except DockerError as err:
+                LOGGER.warning(err.message)
+
+    @property
+    def base_url(self) -> str:
+        """URL to give DockerClient to reach the remote engine through this tunnel."""
+        return "unix://{0!s}".format(self.__socket)
+
+    def alive(self) -> bool:
+        """Returns True if the SSH connection is open."""
+        return self.__proc is not None and self.__proc.poll() is None
+
+    def close(self) -> None:
+        """Closes the SSH connection and removes the local socket."""
+        self.__stop.set()
+        with self.__lock:
+            if self.alive():
+                LOGGER.debug("Closing SSH connection to %s", self.__url)
+                self.__proc.terminate()
+                try:
+                    self.__proc.wait(CONNECT_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    self.__proc.kill()
+            shutil.rmtree(self.__dir, ignore_errors=True)
+
+    def ensure(self) -> None:
+        """Opens the SSH connection if it is not open.
+
+        Raises:
+            DockerError: If the connection cannot be opened.
+        """
+        with self.__lock:
+            if self.__stop.is_set() or self.alive():
+                return
+            if self.__proc is not None:
+                LOGGER.warning("SSH connection to %s dropped, reconnecting", self.__url)
+            self.__start()
+
+    def open(self) -> None:
+        """Opens the SSH connection and starts watching it, reconnecting when it drops.
+
+        Raises:
+            DockerError: If the connection cannot be opened.
+        """
+        self.ensure()
+        threading.Thread(target=self.__watch, daemon=True).start()
+
+
+def close_tunnels() -> None:
+    """Closes every SSH tunnel opened by ``ssh_tunnel``."""
+    with _TUNNELS_LOCK:
+        for tunnel in _TUNNELS.values():
+            tunnel.close()
+        _TUNNELS.clear()
+
+
+def ssh_tunnel(url: str) -> SshTunnel:
+    """Returns the open SSH tunnel to a host, opening it if needed.
+
+    Tunnels are shared by every client in the process and stay open until it exits.
+
+    Args:
+        url: Remote host. (ie: ssh://user@host:22)
+
+    Returns:
+        An open SshTunnel class.
+    """
+    with _TUNNELS_LOCK:
+        if url not in _TUNNELS:
+            tunnel = SshTunnel(url)
+            try:
+                tunnel.open()
+            except DockerError:
+                tunnel.close()
+                raise
+            _TUNNELS[url] = tunnel
+
+        return _TUNNELS[url]
+
+
+def engine_client(base_url: str = None, **kwargs) -> docker.DockerClient:
+    """Creates a client for an engine.
+
+    ``ssh://`` engines are reached through a shared SshTunnel. The client keeps a pool of connections to the engine,
+    so concurrent calls do not wait for each other.
+
+    Args:
+        base_url: URL of the engine. The engine configured in the environment (DOCKER_HOST) is used if not set.
+
+    Keyword Args:
+        Passed to DockerClient. (ie: timeout)
+
+    Returns:
+        Initialized DockerClient class.
+    """
+    if not base_url and not os.environ.get('DOCKER_HOST', '').startswith(_SSH_SCHEME):
+        return docker.from_env(**kwargs)
+    base_url = base_url or os.environ['DOCKER_HOST']
+    if base_url.startswith(_SSH_SCHEME):
+        base_url = ssh_tunnel(base_url).base_url
+
+    return docker.DockerClient(base_url=base_url, **kwargs)
+
+
+atexit.register(close_tunnels)
@@ -18,7 +18,7 @@
             'eljef-docker = eljef.docker.cli.__main__:main'
         ]
     },
-    install_requires=['eljef_core>=0.0.11', 'docker>=3.1'],
+    install_requires=['eljef_core>=0.0.11', 'docker>=5.0.3', 'requests'],
     license='LGPLv2.1',
     name='eljef_docker',
     packages=['eljef.docker', 'eljef.docker.cli'],
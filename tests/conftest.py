@@ -0,0 +1,45 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# conftest.py : Shared test fixtures
+"""Shared test fixtures"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_engine import FakeEngine  # noqa: E402  pylint: disable=wrong-import-position
+
+from eljef.docker.stats import API_STATS  # noqa: E402  pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def engine():
+    """Fake engine, closed after the test"""
+    fake = FakeEngine()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def config(tmp_path, engine, monkeypatch):
+    """Configuration directory for eljef-docker, with DOCKER_HOST pointing at the fake engine"""
+    monkeypatch.setenv('DOCKER_HOST', engine.url)
+    monkeypatch.delenv('DOCKER_TLS_VERIFY', raising=False)
+    monkeypatch.setattr('eljef.docker.cli.__group__.CONFIG_PATH', str(tmp_path))
+    API_STATS.reset()
+    return str(tmp_path)
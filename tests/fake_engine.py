@@ -0,0 +1,486 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# fake_engine.py : Fake Docker Engine
+"""Fake Docker engine for tests.
+
+Serves the part of the engine API used by eljef.docker from memory, over HTTP on localhost. Images are saved as
+OCI layout archives, with one blob per layer named after its diff ID, and loading an archive fails if it leaves out
+a layer the engine does not already hold.
+"""
+import hashlib
+import http.server
+import io
+import itertools
+import json
+import re
+import tarfile
+import threading
+
+from urllib.parse import parse_qs
+from urllib.parse import unquote
+from urllib.parse import urlparse
+
+import docker
+
+API_VERSION = '1.41'
+
+_COUNTER = itertools.count(1)
+
+
+def _digest(data: str) -> str:
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def tagged(image_ref: str) -> str:
+    """Returns an image reference with its tag."""
+    if '@' in image_ref or ':' in image_ref.rsplit('/', 1)[-1]:
+        return image_ref
+    return image_ref + ':latest'
+
+
+class FakeEngine(object):
+    """In-memory Docker engine served over HTTP
+
+    Attributes:
+        containers: Containers by ID.
+        images: Images by ID.
+        pull_errors: Error to fail pulls of matching repositories with, after they started, keyed by a prefix of
+                     the repository. (ie: 127.0.0.1:5000/)
+        pulls: Image references pulled, in order.
+        requests: (method, path) of every request, in order.
+    """
+    def __init__(self) -> None:
+        self.containers = dict()
+        self.images = dict()
+        self.layers = dict()
+        self.lock = threading.RLock()
+        self.pull_errors = dict()
+        self.pulls = []
+        self.requests = []
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        """URL to reach the engine on. (ie: tcp://127.0.0.1:1234)"""
+        return "tcp://127.0.0.1:{0!s}".format(self.server.server_address[1])
+
+    def client(self) -> docker.DockerClient:
+        """Returns a client connected to this engine."""
+        return docker.DockerClient(base_url=self.url, version=API_VERSION)
+
+    def close(self) -> None:
+        """Stops serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_image(self, image_ref: str, layers: list = None, layer_size: int = 1024, digests: bool = True) -> str:
+        """Adds an image, as if it had been pulled.
+
+        Args:
+            image_ref: Image reference to tag the image with.
+            layers: Layer names. Equal names are the same layer. Defaults to one layer unique to this image.
+            layer_size: Size of each layer in bytes.
+            digests: Give the image a RepoDigest, as images pulled from a registry have.
+
+        Returns:
+            ID of the image.
+        """
+        with self.lock:
+            diff_ids = []
+            for layer in layers or ["{0!s}-{1!s}".format(image_ref, next(_COUNTER))]:
+                diff_id = 'sha256:' + _digest(layer)
+                self.layers.setdefault(diff_id, layer_size)
+                diff_ids.append(diff_id)
+            image_id = 'sha256:' + _digest("{0!s}{1!s}".format(diff_ids, next(_COUNTER)))
+            self.untag(image_ref)
+            repo = tagged(image_ref).rsplit(':', 1)[0]
+            self.images[image_id] = {
+                'Id': image_id,
+                'Created': next(_COUNTER),
+                'RepoTags': [tagged(image_ref)],
+                'RepoDigests': ["{0!s}@sha256:{1!s}".format(repo, _digest(image_id))] if digests else [],
+                'RootFS': {'Type': 'layers', 'Layers': diff_ids},
+                'Size': layer_size * len(diff_ids),
+                'Config': {},
+            }
+
+            return image_id
+
+    def untag(self, image_ref: str) -> None:
+        """Removes a tag from the image holding it, leaving the image untagged if it was its last tag."""
+        with self.lock:
+            for image in self.images.values():
+                if tagged(image_ref) in image['RepoTags']:
+                    image['RepoTags'].remove(tagged(image_ref))
+
+    def find_image(self, name: str) -> dict:
+        """Returns the image with an ID, ID prefix, or tag, or None."""
+        name = unquote(name)
+        with self.lock:
+            for image_id, image in self.images.items():
+                if name in (image_id, image_id[7:]) or (len(name) >= 12 and image_id[7:].startswith(name)):
+                    return image
+            for image in self.images.values():
+                if tagged(name) in image['RepoTags']:
+                    return image
+
+        return None
+
+    def find_container(self, name: str) -> dict:
+        """Returns the container with an ID or name, or None."""
+        with self.lock:
+            for container_id, container in self.containers.items():
+                if name in (container_id, container['Name'][1:]) or container_id.startswith(name):
+                    return container
+
+        return None
+
+    def count(self, method: str = None, pattern: str = '') -> int:
+        """Returns the number of requests made with ``method`` to paths matching ``pattern``."""
+        return len([i for i in self.requests if (not method or i[0] == method) and re.search(pattern, i[1])])
+
+    def save(self, image: dict) -> bytes:
+        """Returns an image as an OCI layout archive, as docker save writes it on Docker 25 and later."""
+        out = io.BytesIO()
+        with tarfile.open(fileobj=out, mode='w') as tar:
+            manifest = [{'Config': "blobs/sha256/{0!s}".format(image['Id'][7:]), 'RepoTags': image['RepoTags'],
+                         'Layers': ["blobs/sha256/{0!s}".format(i[7:]) for i in image['RootFS']['Layers']]}]
+            files = [('manifest.json', json.dumps(manifest).encode('utf-8')),
+                     (manifest[0]['Config'], json.dumps({'rootfs': image['RootFS']}).encode('utf-8'))]
+            files += [("blobs/sha256/{0!s}".format(i[7:]), b'l' * self.layers[i]) for i in image['RootFS']['Layers']]
+            for name, data in files:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+        return out.getvalue()
+
+    def load(self, data: bytes) -> str:
+        """Loads an archive written by ``save``. Leaving out blobs of layers the engine already holds is allowed.
+
+        Returns:
+            Error message, or an empty string if the archive was loaded.
+        """
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r') as tar:
+            names = set(tar.getnames())
+            manifest = json.loads(tar.extractfile('manifest.json').read().decode('utf-8'))[0]
+            config = json.loads(tar.extractfile(manifest['Config']).read().decode('utf-8'))
+            sizes = {i.name: i.size for i in tar.getmembers()}
+        with self.lock:
+            for layer in manifest['Layers']:
+                diff_id = 'sha256:' + layer.rsplit('/', 1)[-1]
+                if layer not in names and diff_id not in self.layers:
+                    return "layer {0!s} missing from archive".format(diff_id)
+                self.layers.setdefault(diff_id, sizes.get(layer, 0))
+            image_id = 'sha256:' + manifest['Config'].rsplit('/', 1)[-1]
+            for tag in manifest['RepoTags']:
+                self.untag(tag)
+            self.images[image_id] = {'Id': image_id, 'Created': next(_COUNTER), 'RepoTags': manifest['RepoTags'],
+                                     'RepoDigests': [], 'RootFS': config['rootfs'], 'Config': {},
+                                     'Size': sum(self.layers[i] for i in config['rootfs']['Layers'])}
+
+        return ''
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Request handler routing engine API requests to the engine it is made for"""
+    engine = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if not size:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _send(self, status: int, data=None, raw: bytes = None, content_type: str = 'application/json') -> None:
+        body = raw if raw is not None else (json.dumps(data).encode('utf-8') if data is not None else b'')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, lines: list) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for line in lines:
+                data = (json.dumps(line) + '\r\n').encode('utf-8')
+                self.wfile.write("{0:x}\r\n".format(len(data)).encode('utf-8') + data + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # clients stop reading streams they were cancelled during
+            self.close_connection = True
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, {'message': message})
+
+    def _dispatch(self, method: str) -> None:
+        url = urlparse(self.path)
+        path = re.sub(r'^/v\d+\.\d+', '', url.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self._body() if method in {'POST', 'PUT'} else b''
+        with self.engine.lock:
+            self.engine.requests.append((method, path))
+        for route_method, pattern, func in _ROUTES:
+            match = re.match(pattern + '$', path)
+            if route_method == method and match:
+                return func(self, self.engine, query, body, *match.groups())
+
+        return self._error(404, "page not found: {0!s} {1!s}".format(method, path))
+
+    def do_DELETE(self) -> None:  # pylint: disable=invalid-name
+        """Handles DELETE requests"""
+        self._dispatch('DELETE')
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Handles GET requests"""
+        self._dispatch('GET')
+
+    def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+        """Handles HEAD requests"""
+        self._dispatch('HEAD')
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Handles POST requests"""
+        self._dispatch('POST')
+
+
+def _handler(engine: FakeEngine) -> type:
+    return type('Handler', (_Handler,), {'engine': engine})
+
+
+def _version(handler, engine, query, body) -> None:
+    del engine, query, body
+    handler._send(200, {'ApiVersion': API_VERSION, 'Arch': 'amd64', 'Os': 'linux', 'Version': '20.10.0'})
+
+
+def _ping(handler, engine, query, body) -> None:
+    del engine, query, body
+    handler._send(200, raw=b'OK', content_type='text/plain')
+
+
+def _events(handler, engine, query, body) -> None:
+    del engine, query, body
+    handler._send(200, raw=b'')
+
+
+def _container_list(handler, engine, query, body) -> None:
+    del body
+    with engine.lock:
+        ret = [{'Id': k, 'Names': [v['Name']], 'Image': v['Config']['Image'], 'State': v['State']['Status']}
+               for k, v in engine.containers.items() if query.get('all') in {'1', 'true'} or v['State']['Running']]
+    handler._send(200, ret)
+
+
+def _container_create(handler, engine, query, body) -> None:
+    config = json.loads(body.decode('utf-8') or '{}')
+    name = query.get('name', '')
+    image = engine.find_image(config.get('Image', ''))
+    if not image:
+        return handler._error(404, "No such image: {0!s}".format(config.get('Image')))
+    with engine.lock:
+        if name and engine.find_container(name):
+            return handler._error(409, "Conflict. The container name \"/{0!s}\" is already in use".format(name))
+        container_id = _digest(name + str(next(_COUNTER)))
+        engine.containers[container_id] = {
+            'Id': container_id, 'Name': '/' + name, 'Image': image['Id'],
+            'Config': dict(config, Image=config.get('Image')), 'HostConfig': config.get('HostConfig') or {},
+            'State': {'Status': 'created', 'Running': False, 'ExitCode': 0},
+        }
+
+    return handler._send(201, {'Id': container_id, 'Warnings': []})
+
+
+def _container_inspect(handler, engine, query, body, name) -> None:
+    del query, body
+    container = engine.find_container(name)
+    if not container:
+        return handler._error(404, "No such container: {0!s}".format(name))
+
+    return handler._send(200, container)
+
+
+def _container_state(status: str, running: bool):
+    def _func(handler, engine, query, body, name) -> None:
+        del query, body
+        container = engine.find_container(name)
+        if not container:
+            return handler._error(404, "No such container: {0!s}".format(name))
+        with engine.lock:
+            container['State'] = {'Status': status, 'Running': running, 'ExitCode': 0}
+
+        return handler._send(204)
+
+    return _func
+
+
+def _container_update(handler, engine, query, body, name) -> None:
+    del query
+    container = engine.find_container(name)
+    if not container:
+        return handler._error(404, "No such container: {0!s}".format(name))
+    with engine.lock:
+        container['HostConfig'].update(json.loads(body.decode('utf-8') or '{}'))
+
+    return handler._send(200, {'Warnings': []})
+
+
+def _container_remove(handler, engine, query, body, name) -> None:
+    del body
+    container = engine.find_container(name)
+    if not container:
+        return handler._error(404, "No such container: {0!s}".format(name))
+    if container['State']['Running'] and query.get('force') not in {'1', 'true'}:
+        return handler._error(409, "You cannot remove a running container")
+    with engine.lock:
+        del engine.containers[container['Id']]
+
+    return handler._send(204)
+
+
+def _image_list(handler, engine, query, body) -> None:
+    del body
+    filters = json.loads(query.get('filters', '{}'))
+    references = list(filters.get('reference', {})) + ([query['filter']] if query.get('filter') else [])
+    with engine.lock:
+        ret = []
+        for image in engine.images.values():
+            repos = {i.rsplit(':', 1)[0] for i in image['RepoTags']}
+            if references and not any(i in repos or i in image['RepoTags'] for i in references):
+                continue
+            ret.append(dict(image, Containers=-1, SharedSize=-1))
+    handler._send(200, ret)
+
+
+def _image_inspect(handler, engine, query, body, name) -> None:
+    del query, body
+    image = engine.find_image(name)
+    if not image:
+        return handler._error(404, "No such image: {0!s}".format(unquote(name)))
+
+    return handler._send(200, image)
+
+
+def _image_pull(handler, engine, query, body) -> None:
+    del body
+    image_ref = "{0!s}:{1!s}".format(query.get('fromImage'), query.get('tag') or 'latest')
+    with engine.lock:
+        engine.pulls.append(image_ref)
+    lines = [{'status': "Pulling from {0!s}".format(query.get('fromImage'))},
+             {'status': 'Downloading', 'id': 'layer', 'progressDetail': {'current': 512, 'total': 1024}}]
+    errors = [v for k, v in engine.pull_errors.items() if image_ref.startswith(k)]
+    if errors:
+        lines.append({'error': errors[0], 'errorDetail': {'message': errors[0]}})
+    else:
+        engine.add_image(image_ref)
+        lines += [{'status': 'Download complete', 'id': 'layer'},
+                  {'status': "Status: Downloaded newer image for {0!s}".format(image_ref)}]
+    handler._stream(lines)
+
+
+def _image_remove(handler, engine, query, body, name) -> None:
+    del query, body
+    name = unquote(name)
+    image = engine.find_image(name)
+    if not image:
+        return handler._error(404, "No such image: {0!s}".format(name))
+    with engine.lock:
+        if tagged(name) in image['RepoTags'] and len(image['RepoTags']) > 1:
+            image['RepoTags'].remove(tagged(name))
+        else:
+            del engine.images[image['Id']]
+
+    return handler._send(200, [{'Deleted': image['Id']}])
+
+
+def _image_tag(handler, engine, query, body, name) -> None:
+    del body
+    image = engine.find_image(name)
+    if not image:
+        return handler._error(404, "No such image: {0!s}".format(unquote(name)))
+    image_ref = "{0!s}:{1!s}".format(query['repo'], query.get('tag') or 'latest')
+    with engine.lock:
+        engine.untag(image_ref)
+        image['RepoTags'].append(image_ref)
+
+    return handler._send(201)
+
+
+def _image_save(handler, engine, query, body, name) -> None:
+    del query, body
+    image = engine.find_image(name)
+    if not image:
+        return handler._error(404, "No such image: {0!s}".format(unquote(name)))
+
+    return handler._send(200, raw=engine.save(image), content_type='application/x-tar')
+
+
+def _image_load(handler, engine, query, body) -> None:
+    del query
+    error = engine.load(body)
+    line = {'error': error} if error else {'stream': 'Loaded image\n'}
+    handler._stream([line])
+
+
+def _system_df(handler, engine, query, body) -> None:
+    del query, body
+    with engine.lock:
+        used = {i['Image'] for i in engine.containers.values()}
+        images = [dict(i, Containers=1 if i['Id'] in used else 0, SharedSize=0) for i in engine.images.values()]
+        layers_size = sum(engine.layers[j] for i in engine.images.values() for j in set(i['RootFS']['Layers']))
+    handler._send(200, {'Images': images, 'LayersSize': layers_size, 'Containers': [], 'Volumes': []})
+
+
+_ID = r'/([^/]+)'
+_ROUTES = (
+    ('GET', r'/version', _version),
+    ('GET', r'/_ping', _ping),
+    ('HEAD', r'/_ping', _ping),
+    ('GET', r'/events', _events),
+    ('GET', r'/containers/json', _container_list),
+    ('POST', r'/containers/create', _container_create),
+    ('GET', r'/containers' + _ID + r'/json', _container_inspect),
+    ('POST', r'/containers' + _ID + r'/start', _container_state('running', True)),
+    ('POST', r'/containers' + _ID + r'/restart', _container_state('running', True)),
+    ('POST', r'/containers' + _ID + r'/stop', _container_state('exited', False)),
+    ('POST', r'/containers' + _ID + r'/kill', _container_state('exited', False)),
+    ('POST', r'/containers' + _ID + r'/update', _container_update),
+    ('DELETE', r'/containers' + _ID, _container_remove),
+    ('GET', r'/images/json', _image_list),
+    ('POST', r'/images/create', _image_pull),
+    ('POST', r'/images/load', _image_load),
+    ('GET', r'/images/(.+)/json', _image_inspect),
+    ('GET', r'/images/(.+)/get', _image_save),
+    ('POST', r'/images/(.+)/tag', _image_tag),
+    ('DELETE', r'/images/(.+)', _image_remove),
+    ('GET', r'/system/df', _system_df),
+)
@@ -0,0 +1,175 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# fake_registry.py : Fake Docker Registry
+"""Fake Docker registry for tests.
+
+Serves image manifests and configs from memory over plain HTTP on localhost, as a registry v2 API would. With
+``token_auth`` set, requests need a bearer token from the token server the registry serves itself.
+"""
+import hashlib
+import http.server
+import itertools
+import json
+import re
+import threading
+import time
+
+from urllib.parse import urlparse
+
+MEDIA_MANIFEST_V2 = 'application/vnd.docker.distribution.manifest.v2+json'
+
+_COUNTER = itertools.count(1)
+
+
+def _digest(data: bytes) -> str:
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+class FakeRegistry(object):
+    """In-memory registry served over HTTP
+
+    Args:
+        token_auth: Require bearer tokens from the registries own token server.
+        expires_in: Lifetime of issued tokens in seconds, as sent to clients.
+        delay: Seconds to wait before answering each request.
+
+    Attributes:
+        tokens_issued: Number of tokens issued.
+        requests: (method, path) of every request, in order.
+    """
+    def __init__(self, token_auth: bool = False, expires_in: int = 300, delay: float = 0) -> None:
+        self.blobs = dict()
+        self.delay = delay
+        self.expires_in = expires_in
+        self.lock = threading.Lock()
+        self.manifests = dict()
+        self.requests = []
+        self.token_auth = token_auth
+        self.tokens = set()
+        self.tokens_issued = 0
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def host(self) -> str:
+        """Host and port the registry is reached on. (ie: 127.0.0.1:1234)"""
+        return "127.0.0.1:{0!s}".format(self.server.server_address[1])
+
+    def close(self) -> None:
+        """Stops serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_image(self, repository: str, tag: str = 'latest', layers: list = None) -> str:
+        """Adds an image.
+
+        Args:
+            repository: Repository to add the image to. (ie: library/app)
+            tag: Tag of the image.
+            layers: Layer names, base layer first. Equal names are the same layer.
+
+        Returns:
+            Digest of the image manifest.
+        """
+        layers = layers or ["{0!s}-{1!s}".format(repository, next(_COUNTER))]
+        diff_ids = [_digest(i.encode('utf-8')) for i in layers]
+        config = json.dumps({'rootfs': {'type': 'layers', 'diff_ids': diff_ids}}).encode('utf-8')
+        manifest = json.dumps({
+            'schemaVersion': 2,
+            'mediaType': MEDIA_MANIFEST_V2,
+            'config': {'digest': _digest(config), 'size': len(config)},
+            'layers': [{'digest': _digest(i.encode('utf-8') + b'.gz'), 'size': 1024} for i in layers],
+        }).encode('utf-8')
+        with self.lock:
+            self.blobs[_digest(config)] = config
+            self.manifests[(repository, tag)] = manifest
+            self.manifests[(repository, _digest(manifest))] = manifest
+
+        return _digest(manifest)
+
+    def authorized(self, header: str) -> bool:
+        """Returns if a request with the Authorization ``header`` is allowed."""
+        if not self.token_auth:
+            return True
+        with self.lock:
+            return header.startswith('Bearer ') and header[7:] in self.tokens
+
+    def issue(self) -> dict:
+        """Issues a new token, as the token server does."""
+        with self.lock:
+            self.tokens_issued += 1
+            token = "token-{0!s}".format(next(_COUNTER))
+            self.tokens.add(token)
+
+        return {'token': token, 'expires_in': self.expires_in}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Request handler for the registry it is made for"""
+    registry = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes = b'', headers: dict = None, head: bool = False) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _dispatch(self, head: bool = False) -> None:
+        url = urlparse(self.path)
+        with self.registry.lock:
+            self.registry.requests.append((self.command, url.path))
+        time.sleep(self.registry.delay)
+
+        if url.path == '/token':
+            return self._send(200, json.dumps(self.registry.issue()).encode('utf-8'))
+        if not self.registry.authorized(self.headers.get('Authorization', '')):
+            challenge = 'Bearer realm="http://{0!s}/token",service="fake"'.format(self.registry.host)
+            return self._send(401, b'{"errors": []}', {'WWW-Authenticate': challenge}, head)
+        if url.path == '/v2/':
+            return self._send(200, b'{}', head=head)
+
+        match = re.match(r'^/v2/(.+)/(manifests|blobs)/([^/]+)$', url.path)
+        with self.registry.lock:
+            if match and match.group(2) == 'manifests':
+                body = self.registry.manifests.get((match.group(1), match.group(3)))
+                headers = {'Content-Type': MEDIA_MANIFEST_V2, 'Docker-Content-Digest': _digest(body or b'')}
+            else:
+                body = self.registry.blobs.get(match.group(3)) if match else None
+                headers = {'Content-Type': 'application/octet-stream'}
+        if body is None:
+            return self._send(404, b'{"errors": []}', head=head)
+
+        return self._send(200, body, headers, head)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Handles GET requests"""
+        self._dispatch()
+
+    def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+        """Handles HEAD requests"""
+        self._dispatch(True)
+
+
+def _handler(registry: FakeRegistry) -> type:
+    return type('Handler', (_Handler,), {'registry': registry})
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# fake_ssh.py : Fake ssh command
+"""Fake ssh command for tests.
+
+Takes the arguments SshTunnel gives ssh, and forwards the local socket given with -L to the TCP address in
+FAKE_SSH_TARGET instead of a remote socket. Each run is logged to FAKE_SSH_LOG as a JSON line holding its pid and
+arguments. With FAKE_SSH_ERROR set, it writes that to stderr and exits as ssh does when it cannot connect.
+"""
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+
+
+def _pipe(source: socket.socket, target: socket.socket) -> None:
+    try:
+        data = source.recv(65536)
+        while data:
+            target.sendall(data)
+            data = source.recv(65536)
+    except OSError:
+        pass
+    finally:
+        for sock in (source, target):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _forward(conn: socket.socket, target: tuple) -> None:
+    upstream = socket.create_connection(target)
+    threading.Thread(target=_pipe, args=(conn, upstream), daemon=True).start()
+    _pipe(upstream, conn)
+
+
+def main() -> None:
+    """Main function"""
+    args = sys.argv[1:]
+    with open(os.environ['FAKE_SSH_LOG'], 'a', encoding='utf-8') as log_file:
+        log_file.write(json.dumps({'pid': os.getpid(), 'argv': args}) + '\n')
+    if os.environ.get('FAKE_SSH_ERROR'):
+        sys.stderr.write(os.environ['FAKE_SSH_ERROR'] + '\n')
+        raise SystemExit(255)
+
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    host, port = os.environ['FAKE_SSH_TARGET'].rsplit(':', 1)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(args[args.index('-L') + 1].split(':', 1)[0])
+    server.listen(16)
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=_forward, args=(conn, (host, int(port))), daemon=True).start()
+
+
+if __name__ == '__main__':
+    main()
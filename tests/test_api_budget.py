@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_api_budget.py : Engine API request budgets
+"""Engine API request budgets
+
+Each operation is run against a fake engine and must stay within an upper bound of engine API requests, so changes
+that add requests per container show up here.
+"""
+import os
+
+import pytest
+import yaml
+
+from eljef.docker.cli import __group__ as cli_group
+from eljef.docker.docker import Docker
+from eljef.docker.stats import API_STATS
+
+MEMBERS = ('db', 'app', 'web')
+
+
+def _define(config: str, name: str, **options) -> str:
+    definition = os.path.join(config, "{0!s}-definition.yaml".format(name))
+    with open(definition, 'w', encoding='utf-8') as file_o:
+        yaml.safe_dump(dict({'name': name, 'image': "127.0.0.1:9/{0!s}".format(name), 'group': 'stack'}, **options),
+                       file_o)
+
+    return Docker(config).containers.define(definition)
+
+
+@pytest.fixture
+def stack(config, engine):
+    """Group 'stack' with a master and two members, with their images present on the engine"""
+    Docker(config).groups.add('stack', {'master': MEMBERS[0]})
+    for name in MEMBERS:
+        engine.add_image("127.0.0.1:9/{0!s}".format(name))
+        _define(config, name)
+    API_STATS.reset()
+    engine.requests.clear()
+
+    return config
+
+
+def _assert_budget(budget: dict) -> None:
+    assert not API_STATS.over_budget(budget), API_STATS.calls()
+
+
+def test_define(config, engine):
+    """define reads and writes files only"""
+    Docker(config).groups.add('stack')
+    API_STATS.reset()
+    engine.requests.clear()
+    _define(config, 'db')
+    _assert_budget({'DockerContainers.define': 0})
+
+
+def test_get(stack):
+    """get builds container and image classes without asking the engine"""
+    client = Docker(stack)
+    API_STATS.reset()
+    for name in MEMBERS:
+        client.containers.get(name)
+    _assert_budget({'DockerContainers.get': 0})
+
+
+def test_group_start(stack, engine):
+    """starting a group creates and starts each member, then waits for the master to become ready"""
+    cli_group.group_start('stack')
+    assert engine.count('POST', r'/start$') == len(MEMBERS)
+    _assert_budget({'group_start': 2 + 5 * len(MEMBERS)})
+
+
+def test_group_stop(stack, engine):
+    """stopping a group inspects and stops each member"""
+    cli_group.group_start('stack')
+    API_STATS.reset()
+    cli_group.group_stop('stack')
+    assert engine.count('POST', r'/stop$') == len(MEMBERS)
+    _assert_budget({'group_stop': 2 * len(MEMBERS)})
+
+
+def test_group_update(stack, engine):
+    """updating a group pulls each image once, then recreates each member"""
+    cli_group.group_start('stack')
+    API_STATS.reset()
+    engine.requests.clear()
+    cli_group.group_update('stack')
+    assert engine.count('POST', r'/images/create$') == len(MEMBERS)
+    assert engine.count('POST', r'/start$') == len(MEMBERS)
+    _assert_budget({'group_update': 2 + 12 * len(MEMBERS)})
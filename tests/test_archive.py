@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_archive.py : Pulling with an image archive
+"""Pulling with an image archive
+
+The archive is a fallback for hosts that cannot reach the registry, so a reachable registry always wins and an
+archived image the engine already holds is not loaded again.
+"""
+import pytest
+
+from eljef.docker.archive import DockerImageArchive
+from eljef.docker.image import DockerImage
+
+UPSTREAM = '127.0.0.1:9/team/app:latest'
+
+
+@pytest.fixture
+def archive(engine, tmp_path):
+    """Archive holding UPSTREAM, saved from the engine"""
+    engine.add_image(UPSTREAM)
+    ret = DockerImageArchive(engine.client(), str(tmp_path / 'archive'))
+    ret.save(UPSTREAM)
+    engine.requests.clear()
+
+    return ret
+
+
+def test_registry_preferred(archive, engine):
+    """a newer image in the registry is pulled even though the archive holds the image"""
+    archived = engine.find_image(UPSTREAM)['Id']
+    DockerImage(engine.client(), UPSTREAM, archive=archive).pull()
+    assert engine.pulls == [UPSTREAM]
+    assert not engine.count('POST', r'/images/load$')
+    assert engine.find_image(UPSTREAM)['Id'] != archived
+
+
+def test_archive_when_pull_fails(archive, engine):
+    """the archived image is loaded when the registry cannot be pulled from"""
+    archived = engine.find_image(UPSTREAM)['Id']
+    engine.untag(UPSTREAM)
+    engine.pull_errors['127.0.0.1:9/'] = 'connection refused'
+    DockerImage(engine.client(), UPSTREAM, archive=archive).pull()
+    assert engine.count('POST', r'/images/load$') == 1
+    assert engine.find_image(UPSTREAM)['Id'] == archived
+
+
+def test_archived_image_present(archive, engine):
+    """the archive is not loaded again when the engine already holds the archived image"""
+    engine.pull_errors['127.0.0.1:9/'] = 'connection refused'
+    DockerImage(engine.client(), UPSTREAM, archive=archive).pull()
+    assert not engine.count('POST', r'/images/load$')
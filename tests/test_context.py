@@ -0,0 +1,90 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_context.py : Build contexts from directories and git sources
+"""Build contexts from directories and git sources
+
+Git sources are read with the git command. A stand-in git is used where git has to misbehave.
+"""
+import os
+import stat
+import subprocess
+import sys
+import threading
+
+from eljef.docker import context
+from eljef.docker.exceptions import DockerError
+
+_NOISY_GIT = '''#!{0!s}
+import sys
+if 'rev-parse' in sys.argv:
+    sys.exit(0)
+sys.stderr.write('warning: noisy\\n' * 20000)
+sys.exit(128)
+'''
+
+
+def _repository(path: str) -> str:
+    os.makedirs(path)
+    with open(os.path.join(path, 'Dockerfile'), 'w', encoding='utf-8') as file_o:
+        file_o.write('FROM scratch\n')
+    for args in (['init', '-q'], ['add', 'Dockerfile'],
+                 ['-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'init']):
+        subprocess.run(['git', '-C', path] + args, check=True)
+
+    return path
+
+
+def test_directory_with_separator(tmp_path):
+    """a plain directory whose name holds the git separator is not a git source"""
+    build_path = str(tmp_path / 'app#2')
+    os.makedirs(build_path)
+    with open(os.path.join(build_path, 'Dockerfile'), 'w', encoding='utf-8') as file_o:
+        file_o.write('FROM scratch\n')
+    assert context.git_source(build_path) is None
+    assert context.read_context_file(build_path, 'Dockerfile') == 'FROM scratch\n'
+
+
+def test_git_source(tmp_path):
+    """a git repository followed by the separator is a git source"""
+    repository = _repository(str(tmp_path / 'repo'))
+    assert context.git_source(repository + '#HEAD:sub/') == (repository, 'HEAD', 'sub')
+    assert context.git_source(str(tmp_path / 'plain') + '#HEAD') is None
+    assert context.read_context_file(repository + '#HEAD', 'Dockerfile') == 'FROM scratch\n'
+
+
+def test_git_stderr_does_not_block(tmp_path, monkeypatch):
+    """git writing more than a pipe buffer to stderr fails the build instead of hanging it"""
+    repository = _repository(str(tmp_path / 'repo'))
+    git = str(tmp_path / 'git')
+    with open(git, 'w', encoding='utf-8') as file_o:
+        file_o.write(_NOISY_GIT.format(sys.executable))
+    os.chmod(git, os.stat(git).st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(context, 'GIT_COMMAND', git)
+
+    errors = []
+
+    def _read():
+        try:
+            for _ in context.build_context(repository + '#HEAD'):
+                continue
+        except DockerError as err:
+            errors.append(err)
+
+    reader = threading.Thread(target=_read, daemon=True)
+    reader.start()
+    reader.join(20)
+    assert not reader.is_alive()
+    assert errors and 'warning: noisy' in errors[0].message
@@ -0,0 +1,93 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_deadline.py : Deadlines and cancellation
+"""Deadlines and cancellation
+
+Operations run in parallel must stop, and let the process exit, once their deadline passes or is cancelled by an
+interrupt, rather than when the slowest of them returns.
+"""
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from eljef.docker.cli import __main__ as cli_main
+from eljef.docker.deadline import deadline
+from eljef.docker.exceptions import DeadlineError
+from eljef.docker.image import DockerImage
+from eljef.docker.parallel import run_parallel
+
+UPSTREAM = '127.0.0.1:9/team/app:latest'
+
+_SLOW_BATCH = textwrap.dedent("""
+    import time
+    from eljef.docker.deadline import deadline
+    from eljef.docker.parallel import run_parallel
+    with deadline(1, 'batch'):
+        results = run_parallel(time.sleep, [5, 5, 5], 3)
+    assert all(i.error for i in results)
+""")
+
+
+@pytest.fixture
+def interrupt():
+    """Installs the CLI interrupt handler, restoring the previous handler after the test"""
+    previous = signal.signal(signal.SIGINT, cli_main._interrupt)  # pylint: disable=protected-access
+    yield lambda: os.kill(os.getpid(), signal.SIGINT)
+    signal.signal(signal.SIGINT, previous)
+
+
+def test_exit_after_deadline():
+    """operations still running when the deadline passes do not keep the process alive"""
+    started = time.monotonic()
+    subprocess.run([sys.executable, '-c', _SLOW_BATCH], check=True, env=os.environ.copy(), timeout=30)
+    assert time.monotonic() - started < 4
+
+
+def test_interrupt_cancels_deadline(interrupt):
+    """an interrupt cancels the active deadline, and waiting operations return with the cancellation"""
+    timer = threading.Timer(0.5, interrupt)
+    started = time.monotonic()
+    with deadline(60, 'batch') as active:
+        timer.start()
+        results = run_parallel(time.sleep, [5, 5], 2)
+    assert time.monotonic() - started < 3
+    assert active.expired()
+    assert all(isinstance(i.error, DeadlineError) for i in results)
+    assert 'cancelled' in results[0].error.message
+
+
+def test_interrupt_without_deadline(interrupt):
+    """an interrupt with no deadline active stops the process as usual"""
+    with pytest.raises(KeyboardInterrupt):
+        interrupt()
+        time.sleep(1)
+
+
+def test_pull_stops_on_cancel(engine):
+    """a cancelled pull is not retried from the next mirror or the upstream registry"""
+    image = DockerImage(engine.client(), UPSTREAM, mirrors=['http://127.0.0.1:1', 'http://127.0.0.1:2'])
+    engine.pull_errors['127.0.0.1:1'] = 'unexpected EOF'
+    with deadline(60, 'pull') as active:
+        active.cancel()
+        with pytest.raises(DeadlineError):
+            image.pull()
+    assert engine.pulls == ['127.0.0.1:1/team/app:latest']
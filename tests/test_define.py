@@ -0,0 +1,70 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_define.py : Container definitions and group membership
+"""Container definitions and group membership
+
+Definition files and groups.yaml are written separately, so a batch of definitions failing part way through must
+still leave both in agreement.
+"""
+import os
+
+import pytest
+import yaml
+
+from eljef.docker.docker import Docker
+from eljef.docker.exceptions import ConfigError
+
+
+def _definition(config: str, name: str, **options) -> str:
+    definition = os.path.join(config, "{0!s}-definition.yaml".format(name))
+    with open(definition, 'w', encoding='utf-8') as file_o:
+        yaml.safe_dump(dict({'name': name, 'image': "127.0.0.1:9/{0!s}".format(name), 'group': 'stack'}, **options),
+                       file_o)
+
+    return definition
+
+
+def _members(config: str) -> list:
+    with open(os.path.join(config, 'groups.yaml'), encoding='utf-8') as file_o:
+        return yaml.safe_load(file_o)['stack']['members']
+
+
+def test_batch_failure_keeps_files_in_agreement(config):
+    """a definition failing in a batch leaves the earlier definitions on file and in groups.yaml"""
+    Docker(config).groups.add('stack')
+    first, second = _definition(config, 'db'), _definition(config, 'app', ports='80:80')
+    client = Docker(config)
+    with pytest.raises(ConfigError):
+        with client.groups.batch():
+            client.containers.define(first)
+            client.containers.define(second)
+
+    assert os.path.isfile(os.path.join(config, 'containers', 'db.yaml'))
+    assert not os.path.isfile(os.path.join(config, 'containers', 'app.yaml'))
+    assert _members(config) == ['db']
+    assert sorted(Docker(config).containers.list()) == ['db']
+
+
+def test_batch_saves_groups_once(config):
+    """a batch of definitions is recorded in groups.yaml when it exits"""
+    Docker(config).groups.add('stack')
+    client = Docker(config)
+    with client.groups.batch():
+        for name in ('db', 'app'):
+            client.containers.define(_definition(config, name))
+        assert _members(config) == []
+
+    assert _members(config) == ['db', 'app']
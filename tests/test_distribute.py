@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_distribute.py : Image distribution
+"""Image distribution
+
+Images are distributed from a fake seed engine to several fake target engines.
+"""
+import collections
+
+import pytest
+
+from fake_engine import FakeEngine
+
+from eljef.docker.distribute import SEED
+from eljef.docker.distribute import DockerImageDistributor
+
+IMAGE = 'registry.local/team/app:2'
+LAYER_SIZE = 65536
+
+
+@pytest.fixture
+def targets():
+    """Factory for target engines, closed after the test"""
+    made = []
+
+    def _make(count: int) -> list:
+        made.extend(FakeEngine() for _ in range(count))
+        return made[-count:]
+
+    yield _make
+    for engine in made:
+        engine.close()
+
+
+def test_fan_out(engine, targets):
+    """every engine holding the image sends it on once per round, so seven targets take three rounds"""
+    image_id = engine.add_image(IMAGE, ['base', 'app'], LAYER_SIZE)
+    engines = {i.url: i for i in targets(7)}
+    report = DockerImageDistributor(engine.client(), list(engines)).distribute(IMAGE)
+
+    assert not report.failed
+    assert report.rounds == 3
+    assert len(report.hops) == 7
+    assert all(i.find_image(IMAGE)['Id'] == image_id for i in engines.values())
+    sources = collections.Counter(i.source for i in report.hops)
+    assert sources[SEED] == 3
+    assert engine.count('GET', r'/get$') == sources[SEED]
+    assert all(i.count('GET', r'/get$') == sources[k] for k, i in engines.items())
+    assert all(i.count('POST', r'/images/load$') == 1 for i in engines.values())
+
+
+def test_targets_holding_image_skipped(engine, targets):
+    """targets that already hold the image are not sent it, and send it on to others"""
+    engine.add_image(IMAGE, ['base', 'app'], LAYER_SIZE)
+    held, empty = targets(2)
+    held.load(engine.save(engine.find_image(IMAGE)))
+    report = DockerImageDistributor(engine.client(), [held.url, empty.url]).distribute(IMAGE)
+
+    assert report.skipped == [held.url]
+    assert report.rounds == 1
+    assert {(i.source, i.target) for i in report.hops} in ({(SEED, empty.url)}, {(held.url, empty.url)})
+    assert not held.count('POST', r'/images/load$')
+    assert empty.find_image(IMAGE)
+
+
+def test_held_layers_left_out(engine, targets):
+    """layers a target holds from an earlier version of the image are not sent"""
+    engine.add_image(IMAGE, ['base', 'runtime', 'app-2'], LAYER_SIZE)
+    target, = targets(1)
+    target.add_image('registry.local/team/app:1', ['base', 'runtime', 'app-1'], LAYER_SIZE)
+    report = DockerImageDistributor(engine.client(), [target.url]).distribute(IMAGE)
+
+    assert not report.failed
+    assert report.hops[0].skipped_bytes == 2 * LAYER_SIZE
+    assert report.hops[0].bytes < 2 * LAYER_SIZE
+    assert target.find_image(IMAGE)
+
+
+def test_unrelated_layers_sent(engine, targets):
+    """layers are only left out when the target holds them in the same order from the same repository"""
+    engine.add_image(IMAGE, ['base', 'app-2'], LAYER_SIZE)
+    target, = targets(1)
+    target.add_image('registry.local/team/app:1', ['other', 'base'], LAYER_SIZE)
+    report = DockerImageDistributor(engine.client(), [target.url]).distribute(IMAGE)
+
+    assert not report.failed
+    assert report.hops[0].skipped_bytes == 0
+    assert report.hops[0].bytes > 2 * LAYER_SIZE
+
+
+def test_unreachable_target(engine, targets):
+    """an engine that cannot be reached is reported, the others still receive the image"""
+    engine.add_image(IMAGE)
+    alive, dead = targets(2)
+    dead.close()
+    report = DockerImageDistributor(engine.client(), [alive.url, dead.url], timeout=5).distribute(IMAGE)
+
+    assert list(report.failed) == [dead.url]
+    assert alive.find_image(IMAGE)
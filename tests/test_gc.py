@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_gc.py : Image garbage collection settings
+"""Image garbage collection settings
+
+The number of unused images to keep is a count, so negative numbers and booleans are rejected rather than sliced
+with.
+"""
+import os
+
+import pytest
+
+from eljef.docker.cli import __image__ as cli_image
+from eljef.docker.docker import Docker
+from eljef.docker.exceptions import ConfigError
+from eljef.docker.settings import read_settings
+
+
+def test_negative_keep(config):
+    """gc_images refuses to keep a negative number of images"""
+    with pytest.raises(ConfigError):
+        Docker(config).gc_images(-1)
+
+
+def test_negative_keep_cli(config, monkeypatch):
+    """image --gc --keep -1 fails before asking the engine"""
+    monkeypatch.setattr(cli_image, 'CONFIG_PATH', config)
+    with pytest.raises(SystemExit) as exit_info:
+        cli_image.images_gc(-1)
+    assert exit_info.value.code == 1
+
+
+def test_bool_is_not_a_count(config):
+    """true is not accepted for a number setting"""
+    with open(os.path.join(config, 'settings.yaml'), 'w', encoding='utf-8') as file_o:
+        file_o.write('image_gc_keep: true\n')
+    with pytest.raises(ConfigError):
+        read_settings(config)
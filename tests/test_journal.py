@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_journal.py : Resuming interrupted group updates
+"""Resuming interrupted group updates
+
+A group update is interrupted between a step completing on the engine and the step being recorded, then resumed.
+The resumed update must finish, replaying the unrecorded step.
+"""
+import os
+
+import pytest
+import yaml
+
+from eljef.docker.cli import __group__ as cli_group
+from eljef.docker.docker import Docker
+from eljef.docker.journal import Journal
+from eljef.docker.journal import STEP_REMOVED
+
+MEMBERS = ('db', 'app')
+
+
+class _Crash(Exception):
+    """Stands in for the process dying"""
+
+
+@pytest.fixture
+def stack(config, engine):
+    """Started group 'stack' with a master and a member"""
+    Docker(config).groups.add('stack', {'master': MEMBERS[0]})
+    for name in MEMBERS:
+        engine.add_image("127.0.0.1:9/{0!s}".format(name))
+        definition = os.path.join(config, "{0!s}-definition.yaml".format(name))
+        with open(definition, 'w', encoding='utf-8') as file_o:
+            yaml.safe_dump({'name': name, 'image': "127.0.0.1:9/{0!s}".format(name), 'group': 'stack'}, file_o)
+        Docker(config).containers.define(definition)
+    cli_group.group_start('stack')
+
+    return config
+
+
+def test_resume_after_remove(stack, engine, monkeypatch):
+    """a container removed before the removal was recorded is recreated when the update is resumed"""
+    record = Journal.record
+
+    def _record(journal, step, name, **data):
+        if step == STEP_REMOVED and name == 'app':
+            raise _Crash()
+        record(journal, step, name, **data)
+
+    monkeypatch.setattr(Journal, 'record', _record)
+    with pytest.raises(_Crash):
+        cli_group.group_update('stack')
+    assert not engine.find_container('app')
+
+    monkeypatch.setattr(Journal, 'record', record)
+    cli_group.group_update('stack', resume=True)
+    for name in MEMBERS:
+        assert engine.find_container(name)['State']['Running']
+    assert not Journal(stack, 'group-update', 'stack').exists()
@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_mirrors.py : Registry mirror ranking and failover
+"""Registry mirror ranking and failover
+
+Mirrors are local registries. Pulls go through a fake engine, which fails pulls from a mirror part way through to
+stand in for a mirror dying mid-pull.
+"""
+import pytest
+
+from fake_registry import FakeRegistry
+
+from eljef.docker.image import DockerImage
+from eljef.docker.mirrors import rank_mirrors
+from eljef.docker.pullplan import DockerPullPlanner
+
+UPSTREAM = '127.0.0.1:9/team/app:latest'
+
+
+@pytest.fixture
+def registries():
+    """Factory for mirrors holding team/app, closed after the test"""
+    made = []
+
+    def _make(delay: float = 0, holds: bool = True) -> FakeRegistry:
+        made.append(FakeRegistry(delay=delay))
+        if holds:
+            made[-1].add_image('team/app')
+        return made[-1]
+
+    yield _make
+    for registry in made:
+        registry.close()
+
+
+def _mirror(registry: FakeRegistry) -> str:
+    return "http://{0!s}".format(registry.host)
+
+
+def _dead_mirror() -> str:
+    registry = FakeRegistry()
+    registry.close()
+    return _mirror(registry)
+
+
+def test_rank_fastest_first(registries):
+    """mirrors holding the image are ordered by how fast they answered, others are dropped"""
+    slow, fast, empty = registries(delay=0.3), registries(), registries(holds=False)
+    dead = _dead_mirror()
+    ranked = rank_mirrors({UPSTREAM: [_mirror(slow), dead, _mirror(empty), _mirror(fast)]})
+    assert ranked == {UPSTREAM: [_mirror(fast), _mirror(slow)]}
+
+
+def test_pull_from_mirror(registries, engine):
+    """pulls from the first mirror are tagged as the upstream reference and the mirror tag is removed"""
+    mirror = registries()
+    DockerImage(engine.client(), UPSTREAM, mirrors=[_mirror(mirror)]).pull()
+    assert engine.pulls == ["{0!s}/team/app:latest".format(mirror.host)]
+    assert engine.find_image(UPSTREAM)
+    assert not engine.find_image("{0!s}/team/app:latest".format(mirror.host))
+
+
+def test_mirror_dies_mid_pull(registries, engine):
+    """a mirror failing part way through a pull is followed by the next mirror"""
+    first, second = registries(), registries()
+    engine.pull_errors[first.host] = 'unexpected EOF'
+    DockerImage(engine.client(), UPSTREAM, mirrors=[_mirror(first), _mirror(second)]).pull()
+    assert engine.pulls == ["{0!s}/team/app:latest".format(i.host) for i in (first, second)]
+    assert engine.find_image(UPSTREAM)
+
+
+def test_all_mirrors_fail(registries, engine):
+    """the registry the image is in is used once every mirror failed"""
+    first, second = registries(), registries()
+    engine.pull_errors[first.host] = 'unexpected EOF'
+    engine.pull_errors[second.host] = 'connection reset by peer'
+    DockerImage(engine.client(), UPSTREAM, mirrors=[_mirror(first), _mirror(second)]).pull()
+    assert engine.pulls[-1] == UPSTREAM
+    assert len(engine.pulls) == 3
+    assert engine.find_image(UPSTREAM)
+
+
+def test_planner_ranks_then_fails_over(registries, engine):
+    """the planner pulls from the fastest mirror, and falls back to the slower one when it dies mid-pull"""
+    slow, fast = registries(delay=0.3), registries()
+    engine.pull_errors[fast.host] = 'unexpected EOF'
+    image = DockerImage(engine.client(), UPSTREAM, mirrors=[_mirror(slow), _mirror(fast), _dead_mirror()])
+    report = DockerPullPlanner(engine.client()).pull([image])
+    assert not report.failed
+    assert image.mirrors == [_mirror(fast), _mirror(slow)]
+    assert engine.pulls == ["{0!s}/team/app:latest".format(i.host) for i in (fast, slow)]
+    assert engine.find_image(UPSTREAM)
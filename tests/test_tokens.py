@@ -0,0 +1,101 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_tokens.py : Registry token cache
+"""Registry token cache
+
+Registry clients sharing a TokenCache are run against a registry serving its own token server.
+"""
+import os
+import types
+
+import pytest
+
+from fake_registry import FakeRegistry
+
+from eljef.docker.registry import RegistryClient
+from eljef.docker.tokens import REFRESH_MARGIN
+from eljef.docker.tokens import TokenCache
+
+EXPIRES_IN = 300
+
+
+@pytest.fixture
+def registry():
+    """Registry requiring bearer tokens that expire after EXPIRES_IN seconds"""
+    fake = FakeRegistry(token_auth=True, expires_in=EXPIRES_IN)
+    fake.add_image('team/app')
+    fake.add_image('team/db')
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Clock of the token cache, set by assigning to ``clock.now``"""
+    fake = types.SimpleNamespace(now=1000000.0)
+    monkeypatch.setattr('eljef.docker.tokens.time', types.SimpleNamespace(time=lambda: fake.now))
+    return fake
+
+
+def _client(cache: TokenCache) -> RegistryClient:
+    return RegistryClient(insecure_registry=True, token_cache=cache)
+
+
+def test_token_reused_within_ttl(registry, clock):
+    """requests and clients sharing a cache make one token request per scope while the token is valid"""
+    cache = TokenCache()
+    image = "{0!s}/team/app".format(registry.host)
+    _client(cache).manifest(image)
+    clock.now += EXPIRES_IN - REFRESH_MARGIN - 1
+    _client(cache).digest(image)
+    _client(cache).layers(image)
+    assert _client(cache).token(image)
+    assert registry.tokens_issued == 1
+
+
+def test_token_per_scope(registry, clock):
+    """tokens are kept per repository"""
+    del clock
+    cache = TokenCache()
+    _client(cache).digest("{0!s}/team/app".format(registry.host))
+    _client(cache).digest("{0!s}/team/db".format(registry.host))
+    _client(cache).digest("{0!s}/team/db".format(registry.host))
+    assert registry.tokens_issued == 2
+
+
+def test_token_refreshed_after_expiry(registry, clock):
+    """a new token is requested once the cached one is within the refresh margin of expiring"""
+    cache = TokenCache()
+    image = "{0!s}/team/app".format(registry.host)
+    _client(cache).digest(image)
+    clock.now += EXPIRES_IN - REFRESH_MARGIN + 1
+    _client(cache).digest(image)
+    assert registry.tokens_issued == 2
+    _client(cache).digest(image)
+    assert registry.tokens_issued == 2
+
+
+def test_token_file_shared(registry, clock, tmp_path):
+    """tokens written to the cache file are reused by later invocations until they expire"""
+    cache_file = str(tmp_path / 'registry-tokens.yaml')
+    image = "{0!s}/team/app".format(registry.host)
+    _client(TokenCache(cache_file)).digest(image)
+    assert os.stat(cache_file).st_mode & 0o777 == 0o600
+    _client(TokenCache(cache_file)).digest(image)
+    assert registry.tokens_issued == 1
+    clock.now += EXPIRES_IN
+    _client(TokenCache(cache_file)).digest(image)
+    assert registry.tokens_issued == 2
@@ -0,0 +1,111 @@
+# -*- coding: UTF-8 -*-
+# Copyright (c) 2017-2018, Jef Oliver
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU Lesser General Public License,
+# version 2.1, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for
+# more details.
+#
+# Authors:
+# Jef Oliver <jef@eljef.me>
+#
+# test_transport.py : SSH engine tunnels
+"""SSH engine tunnels
+
+ssh is replaced by a fake command that forwards the tunnel socket to a fake engine.
+"""
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from eljef.docker import transport
+from eljef.docker.exceptions import DockerError
+from eljef.docker.parallel import run_parallel
+
+URL = 'ssh://deploy@build-host:2222'
+
+
+@pytest.fixture
+def ssh_log(tmp_path, engine, monkeypatch):
+    """Log of fake ssh runs, one dictionary of pid and argv per run"""
+    log_path = str(tmp_path / 'ssh.log')
+    open(log_path, 'w', encoding='utf-8').close()
+    monkeypatch.setattr(transport, 'SSH_COMMAND', os.path.join(os.path.dirname(__file__), 'fake_ssh.py'))
+    monkeypatch.setenv('FAKE_SSH_LOG', log_path)
+    monkeypatch.setenv('FAKE_SSH_TARGET', engine.url[len('tcp://'):])
+    monkeypatch.delenv('DOCKER_HOST', raising=False)
+
+    def _runs() -> list:
+        with open(log_path, 'r', encoding='utf-8') as log_file:
+            return [json.loads(i) for i in log_file if i.strip()]
+
+    yield _runs
+    transport.close_tunnels()
+
+
+def _wait_for(check, timeout: float = 10) -> bool:
+    end = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.05)
+
+    return True
+
+
+def test_tunnel_command(ssh_log):
+    """ssh is run with keepalives, the forward, the port and the user"""
+    transport.ssh_tunnel(URL)
+    argv = ssh_log()[0]['argv']
+    assert argv[-1] == 'deploy@build-host'
+    assert argv[argv.index('-p') + 1] == '2222'
+    assert argv[argv.index('-L') + 1].endswith(':' + transport.REMOTE_SOCKET)
+    assert "ServerAliveInterval={0!s}".format(transport.KEEPALIVE_INTERVAL) in argv
+
+
+def test_tunnel_reused(ssh_log, engine):
+    """clients, and concurrent requests through them, share one ssh connection"""
+    clients = [transport.engine_client(URL, version='1.41') for _ in range(3)]
+    results = run_parallel(lambda i: i.ping(), clients * 4, 8)
+    assert all(i.result for i in results)
+    assert transport.ssh_tunnel(URL) is transport.ssh_tunnel(URL)
+    assert len(ssh_log()) == 1
+    assert engine.count('GET', r'/_ping$') == 12
+
+
+def test_tunnel_from_environment(ssh_log, engine, monkeypatch):
+    """ssh:// engines in DOCKER_HOST are reached through the tunnel"""
+    monkeypatch.setenv('DOCKER_HOST', URL)
+    assert transport.engine_client(version='1.41').ping()
+    assert len(ssh_log()) == 1
+    assert engine.count('GET', r'/_ping$') == 1
+
+
+def test_tunnel_reconnects(ssh_log, monkeypatch):
+    """a dropped ssh connection is opened again by the keepalive watcher"""
+    monkeypatch.setattr(transport, 'KEEPALIVE_INTERVAL', 0.1)
+    client = transport.engine_client(URL, version='1.41')
+    assert client.ping()
+    os.kill(ssh_log()[0]['pid'], signal.SIGKILL)
+
+    assert _wait_for(lambda: len(ssh_log()) == 2 and transport.ssh_tunnel(URL).alive())
+    assert client.ping()
+
+
+def test_tunnel_failure(ssh_log, monkeypatch):
+    """ssh errors are reported, and the next attempt tries again"""
+    monkeypatch.setenv('FAKE_SSH_ERROR', 'Permission denied (publickey).')
+    with pytest.raises(DockerError) as err:
+        transport.ssh_tunnel(URL)
+    assert 'Permission denied (publickey).' in err.value.message
+
+    monkeypatch.delenv('FAKE_SSH_ERROR')
+    assert transport.ssh_tunnel(URL).alive()
+    assert len(ssh_log()) == 2